@@ -0,0 +1,116 @@
+# -- Imports --
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from backends import join_measures  # noqa: E402
+from merge_datasets import FINAL_COLUMNS  # noqa: E402
+
+N_GEO = 439  # local authorities in the real data, scale 1
+
+
+# -- Synthetic Panels --
+def synthetic_panel(n_geo: int, years: range, columns: dict, seed: int) -> pd.DataFrame:
+    """
+    Panel with one row per (geo_id, year), shaped and typed like the processed datasets.
+
+    :param n_geo: Number of areas
+    :type n_geo: int
+    :param years: Years to cover
+    :type years: range
+    :param columns: Value column name to (low, high) range
+    :type columns: dict
+    :param seed: Random seed
+    :type seed: int
+    :return: Synthetic panel, sorted by geo_id and year
+    :rtype: DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    n = n_geo * len(years)
+    df = pd.DataFrame(
+        {
+            "geo_id": np.repeat(np.arange(n_geo, dtype="int32"), len(years)),
+            "year": np.tile(np.array(years, dtype="int16"), n_geo),
+        }
+    )
+    for col, (low, high) in columns.items():
+        df[col] = pd.array(rng.integers(low, high, n), dtype="Int32")
+    return df
+
+
+def synthetic_inputs(scale: int) -> tuple:
+    n_geo = N_GEO * scale
+    demography = synthetic_panel(
+        n_geo,
+        range(2019, 2025),
+        {"births": (5, 5000), "deaths": (5, 5000), "active": (100, 50000)},
+        seed=1,
+    )
+    demography.insert(1, "geo_code", "E" + demography["geo_id"].astype(str))
+    demography.insert(2, "geo_name", "Area " + demography["geo_id"].astype(str))
+    population = synthetic_panel(
+        n_geo, range(1998, 2024), {"population": (2000, 1_000_000)}, seed=2
+    )
+    population["is_unreliable"] = (population["population"] % 7 == 0).astype("boolean")
+    # Drop some areas so the left joins leave gaps, like the real GVA coverage
+    gva = synthetic_panel(n_geo, range(1998, 2024), {"gva_million": (50, 100000)}, 3)
+    gva = gva[gva["geo_id"] % 5 != 0].astype({"gva_million": "float64"})
+    return demography, population, gva
+
+
+# -- Merge Paths --
+def chained_merge(demography, population, gva) -> pd.DataFrame:
+    """
+    The previous merge_all_datasets logic: two chained hash merges, then the year filter.
+    """
+    merged = demography.merge(
+        population[["geo_id", "year", "population", "is_unreliable"]],
+        on=["geo_id", "year"],
+        how="left",
+    )
+    merged = merged.merge(
+        gva[["geo_id", "year", "gva_million"]], on=["geo_id", "year"], how="left"
+    )
+    merged = merged[merged["year"].between(2019, 2023)]
+    return merged[FINAL_COLUMNS].reset_index(drop=True)
+
+
+def aligned_merge(demography, population, gva) -> pd.DataFrame:
+    merged = join_measures(
+        demography,
+        [(population, ["population", "is_unreliable"]), (gva, ["gva_million"])],
+        years=(2019, 2023),
+    )
+    return merged[FINAL_COLUMNS]
+
+
+def best_time(func, *args, repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    print(
+        f"{'scale':>6} {'rows':>9} {'chained (s)':>12} {'aligned (s)':>12} {'speedup':>8}"
+    )
+    for scale in (1, 10, 100):
+        inputs = synthetic_inputs(scale)
+        pd.testing.assert_frame_equal(chained_merge(*inputs), aligned_merge(*inputs))
+
+        chained = best_time(chained_merge, *inputs)
+        aligned = best_time(aligned_merge, *inputs)
+        print(
+            f"{scale:>5}x {len(inputs[0]):>9} {chained:>12.4f} {aligned:>12.4f} "
+            f"{chained / aligned:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+# -- Imports --
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import date
+from pathlib import Path
+import numpy as np
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+import raw_cache  # noqa: E402
+from analysis_plots import FIGURES, render_figure  # noqa: E402
+from analysis_prepare import build_analysis_dataset  # noqa: E402
+from analysis_stats import (  # noqa: E402
+    STAT_COLUMNS,
+    bootstrap_summary,
+    correlation,
+    descriptive_stats,
+    gva_cap,
+    model_rows,
+    panel_summary,
+    regression_summary,
+    streaming_summary,
+)
+from clean_demography import clean_multi_year, clean_single_year  # noqa: E402
+from clean_demography import load_demography_sheets  # noqa: E402
+from clean_gva import gva_files  # noqa: E402
+from clean_gva_industry import build_gva_industry, build_totals  # noqa: E402
+from cleaning_helpers import check_duplicates, normalise_geo  # noqa: E402
+from merge_datasets import merge_all_datasets  # noqa: E402
+from running_stats import new_state, update  # noqa: E402
+from storage import read_dataset, write_dataset  # noqa: E402
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE = BENCH_DIR / "baseline.json"
+RESULTS = BENCH_DIR / "results.json"
+
+# Output folders every stage writes to are pointed at a temporary folder while the benchmarks
+# run, so the real processed data, figures and raw cache are never touched.
+DERIVED_PATHS = {"RENDER_STATE": ".render_state.json", "PREVIEW_DIR": "preview"}
+
+# Stages later benchmarks read the outputs of, run even when --only leaves them out
+PRODUCERS = ["merge_all_datasets", "build_analysis_dataset"]
+
+# Processed datasets copied at each scale before the merge runs
+SCALED_DATASETS = ["geography", "business_demography_counts", "population", "gva"]
+
+
+# -- Scaling --
+def load_sources() -> dict:
+    """
+    The real inputs every scale is built from: demography sheets, GVA Table 2 of the first
+    regional workbook and the processed datasets the merge reads. Read before outputs are
+    redirected, so the raw cache is used.
+    """
+    return {
+        "sheets": load_demography_sheets(),
+        "gva_sheet": raw_cache.read_excel_cached(
+            gva_files()[0], sheet_name="Table 2", header=1
+        ),
+        "datasets": {name: read_dataset(name) for name in SCALED_DATASETS},
+    }
+
+
+def redirect_outputs(root: Path) -> None:
+    """
+    Points the output folders of every loaded pipeline module at root.
+    """
+    dirs = {
+        "PROCESSED_DIR": root / "processed",
+        "FIGURES_DIR": root / "figures",
+        "CACHE_DIR": root / "cache",
+        "GVA_DIR": root / "gva",
+        "REPORT_DIR": root / "processed" / "contracts",
+    }
+    for path in dirs.values():
+        path.mkdir(parents=True, exist_ok=True)
+    src = str(BENCH_DIR.parent / "src")
+    for module in list(sys.modules.values()):
+        if not str(getattr(module, "__file__", "")).startswith(src):
+            continue
+        for name, path in dirs.items():
+            if hasattr(module, name):
+                setattr(module, name, path)
+        for name, file_name in DERIVED_PATHS.items():
+            if hasattr(module, name):
+                setattr(module, name, dirs["FIGURES_DIR"] / file_name)
+
+
+def tile_areas(
+    df: pd.DataFrame, scale: int, code_col: str = "geo_code", offset: int = 0
+) -> pd.DataFrame:
+    """
+    Copies every row scale times, each copy a new set of areas: geo_id is offset and geo_code gets
+    a suffix, keeping its prefix, so keys stay unique and area types are unchanged.
+
+    :param df: Rows of a processed dataset or raw sheet
+    :type df: pd.DataFrame
+    :param scale: Number of copies
+    :type scale: int
+    :param code_col: Column holding the area codes
+    :type code_col: str
+    :param offset: Added to geo_id once per copy, the same for every dataset so copies still join
+    :type offset: int
+    :return: Tiled DataFrame
+    :rtype: DataFrame
+    """
+    if scale == 1:
+        return df.copy()
+    copies = []
+    for k in range(scale):
+        copy = df.copy()
+        if k:
+            codes = copy[code_col].astype(object)
+            copy[code_col] = codes.where(codes.isna(), codes.astype(str) + f"_{k}")
+            if "geo_id" in copy.columns:
+                copy["geo_id"] = copy["geo_id"] + k * offset
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def write_scaled_workbook(sheet: pd.DataFrame, path: Path, scale: int) -> int:
+    """
+    Writes a GVA Table 2 sheet with its LA rows repeated scale times, and returns its number of rows.
+    """
+    sheet = tile_areas(sheet, scale, code_col="LA code")
+    workbook = openpyxl.Workbook(write_only=True)
+    table = workbook.create_sheet("Table 2")
+    table.append(["Synthetic regional GVA, scaled for benchmarks"])
+    table.append([str(c) for c in sheet.columns])
+    for row in sheet.itertuples(index=False):
+        table.append([None if pd.isna(v) else v for v in row])
+    workbook.save(path)
+    return len(sheet)
+
+
+# -- Benchmarks --
+def measure(func, args: tuple, repeat: int, setup=None) -> dict:
+    """
+    Best wall time over repeat runs, then peak traced memory of one more run. Memory is traced
+    separately because tracemalloc slows the code it traces.
+
+    :param func: Function to benchmark
+    :param args: Arguments to call it with
+    :type args: tuple
+    :param repeat: Number of timed runs
+    :type repeat: int
+    :param setup: Called before every run, untimed, e.g. to clear a cache
+    :return: seconds and peak_mb
+    :rtype: dict
+    """
+    times = []
+    for _ in range(repeat + 1):
+        if setup is not None:
+            setup()
+        if len(times) < repeat:
+            start = time.perf_counter()
+            func(*args)
+            times.append(time.perf_counter() - start)
+        else:
+            tracemalloc.start()
+            func(*args)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    return {"seconds": round(min(times), 5), "peak_mb": round(peak / 1e6, 3)}
+
+
+def benchmarks(scale: int, root: Path, sources: dict):
+    """
+    Every benchmark at one scale, in pipeline order, as (name, rows, func, args, setup) tuples.
+    Inputs are built lazily, so later stages read what earlier stages wrote.
+    """
+    sheets = sources["sheets"]
+    single = tile_areas(
+        sheets["Table 1.1a"], scale, code_col=sheets["Table 1.1a"].columns[0]
+    )
+    multi = tile_areas(
+        sheets["Table 1.1c"], scale, code_col=sheets["Table 1.1c"].columns[0]
+    )
+    workbook = root / "gva" / "regionalgrossvalueaddedscaled.xlsx"
+    workbook_rows = write_scaled_workbook(sources["gva_sheet"], workbook, scale)
+
+    offset = int(sources["datasets"]["geography"]["geo_id"].max()) + 1
+    for name, dataset in sources["datasets"].items():
+        write_dataset(tile_areas(dataset, scale, offset=offset), name)
+    counts = read_dataset("business_demography_counts")
+    counts = counts.astype({"geo_code": object, "geo_name": object})
+
+    yield "clean_single_year", len(single), clean_single_year, (single, "births"), None
+    yield "clean_multi_year", len(multi), clean_multi_year, (multi, "births"), None
+    yield "build_totals", workbook_rows, build_totals, (), raw_cache.clear
+    yield "build_gva_industry", workbook_rows, build_gva_industry, (), None
+    yield "normalise_geo", len(counts), normalise_geo, (counts,), None
+    yield "check_duplicates", len(counts), check_duplicates, (counts,), None
+    yield "merge_all_datasets", len(counts), merge_all_datasets, (), None
+    yield "build_analysis_dataset", len(counts), build_analysis_dataset, (), None
+
+    df = read_dataset("analysis_dataset")
+    yield "analysis_stats.gva_cap", len(df), gva_cap, (), None
+    cap = gva_cap()
+    yield "analysis_stats.model_rows", len(df), model_rows, (cap,), None
+    df_trim = model_rows(cap)
+    state = update(new_state(STAT_COLUMNS), df_trim)
+    for func in [descriptive_stats, correlation]:
+        yield f"analysis_stats.{func.__name__}", len(df_trim), func, (state,), None
+    for func in [regression_summary, panel_summary]:
+        yield f"analysis_stats.{func.__name__}", len(df_trim), func, (df_trim,), None
+    yield "analysis_stats.streaming_summary", len(df), streaming_summary, (cap,), None
+    yield (
+        "analysis_stats.bootstrap_summary",
+        len(df_trim),
+        lambda data: bootstrap_summary(data, n_resamples=200),
+        (df_trim,),
+        None,
+    )
+
+    plots = df[df["is_unreliable"] == False]
+    plots = plots[plots["gva_per_capita"] <= plots["gva_per_capita"].quantile(0.99)]
+    for name, spec in FIGURES.items():
+        out_path = root / "figures" / name
+        args = (name, plots[spec["columns"]], out_path, spec["dpi"])
+        yield f"plot.{name[: -len('.png')]}", len(plots), render_figure, args, None
+
+
+def run(scales: list, repeat: int, only: list = None) -> dict:
+    """
+    Runs every benchmark at every scale in a temporary folder.
+
+    :param scales: Data scales, 1 is the real data size
+    :type scales: list
+    :param repeat: Timed runs per benchmark, 1 from 100x up
+    :type repeat: int
+    :param only: Only run benchmarks whose name contains one of these
+    :type only: list
+    :return: Results keyed by scale, then benchmark name
+    :rtype: dict
+    """
+    sources = load_sources()
+    results = {}
+    for scale in scales:
+        results[str(scale)] = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            redirect_outputs(Path(tmp))
+            for name, rows, func, args, setup in benchmarks(scale, Path(tmp), sources):
+                skipped = only and not any(part in name for part in only)
+                if skipped and name not in PRODUCERS:
+                    continue
+                # Keep the stages' own progress messages and warnings out of the table
+                with open(os.devnull, "w") as devnull, warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    stdout, sys.stdout = sys.stdout, devnull
+                    try:
+                        if skipped:
+                            func(*args)
+                            continue
+                        result = measure(
+                            func, args, repeat if scale < 100 else 1, setup
+                        )
+                    finally:
+                        sys.stdout = stdout
+                results[str(scale)][name] = {"rows": rows, **result}
+                print(
+                    f"{scale:>5}x {name:<40} {rows:>9} "
+                    f"{result['seconds']:>9.4f}s {result['peak_mb']:>9.1f} MB"
+                )
+    return results
+
+
+# -- Baseline --
+def compare(
+    results: dict, baseline: dict, tolerance: float, floor: float = 0.01
+) -> list:
+    """
+    Benchmarks slower or using more memory than the baseline by more than tolerance. Times below
+    floor seconds are raised to it first, so timer noise on tiny runs is not reported.
+
+    :param results: From run
+    :type results: dict
+    :param baseline: Results saved earlier
+    :type baseline: dict
+    :param tolerance: Allowed relative increase, e.g. 0.25 for 25%
+    :type tolerance: float
+    :param floor: Smallest time compared, in seconds
+    :type floor: float
+    :return: (scale, name, measure, baseline, current) for every regression
+    :rtype: list
+    """
+    regressions = []
+    for scale, names in results.items():
+        for name, current in names.items():
+            before = baseline.get(scale, {}).get(name)
+            if before is None:
+                continue
+            for key, low in [("seconds", floor), ("peak_mb", 1.0)]:
+                if max(current[key], low) > max(before[key], low) * (1 + tolerance):
+                    regressions.append((scale, name, key, before[key], current[key]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--only", nargs="+", help="only benchmarks matching these names"
+    )
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store these results as the baseline",
+    )
+    args = parser.parse_args()
+
+    results = run(args.scales, args.repeat, args.only)
+    output = {
+        "meta": {
+            "date": str(date.today()),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    RESULTS.write_text(json.dumps(output, indent=2))
+    print(f"Saved results to {RESULTS}")
+    if args.save_baseline:
+        shutil.copyfile(RESULTS, BASELINE)
+        print(f"Saved baseline to {BASELINE}")
+        return
+    if not BASELINE.exists():
+        print("No baseline yet, store one with --save-baseline")
+        return
+
+    regressions = compare(
+        results, json.loads(BASELINE.read_text())["results"], args.tolerance
+    )
+    for scale, name, key, before, current in regressions:
+        print(f"[slower] {scale}x {name} {key}: {before} -> {current}")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
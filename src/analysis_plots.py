@@ -1,17 +1,121 @@
 # -- Imports --
+import argparse
+import hashlib
+import inspect
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
 import pandas as pd
+import matplotlib
+
+matplotlib.use("Agg")  # render straight to files, also in worker processes
 import matplotlib.pyplot as plt
-from config import FIGURES_DIR, PROCESSED_DIR
+from matplotlib.colors import LogNorm
+from matplotlib.patches import Patch
+from config import (
+    DENSITY_ABOVE,
+    DENSITY_BINS,
+    FIGURE_DPI,
+    FIGURES_DIR,
+    PLOT_MODE,
+    PLOT_WORKERS,
+    PREVIEW_DPI,
+)
+from run_report import stage, traced
+from running_stats import chunk_state
+from storage import read_dataset
 import seaborn as sns
 
+# Fingerprint of every figure at its last render, keyed by path within FIGURES_DIR
+RENDER_STATE = FIGURES_DIR / ".render_state.json"
+PREVIEW_DIR = FIGURES_DIR / "preview"
+
+
+# -- Aggregated Rendering --
+# With many points, scatter plots are drawn as a fixed grid of cells instead of one marker per
+# point, so render time and file size stay flat however many points there are.
+def use_density(n_points: int, mode: str, max_points: int = DENSITY_ABOVE) -> bool:
+    """
+    Whether to draw a scatter plot as a density grid: always for "density", never for "points",
+    and above max_points for "auto".
+    """
+    if mode not in ("auto", "points", "density"):
+        raise ValueError(f"Unknown plot mode: {mode}, choose auto, points or density")
+    return mode == "density" or (mode == "auto" and n_points > max_points)
+
+
+def bin_points(
+    x: np.ndarray,
+    y: np.ndarray,
+    bins: int = DENSITY_BINS,
+    codes: np.ndarray = None,
+    n_categories: int = 0,
+) -> tuple:
+    """
+    Counts points on a bins x bins grid over their extent with one np.bincount, and with category
+    codes also finds the most common category in each cell.
+
+    :param x: x values, without missing values
+    :type x: np.ndarray
+    :param y: y values, without missing values
+    :type y: np.ndarray
+    :param bins: Cells along each axis
+    :type bins: int
+    :param codes: Category of every point, 0 to n_categories - 1
+    :type codes: np.ndarray
+    :param n_categories: Number of categories
+    :type n_categories: int
+    :return: Counts indexed [x cell, y cell], most common category per cell (None without codes)
+        and the (x min, x max, y min, y max) extent
+    :rtype: tuple
+    """
+    extent = (x.min(), x.max(), y.min(), y.max())
+    cells = []
+    for values, low, high in [(x, *extent[:2]), (y, *extent[2:])]:
+        width = (high - low) or 1
+        cells.append(np.clip(((values - low) / width * bins).astype(int), 0, bins - 1))
+    cell = cells[0] * bins + cells[1]
+
+    counts = np.bincount(cell, minlength=bins * bins).reshape(bins, bins)
+    if codes is None:
+        return counts, None, extent
+    by_category = np.bincount(
+        cell * n_categories + codes, minlength=bins * bins * n_categories
+    ).reshape(bins, bins, n_categories)
+    return counts, by_category.argmax(axis=2), extent
+
+
+def fit_line(df: pd.DataFrame, x: str, y: str) -> tuple:
+    """
+    Least squares line of y on x from the running sums of running_stats, without refitting a model.
+
+    :param df: Points
+    :type df: pd.DataFrame
+    :param x: x column
+    :type x: str
+    :param y: y column
+    :type y: str
+    :return: Slope and intercept
+    :rtype: tuple
+    """
+    state = chunk_state(df, [x, y])
+    slope = state["comoment"][0, 1] / state["m2"][0, 1]
+    return slope, state["mean"][1, 0] - slope * state["mean"][0, 1]
+
 
-def plot_line(df: pd.DataFrame) -> None:
+def plot_line(df: pd.DataFrame, out_path: Path, dpi: int = 100) -> None:
     """
     Line plot of average birth rate over time.
 
 
     :param df: Analysis dataset
     :type df: DataFrame
+    :param out_path: File to save the figure to
+    :type out_path: Path
+    :param dpi: Resolution
+    :type dpi: int
     :return: None
     :rtype: None
     """
@@ -31,36 +135,86 @@ def plot_line(df: pd.DataFrame) -> None:
     ax.grid(True, axis="y", alpha=0.3)
     ax.legend()
     fig.tight_layout()
-    fig.savefig(FIGURES_DIR / "avg_birth_death_rates_over_time.png")
-    plt.close()
+    fig.savefig(out_path, dpi=dpi)
+    plt.close(fig)
+    print(f"Saved plot to {out_path}")
 
 
-def plot_churn_scatter(df: pd.DataFrame) -> None:
+def plot_churn_scatter(
+    df: pd.DataFrame,
+    out_path: Path,
+    dpi: int = FIGURE_DPI,
+    mode: str = "auto",
+    bins: int = DENSITY_BINS,
+    max_points: int = DENSITY_ABOVE,
+) -> None:
     """
     Figure 1: Scatter plot of Birth Rate vs Death Rate, coloured by region
     Identifies high churn vs stable regions
 
+    As a density grid, each cell takes the colour of its most common region, more opaque the more
+    points it holds.
+
     :param df: Analysis dataset
     :type df: DataFrame
+    :param out_path: File to save the figure to
+    :type out_path: Path
+    :param dpi: Resolution
+    :type dpi: int
+    :param mode: "points", "density" or "auto", see use_density
+    :type mode: str
+    :param bins: Cells along each axis of the density grid
+    :type bins: int
+    :param max_points: Most points drawn as markers in "auto" mode
+    :type max_points: int
     :return: None
     :rtype: None
     """
     latest = df[df["year"] == df["year"].max()].copy()
 
-    plt.figure(figsize=(10, 7))
-    sns.scatterplot(
-        data=latest,
-        x="birth_rate",
-        y="death_rate",
-        hue="region_name",
-        palette="tab10",
-        s=100,
-        alpha=0.88,
-    )
+    fig, ax = plt.subplots(figsize=(10, 7))
+    handles = None
+    if use_density(len(latest), mode, max_points):
+        points = latest.dropna(subset=["birth_rate", "death_rate", "region_name"])
+        regions = (
+            points["region_name"].astype("category").cat.remove_unused_categories()
+        )
+        categories = regions.cat.categories
+        counts, dominant, extent = bin_points(
+            points["birth_rate"].to_numpy(dtype="float64"),
+            points["death_rate"].to_numpy(dtype="float64"),
+            bins,
+            regions.cat.codes.to_numpy(),
+            len(categories),
+        )
+        colours = np.array(sns.color_palette("tab10", len(categories)))
+        image = np.zeros((bins, bins, 4))
+        image[..., :3] = colours[dominant]
+        image[..., 3] = np.log1p(counts) / np.log1p(counts.max()) * 0.7 + 0.3
+        image[counts == 0, 3] = 0
+        ax.imshow(
+            image.transpose(1, 0, 2),
+            origin="lower",
+            extent=extent,
+            aspect="auto",
+            interpolation="nearest",
+        )
+        handles = [Patch(color=c, label=r) for c, r in zip(colours, categories)]
+    else:
+        sns.scatterplot(
+            data=latest,
+            ax=ax,
+            x="birth_rate",
+            y="death_rate",
+            hue="region_name",
+            palette="tab10",
+            s=100,
+            alpha=0.88,
+        )
 
     # Break even line
     max_val = max(latest["birth_rate"].max(), latest["death_rate"].max())
-    plt.plot(
+    (breakeven,) = ax.plot(
         [0, max_val],
         [0, max_val],
         color="red",
@@ -69,95 +223,314 @@ def plot_churn_scatter(df: pd.DataFrame) -> None:
         label="Breakeven (Net 0)",
     )
 
-    plt.title("Regional Churn: Birth Rate vs Death Rate (2023)")
-    plt.xlabel("Birth Rate (%)")
-    plt.ylabel("Death Rate (%)")
-    plt.legend(bbox_to_anchor=(1.05, 1), loc="upper left", title="Region")
-    plt.grid(True, alpha=0.3)
-    plt.tight_layout()
+    ax.set_title("Regional Churn: Birth Rate vs Death Rate (2023)")
+    ax.set_xlabel("Birth Rate (%)")
+    ax.set_ylabel("Death Rate (%)")
+    ax.legend(
+        handles=handles + [breakeven] if handles else None,
+        bbox_to_anchor=(1.05, 1),
+        loc="upper left",
+        title="Region",
+    )
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
 
-    out_path = FIGURES_DIR / "fig1_business_churn.png"
-    plt.savefig(out_path, dpi=300)
+    fig.savefig(out_path, dpi=dpi)
+    plt.close(fig)
     print(f"Saved plot to {out_path}")
 
 
-def plot_net_growth_boxplot(df: pd.DataFrame) -> None:
+def plot_net_growth_boxplot(
+    df: pd.DataFrame, out_path: Path, dpi: int = FIGURE_DPI
+) -> None:
     """
     Figure 2: Boxplot of Net Business Growth Rate by Region.
     Shows variance and median performance differences.
     """
     # Avg over 5 years
     df_grouped = (
-        df.groupby(["region_name", "geo_code"])["net_rate"].mean().reset_index()
+        df.groupby(["region_name", "geo_id"], observed=True)["net_rate"]
+        .mean()
+        .reset_index()
     )
     order = (
-        df_grouped.groupby("region_name")["net_rate"]
+        df_grouped.groupby("region_name", observed=True)["net_rate"]
         .median()
         .sort_values(ascending=False)
         .index
     )
 
-    plt.figure(figsize=(12, 6))
+    fig, ax = plt.subplots(figsize=(12, 6))
     sns.boxplot(
-        x="region_name", y="net_rate", data=df_grouped, order=order, palette="viridis"
+        x="region_name",
+        y="net_rate",
+        data=df_grouped,
+        order=order,
+        palette="viridis",
+        ax=ax,
     )
-    plt.title("Net Business Growth by Region (2019-2023 Average)")
-    plt.xlabel("Region")
-    plt.ylabel("Avg Net Growth Rate (%)")
-    plt.xticks(rotation=45)
-    plt.grid(axis="y", alpha=0.3)
-    plt.tight_layout()
-
-    out_path = FIGURES_DIR / "fig2_net_growth_boxplot.png"
-    plt.savefig(out_path, dpi=300)
+    ax.set_title("Net Business Growth by Region (2019-2023 Average)")
+    ax.set_xlabel("Region")
+    ax.set_ylabel("Avg Net Growth Rate (%)")
+    ax.tick_params(axis="x", labelrotation=45)
+    ax.grid(axis="y", alpha=0.3)
+    fig.tight_layout()
+
+    fig.savefig(out_path, dpi=dpi)
+    plt.close(fig)
     print(f"Saved plot to {out_path}")
 
 
-def plot_productivity_vs_growth(df: pd.DataFrame) -> None:
+def plot_productivity_vs_growth(
+    df: pd.DataFrame,
+    out_path: Path,
+    dpi: int = FIGURE_DPI,
+    mode: str = "auto",
+    bins: int = DENSITY_BINS,
+    max_points: int = DENSITY_ABOVE,
+) -> None:
     """
     Figure 3: GVA per Business vs Net Rate
     Directly tests the hypothesis: 'Does higher efficiency = better survival?'
+
+    As a density grid, cells are shaded by their number of LAs on a log scale, and the fit line
+    comes from running sums rather than regplot (so without its confidence band).
     """
     latest = df[df["year"] == df["year"].max()].copy()
 
-    plt.figure(figsize=(10, 6))
-    sns.regplot(
-        data=latest,
-        x="gva_per_business",
-        y="net_rate",
-        scatter_kws={"alpha": 0.3},
-        line_kws={"color": "red"},
-    )
+    fig, ax = plt.subplots(figsize=(10, 6))
+    if use_density(len(latest), mode, max_points):
+        points = latest.dropna(subset=["gva_per_business", "net_rate"])
+        counts, _, extent = bin_points(
+            points["gva_per_business"].to_numpy(dtype="float64"),
+            points["net_rate"].to_numpy(dtype="float64"),
+            bins,
+        )
+        image = ax.imshow(
+            np.ma.masked_equal(counts.T, 0),
+            origin="lower",
+            extent=extent,
+            aspect="auto",
+            interpolation="nearest",
+            cmap="Blues",
+            norm=LogNorm(),
+        )
+        fig.colorbar(image, ax=ax, label="LAs per cell")
+        slope, intercept = fit_line(points, "gva_per_business", "net_rate")
+        ends = np.array(extent[:2])
+        ax.plot(ends, intercept + slope * ends, color="red")
+    else:
+        sns.regplot(
+            data=latest,
+            ax=ax,
+            x="gva_per_business",
+            y="net_rate",
+            scatter_kws={"alpha": 0.3},
+            line_kws={"color": "red"},
+        )
 
-    plt.title("Efficiency vs Growth (2023)")
-    plt.xlabel("GVA per Business (£)")
-    plt.ylabel("Net Growth Rate (%)")
-    plt.grid(True, alpha=0.3)
-    plt.tight_layout()
+    ax.set_title("Efficiency vs Growth (2023)")
+    ax.set_xlabel("GVA per Business (£)")
+    ax.set_ylabel("Net Growth Rate (%)")
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
 
-    out_path = FIGURES_DIR / "fig3_productivity_over_growth.png"
-    plt.savefig(out_path, dpi=300)
+    fig.savefig(out_path, dpi=dpi)
+    plt.close(fig)
     print(f"Saved plot to {out_path}")
 
 
-def main():
+# -- Rendering --
+# Every figure with its plot function, the columns it reads, its resolution and any options for
+# the plot function. A figure is only rendered again when those columns, its resolution, its
+# options or the code of its plot function or the helpers it calls change.
+DENSITY_OPTIONS = {"mode": PLOT_MODE, "bins": DENSITY_BINS, "max_points": DENSITY_ABOVE}
+
+FIGURES = {
+    "fig1_business_churn.png": {
+        "plot": plot_churn_scatter,
+        "columns": ["year", "birth_rate", "death_rate", "region_name"],
+        "dpi": FIGURE_DPI,
+        "options": DENSITY_OPTIONS,
+    },
+    "avg_birth_death_rates_over_time.png": {
+        "plot": plot_line,
+        "columns": ["year", "birth_rate", "death_rate"],
+        "dpi": 100,
+    },
+    "fig2_net_growth_boxplot.png": {
+        "plot": plot_net_growth_boxplot,
+        "columns": ["region_name", "geo_id", "net_rate"],
+        "dpi": FIGURE_DPI,
+    },
+    "fig3_productivity_over_growth.png": {
+        "plot": plot_productivity_vs_growth,
+        "columns": ["year", "gva_per_business", "net_rate"],
+        "dpi": FIGURE_DPI,
+        "options": DENSITY_OPTIONS,
+    },
+}
+
+
+def plot_sources(plot) -> list:
+    """
+    Source code of a plot function and of every function of this module it calls, directly or
+    through another helper, so a change to e.g. bin_points also renders its figures again.
+
+    :param plot: Plot function
+    :type plot: callable
+    :return: Source code of each function, the plot function first
+    :rtype: list
+    """
+    found, queue = [], [plot]
+    while queue:
+        func = inspect.unwrap(queue.pop(0))
+        if func in found:
+            continue
+        found.append(func)
+        codes, names = [func.__code__], set()
+        while codes:
+            code = codes.pop()
+            names.update(code.co_names)
+            codes.extend(const for const in code.co_consts if inspect.iscode(const))
+        for name in sorted(names):
+            called = globals().get(name)
+            if inspect.isfunction(called) and called.__module__ == __name__:
+                queue.append(called)
+    return [inspect.getsource(func) for func in found]
+
+
+def figure_fingerprint(name: str, df: pd.DataFrame, dpi: int) -> str:
+    """
+    Hash of a figure's input columns, its resolution, its options and the source code of its plot
+    function and the helpers it calls.
+
+    :param name: Figure file name, a key of FIGURES
+    :type name: str
+    :param df: Input columns of the figure
+    :type df: pd.DataFrame
+    :param dpi: Resolution
+    :type dpi: int
+    :return: Hex digest
+    :rtype: str
+    """
+    spec = FIGURES[name]
+    digest = hashlib.sha256()
+    options = json.dumps(spec.get("options", {}), sort_keys=True)
+    digest.update(f"{name}:{dpi}:{list(df.columns)}:{options}\n".encode())
+    for source in plot_sources(spec["plot"]):
+        digest.update(source.encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+@traced(detail=("name", "dpi"))
+def render_figure(name: str, df: pd.DataFrame, out_path: Path, dpi: int) -> float:
+    """
+    Renders one figure. Kept at module level so it can be sent to worker processes.
+
+    :return: Wall time in seconds
+    :rtype: float
+    """
+    start = time.perf_counter()
+    spec = FIGURES[name]
+    spec["plot"](df, out_path, dpi=dpi, **spec.get("options", {}))
+    return time.perf_counter() - start
+
+
+def load_render_state() -> dict:
+    if RENDER_STATE.exists():
+        return json.loads(RENDER_STATE.read_text())
+    return {}
+
+
+@traced(detail=("preview", "force", "workers"))
+def render_all(
+    df: pd.DataFrame,
+    preview: bool = False,
+    force: bool = False,
+    workers: int = PLOT_WORKERS,
+) -> dict:
+    """
+    Renders every figure whose inputs changed since its last render, each in its own worker process.
+
+    Preview renders use PREVIEW_DPI and go to figures/preview/, so they never replace the full
+    resolution figures and are tracked separately.
+
+    :param df: Analysis dataset, filtered for plotting
+    :type df: pd.DataFrame
+    :param preview: Render quick low resolution previews
+    :type preview: bool
+    :param force: Render every figure even if nothing changed
+    :type force: bool
+    :param workers: Number of worker processes, 1 renders in this process
+    :type workers: int
+    :return: Outcome per figure: "rendered" or "skipped"
+    :rtype: dict
+    """
+    out_dir = PREVIEW_DIR if preview else FIGURES_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+    state = load_render_state()
+    outcome = {}
+    jobs = {}
+    for name, spec in FIGURES.items():
+        out_path = out_dir / name
+        key = str(out_path.relative_to(FIGURES_DIR))
+        dpi = PREVIEW_DPI if preview else spec["dpi"]
+        inputs = df[spec["columns"]]
+        fingerprint = figure_fingerprint(name, inputs, dpi)
+        if not force and out_path.exists() and state.get(key) == fingerprint:
+            outcome[name] = "skipped"
+            print(f"[skip] {key}")
+            continue
+        jobs[name] = (inputs, out_path, dpi, key, fingerprint)
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = {
+                name: pool.submit(render_figure, name, *job[:3])
+                for name, job in jobs.items()
+            }
+            seconds = {name: future.result() for name, future in futures.items()}
+    else:
+        seconds = {name: render_figure(name, *job[:3]) for name, job in jobs.items()}
+
+    for name, (_, _, _, key, fingerprint) in jobs.items():
+        state[key] = fingerprint
+        outcome[name] = "rendered"
+        print(f"[done] {key} ({seconds[name]:.1f}s)")
+    RENDER_STATE.write_text(json.dumps(state, indent=2, sort_keys=True))
+    return outcome
+
+
+@stage("analysis_plots")
+def main(preview: bool = False, force: bool = False, analysis: pd.DataFrame = None):
     """
     Main function to load final dataset and generate analysis plots.
 
+    :param preview: Render quick low resolution previews to figures/preview/
+    :type preview: bool
+    :param force: Render every figure even if nothing changed
+    :type force: bool
+    :param analysis: Analysis dataset already in memory, read from PROCESSED_DIR if not passed
+    :type analysis: pd.DataFrame
     :return: None
     :rtype: None
     """
-    df = pd.read_csv(PROCESSED_DIR / "analysis_dataset.csv")
+    df = read_dataset("analysis_dataset") if analysis is None else analysis
 
     df = df[df["is_unreliable"] == False]
     q99 = df["gva_per_capita"].quantile(0.99)
     df_trim = df[df["gva_per_capita"] <= q99]
 
-    plot_churn_scatter(df_trim)
-    plot_line(df_trim)
-    plot_net_growth_boxplot(df_trim)
-    plot_productivity_vs_growth(df_trim)
+    render_all(df_trim, preview=preview, force=force)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Render the analysis figures.")
+    parser.add_argument(
+        "--preview", action="store_true", help=f"render at {PREVIEW_DPI} dpi"
+    )
+    parser.add_argument("--force", action="store_true", help="render every figure")
+    args = parser.parse_args()
+    main(preview=args.preview, force=args.force)
@@ -1,88 +1,95 @@
 # -- Imports --
 import pandas as pd
-from config import PROCESSED_DIR, RAW_DIR
-
-
-def attach_regions(df: pd.DataFrame) -> pd.DataFrame:
-    lookup = pd.read_excel(RAW_DIR / "lasregionew2021lookup.xlsx", header=4)
-    lookup = lookup.rename(
-        columns={
-            "LA code": "geo_code",
-            "LA name": "geo_name",
-            "Region code": "region_code",
-            "Region name": "region_name",
-        }
-    )
-
-    df = df.merge(
-        lookup[["geo_code", "region_code", "region_name"]], on="geo_code", how="left"
-    )
-
-    # Lookup fallbacks for missing regions
-    df.loc[df["geo_code"].str.startswith("S"), "region_name"] = "Scotland"
-    df.loc[df["geo_code"].str.startswith("N"), "region_name"] = "Northern Ireland"
-    df.loc[df["geo_code"].str.startswith("W"), "region_name"] = "Wales"
-
-    return df
-
-
-def build_analysis_dataset() -> pd.DataFrame:
+from backends import KEYS, get_backend
+from cleaning_helpers import prefix_mask
+from config import BACKEND, LA_PREFIXES
+from merge_datasets import FINAL_COLUMNS
+from metrics import METRICS, formulas
+from run_report import stage
+from storage import write_dataset
+
+
+@stage("analysis_prepare")
+def build_analysis_dataset(
+    backend: str = BACKEND, metrics: list = None
+) -> pd.DataFrame:
     """
     Builds the analysis dataset from the final merged dataset.
 
+    :param backend: Execution backend, "pandas", "polars" or "duckdb"
+    :type backend: str
+    :param metrics: Metrics from metrics.METRICS to add, all of them if not passed
+    :type metrics: list
     :return: DataFrame
     :rtype: DataFrame
     """
-
-    path = PROCESSED_DIR / "final_dataset.csv"
-    df = pd.read_csv(path)
+    ops = get_backend(backend)
 
     # Only want Local Authorities (E06, E07, E08, E09, N09, S12, W06), individual region rows are removed.
     # This prevents double-counting and massive outliers in the plots.
+    df = ops["scan"]("final_dataset", prefixes=LA_PREFIXES)
 
-    prefixes_to_keep = ["E06", "E07", "E08", "E09", "N09", "S12", "W06"]
-    pattern = "|".join(prefixes_to_keep)
-    df = df[df["geo_code"].str.contains(f"^({pattern})", regex=True)].copy()
+    # Regions come from the geography dimension, built with geography.attach_regions
+    regions = ops["scan"]("geography", columns=["geo_id", "region_code", "region_name"])
+    df = derive_metrics(ops, df, regions, metrics)
 
     print(f"Filtered dataset to Local Authorities only: {len(df)} rows.")
 
-    # Rates and Counts
-    df["birth_rate"] = (
-        df["births"] / df["active"] * 100
-    )  # Births per 100 active businesses
-    df["death_rate"] = (
-        df["deaths"] / df["active"] * 100
-    )  # Deaths per 100 active businesses
-    df["net_change"] = (
-        df["births"] - df["deaths"]
-    )  # Net change in business counts for that year
-    df["net_rate"] = (
-        df["net_change"] / df["active"] * 100
-    )  # Net change rate per 100 active businesses
-
-    # Productivity measures
-    df["gva_per_capita"] = (
-        df["gva_million"] * 1_000_000 / df["population"]
-    )  # GVA per person
-    df["gva_per_business"] = (
-        df["gva_million"] * 1_000_000 / df["active"]
-    )  # GVA per active business
-
-    analysis_df = attach_regions(df)
-
     # some rows (18) still have missing regions - likely defunct authorities
-    before_len = len(analysis_df)
-    analysis_df = analysis_df.dropna(subset=["region_name"])
+    before_len = len(df)
+    analysis_df = df.dropna(subset=["region_name"])
     dropped = before_len - len(analysis_df)
 
     if dropped > 0:
         print(f"Dropped {dropped} rows belonging to defunct authorities.")
 
-    out_path = PROCESSED_DIR / "analysis_dataset.csv"
-    analysis_df.to_csv(out_path, index=False)
+    out_path = write_dataset(analysis_df, "analysis_dataset")
     print(f"Saved {len(analysis_df)} rows to {out_path}")
     return analysis_df
 
 
+def derive_metrics(ops: dict, df, regions, metrics: list = None) -> pd.DataFrame:
+    """
+    Adds the metrics and the region of every row, as tables of the backend's type.
+
+    :param ops: Backend operations, from backends.get_backend
+    :type ops: dict
+    :param df: Local Authority rows of the final dataset
+    :param regions: geo_id, region_code and region_name of the geography dimension
+    :param metrics: Metrics from metrics.METRICS to add, all of them if not passed
+    :type metrics: list
+    :return: Analysis dataset, before rows without a region are dropped
+    :rtype: DataFrame
+    """
+    # Only the requested metrics, and the metrics they use, are computed
+    metrics = metrics if metrics is not None else list(METRICS)
+    df = ops["derive"](df, formulas(metrics))
+
+    df = ops["join"](df, [(regions, ["region_code", "region_name"])], keys=["geo_id"])
+    df = ops["collect"](ops["sort"](df, KEYS))
+    return df[FINAL_COLUMNS + metrics + ["region_code", "region_name"]]
+
+
+def prepare_analysis(
+    final: pd.DataFrame, geography: pd.DataFrame, metrics: list = None
+) -> pd.DataFrame:
+    """
+    The analysis dataset from the final dataset already in memory, without reading or writing files.
+
+    :param final: Final dataset
+    :type final: pd.DataFrame
+    :param geography: Geography dimension
+    :type geography: pd.DataFrame
+    :param metrics: Metrics from metrics.METRICS to add, all of them if not passed
+    :type metrics: list
+    :return: Local Authority rows with metrics and regions
+    :rtype: DataFrame
+    """
+    df = final[prefix_mask(final["geo_code"], LA_PREFIXES)].reset_index(drop=True)
+    regions = geography[["geo_id", "region_code", "region_name"]]
+    df = derive_metrics(get_backend("pandas"), df, regions, metrics)
+    return df.dropna(subset=["region_name"])
+
+
 if __name__ == "__main__":
     build_analysis_dataset()
@@ -1,23 +1,71 @@
 # -- Imports --
 import pandas as pd
 import statsmodels.api as sm
-from config import PROCESSED_DIR
+from bootstrap import bootstrap, intervals
+from config import (
+    BOOTSTRAP_BY_LA,
+    BOOTSTRAP_RESAMPLES,
+    BOOTSTRAP_SEED,
+    BOOTSTRAP_WORKERS,
+    PROCESSED_DIR,
+    STATS_BREAKDOWNS,
+    STATS_CHUNK_ROWS,
+)
+from panel import fit_panel, summary_text
+from run_report import stage, traced
+from running_stats import corr, describe, new_state, update, update_groups
+from storage import iter_dataset
 import numpy as np
 
+STAT_COLUMNS = [
+    "birth_rate",
+    "death_rate",
+    "net_rate",
+    "gva_per_capita",
+    "gva_per_business",
+]
+
+# Columns of the capped rows kept in memory for the regressions and the bootstrap
+MODEL_COLUMNS = ["geo_id", "year"] + STAT_COLUMNS
+
+# Fixed effects absorbed by each panel regression, all clustered by LA
+PANEL_MODELS = {
+    "LA Fixed Effects": ["geo_id"],
+    "Year Fixed Effects": ["year"],
+    "Two-Way Fixed Effects": ["geo_id", "year"],
+}
+
 
 # -- Functions --
-def descriptive_stats(df: pd.DataFrame) -> pd.DataFrame:
+@traced
+def analysis_rows(df: pd.DataFrame, cap: float) -> pd.DataFrame:
     """
-    Descriptive statistics for key analysis variables.
+    Rows used for the statistics: with GVA data, GVA per capita at most cap (the 99th percentile),
+    and reliable population.
 
-    :param df: Analysis dataset
+    :param df: Analysis dataset, or a chunk of it
     :type df: DataFrame
+    :param cap: Largest GVA per capita to keep
+    :type cap: float
+    :return: Filtered copy of df
+    :rtype: DataFrame
+    """
+    df = df.dropna(subset=["gva_million"])
+    df = df[df["gva_per_capita"] <= cap]
+    return df[df["is_unreliable"] == False].copy()
+
+
+@traced
+def descriptive_stats(state: dict) -> pd.DataFrame:
+    """
+    Descriptive statistics for key analysis variables.
+
+    :param state: Streamed state of the key analysis variables, see streaming_summary
+    :type state: dict
     :return: Descriptive statistics
     :rtype: DataFrame
     """
-    desc = df[
-        ["birth_rate", "death_rate", "net_rate", "gva_per_capita", "gva_per_business"]
-    ].describe()
+    desc = describe(state)
     try:
         desc.to_csv(PROCESSED_DIR / "analysis_statistics_summary.csv")
         print(
@@ -29,18 +77,17 @@ def descriptive_stats(df: pd.DataFrame) -> pd.DataFrame:
     return desc
 
 
-def correlation(df: pd.DataFrame) -> pd.DataFrame:
+@traced
+def correlation(state: dict) -> pd.DataFrame:
     """
     Correlation matrix for key analysis variables.
 
-    :param df: Analysis dataset
-    :type df: DataFrame
+    :param state: Streamed state of the key analysis variables, see streaming_summary
+    :type state: dict
     :return: Correlation matrix
     :rtype: DataFrame
     """
-    desc = df[
-        ["birth_rate", "death_rate", "net_rate", "gva_per_capita", "gva_per_business"]
-    ].corr()
+    desc = corr(state)
     try:
         desc.to_csv(PROCESSED_DIR / "analysis_statistics_correlation.csv")
         print(
@@ -52,6 +99,7 @@ def correlation(df: pd.DataFrame) -> pd.DataFrame:
     return desc
 
 
+@traced
 def regression_summary(df: pd.DataFrame) -> pd.DataFrame:
     """
     Regression summary of GVA per capita against birth rate, death rate, and net rate.
@@ -82,17 +130,254 @@ def regression_summary(df: pd.DataFrame) -> pd.DataFrame:
     return model.summary()
 
 
-def main():
-    df = pd.read_csv(PROCESSED_DIR / "analysis_dataset.csv")
-    df = df.dropna(subset=["gva_million"]).copy()  # Focus on rows with GVA data
-    q99 = df["gva_per_capita"].quantile(0.99)
-    df_trim = df[df["gva_per_capita"] <= q99].copy()
+@traced
+def panel_summary(df: pd.DataFrame) -> dict:
+    """
+    Fixed-effects regressions of GVA per capita on birth rate and death rate, with LA, year and
+    two-way fixed effects and standard errors clustered by LA.
+
+    Fixed effects are absorbed by demeaning within groups, see panel.py, so the fit stays linear in
+    the number of rows however many LAs there are.
+
+    :param df: Analysis dataset
+    :type df: DataFrame
+    :return: Model name to fit_panel result
+    :rtype: dict
+    """
+    data = df[["geo_id", "year", "gva_per_capita", "birth_rate", "death_rate"]].dropna()
+    results = {
+        name: fit_panel(
+            data,
+            "gva_per_capita",
+            ["birth_rate", "death_rate"],
+            effects=effects,
+            cluster="geo_id",
+        )
+        for name, effects in PANEL_MODELS.items()
+    }
+
+    out_path = PROCESSED_DIR / "analysis_statistics_panel.txt"
+    with open(out_path, "w") as f:
+        f.write(
+            "\n\n".join(summary_text(r, name) for name, r in results.items()) + "\n"
+        )
+    print(f"Saved panel regression summaries to {out_path}")
+    return results
+
+
+def analysis_chunks(columns: list, chunk_rows: int, df: pd.DataFrame = None):
+    """
+    Chunks of the analysis dataset, streamed from PROCESSED_DIR, or sliced from df if passed.
+    """
+    if df is None:
+        yield from iter_dataset(
+            "analysis_dataset", columns=columns, batch_rows=chunk_rows
+        )
+        return
+    for start in range(0, len(df), chunk_rows):
+        yield df[columns].iloc[start : start + chunk_rows]
+
+
+@traced
+def gva_cap(chunk_rows: int = STATS_CHUNK_ROWS, df: pd.DataFrame = None) -> float:
+    """
+    The cap on GVA per capita used by every statistic: its 99th percentile over the rows with GVA
+    data, interpolated like pandas. One streamed pass counts the rows, and a second keeps only the
+    values at or above the percentile, so memory use is about 1% of one column.
+
+    :param chunk_rows: Rows per chunk
+    :type chunk_rows: int
+    :param df: Analysis dataset already in memory, streamed from PROCESSED_DIR if not passed
+    :type df: pd.DataFrame
+    :return: Largest GVA per capita to keep
+    :rtype: float
+    """
+    columns = ["gva_million", "gva_per_capita"]
+    n = sum(
+        chunk.notna().all(axis=1).sum()
+        for chunk in analysis_chunks(columns, chunk_rows, df)
+    )
+    if n == 0:
+        return np.nan
+    position = 0.99 * (n - 1)
+    keep = n - int(position)
+
+    top = np.empty(0)
+    for chunk in analysis_chunks(columns, chunk_rows, df):
+        values = chunk.loc[chunk.notna().all(axis=1), "gva_per_capita"]
+        top = np.concatenate([top, values.to_numpy(dtype="float64")])
+        if len(top) > keep:
+            top = np.partition(top, len(top) - keep)[len(top) - keep :]
+    top = np.sort(top)
+    upper = top[1] if keep > 1 else top[0]
+    return top[0] + (upper - top[0]) * (position - int(position))
 
-    # Filter out unreliable
-    df_trim = df_trim[df_trim["is_unreliable"] == False].copy()
-    descriptive_stats(df_trim)
-    correlation(df_trim)
+
+@traced
+def streaming_summary(
+    cap: float = None,
+    by: list = STATS_BREAKDOWNS,
+    chunk_rows: int = STATS_CHUNK_ROWS,
+    df: pd.DataFrame = None,
+) -> dict:
+    """
+    Descriptive statistics and correlations of the key analysis variables overall, and descriptive
+    statistics broken down by each column in by, streamed from the analysis dataset chunk by chunk,
+    so memory use does not grow with it.
+
+    Every state is built in one pass over the rows kept by analysis_rows, see running_stats.py.
+    The overall state is written by descriptive_stats and correlation, and each breakdown to
+    analysis_statistics_by_<column>.csv, one describe() block per value.
+
+    :param cap: Largest GVA per capita to keep, from gva_cap if not passed
+    :type cap: float
+    :param by: Columns to break down by
+    :type by: list
+    :param chunk_rows: Rows per chunk
+    :type chunk_rows: int
+    :param df: Analysis dataset already in memory, streamed from PROCESSED_DIR if not passed
+    :type df: pd.DataFrame
+    :return: "all" and every by column to its states
+    :rtype: dict
+    """
+    if cap is None:
+        cap = gva_cap(chunk_rows, df)
+    columns = ["gva_million", "gva_per_capita", "is_unreliable"] + [
+        c for c in STAT_COLUMNS + by if c != "gva_per_capita"
+    ]
+
+    states = {"all": new_state(STAT_COLUMNS), **{col: {} for col in by}}
+    for chunk in analysis_chunks(columns, chunk_rows, df):
+        chunk = analysis_rows(chunk, cap)
+        states["all"] = update(states["all"], chunk)
+        for col in by:
+            update_groups(states[col], chunk, col, STAT_COLUMNS)
+
+    descriptive_stats(states["all"])
+    correlation(states["all"])
+    for col in by:
+        breakdown = pd.concat(
+            {key: describe(states[col][key]) for key in sorted(states[col])},
+            names=[col, "statistic"],
+        )
+        out_path = PROCESSED_DIR / f"analysis_statistics_by_{col}.csv"
+        breakdown.to_csv(out_path)
+        print(f"Saved statistics by {col} to {out_path}")
+    return states
+
+
+@traced
+def model_rows(
+    cap: float, chunk_rows: int = STATS_CHUNK_ROWS, df: pd.DataFrame = None
+) -> pd.DataFrame:
+    """
+    The rows kept by analysis_rows, with only the columns the regressions and the bootstrap use,
+    streamed so the rest of the analysis dataset is never held in memory.
+
+    :param cap: Largest GVA per capita to keep, see gva_cap
+    :type cap: float
+    :param chunk_rows: Rows per chunk
+    :type chunk_rows: int
+    :param df: Analysis dataset already in memory, streamed from PROCESSED_DIR if not passed
+    :type df: pd.DataFrame
+    :return: MODEL_COLUMNS of the kept rows
+    :rtype: DataFrame
+    """
+    columns = MODEL_COLUMNS + ["gva_million", "is_unreliable"]
+    kept = [
+        analysis_rows(chunk, cap)[MODEL_COLUMNS]
+        for chunk in analysis_chunks(columns, chunk_rows, df)
+    ]
+    return pd.concat(kept, ignore_index=True)
+
+
+@traced
+def bootstrap_summary(
+    df: pd.DataFrame,
+    n_resamples: int = BOOTSTRAP_RESAMPLES,
+    by_la: bool = BOOTSTRAP_BY_LA,
+    seed: int = BOOTSTRAP_SEED,
+    workers: int = BOOTSTRAP_WORKERS,
+) -> pd.DataFrame:
+    """
+    Bootstrap confidence intervals for every correlation between the key analysis variables and
+    for the coefficients of the regression of GVA per capita on birth and death rate.
+
+    All resamples are drawn as one weight matrix per batch and every statistic is solved in batched
+    matrix products, see bootstrap.py. With by_la=True whole LAs are resampled with all their years,
+    so the intervals allow for years of the same LA being correlated.
+
+    :param df: Analysis dataset
+    :type df: DataFrame
+    :param n_resamples: Number of resamples
+    :type n_resamples: int
+    :param by_la: Resample LAs rather than rows
+    :type by_la: bool
+    :param seed: Random seed
+    :type seed: int
+    :param workers: Number of worker processes
+    :type workers: int
+    :return: Estimate, standard error and 95% interval per statistic
+    :rtype: DataFrame
+    """
+    data = df[["geo_id"] + STAT_COLUMNS].dropna()
+    values = data[STAT_COLUMNS].to_numpy(dtype="float64")
+    y = data["gva_per_capita"].to_numpy(dtype="float64")
+    X = np.column_stack(
+        [
+            np.ones(len(data)),
+            data[["birth_rate", "death_rate"]].to_numpy(dtype="float64"),
+        ]
+    )
+    groups = pd.factorize(data["geo_id"])[0] if by_la else None
+
+    correlations, coefficients = bootstrap(
+        values, X, y, groups=groups, n_resamples=n_resamples, seed=seed, workers=workers
+    )
+
+    # Each pair of variables once, then the regression coefficients
+    upper = np.triu_indices(len(STAT_COLUMNS), k=1)
+    pairs = [f"corr({STAT_COLUMNS[i]}, {STAT_COLUMNS[j]})" for i, j in zip(*upper)]
+    coefs = ["coef(const)", "coef(birth_rate)", "coef(death_rate)"]
+    estimates = np.concatenate(
+        [
+            np.corrcoef(values, rowvar=False)[upper],
+            np.linalg.lstsq(X, y, rcond=None)[0],
+        ]
+    )
+    samples = np.column_stack([correlations[:, upper[0], upper[1]], coefficients])
+
+    summary = intervals(samples, estimates, pairs + coefs)
+    summary["resamples"] = n_resamples
+    summary["resampling"] = "LA blocks" if by_la else "rows"
+
+    out_path = PROCESSED_DIR / "analysis_statistics_bootstrap.csv"
+    summary.to_csv(out_path)
+    print(f"Saved bootstrap confidence intervals to {out_path}")
+    return summary
+
+
+@stage("analysis_stats")
+def main(analysis: pd.DataFrame = None):
+    """
+    Main function to write every statistics output of the analysis dataset.
+
+    The dataset is streamed in chunks: the cap on GVA per capita is found first, then every summary
+    is built from the rows under it, and only the columns the regressions and the bootstrap use
+    are kept in memory for them.
+
+    :param analysis: Analysis dataset already in memory, streamed from PROCESSED_DIR if not passed
+    :type analysis: pd.DataFrame
+    :return: None
+    :rtype: None
+    """
+    cap = gva_cap(df=analysis)
+    streaming_summary(cap, df=analysis)
+    df_trim = model_rows(cap, df=analysis)
     regression_summary(df_trim)
+    panel_summary(df_trim)
+    if BOOTSTRAP_RESAMPLES > 0:
+        bootstrap_summary(df_trim)
 
 
 if __name__ == "__main__":
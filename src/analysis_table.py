@@ -1,28 +1,37 @@
 import pandas as pd
 from config import PROCESSED_DIR
+from run_report import stage, traced
+from storage import read_dataset
 
+LEAGUE_TABLE_FILE = PROCESSED_DIR / "analysis_regional_league_table.csv"
 
-def main():
-    df = pd.read_csv(PROCESSED_DIR / "analysis_dataset.csv")
 
+@traced
+def league_table(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Mean metrics per region over the reliable rows, ranked by net growth.
+
+    :param df: Analysis dataset
+    :type df: pd.DataFrame
+    :return: One row per region
+    :rtype: DataFrame
+    """
     df = df[df["is_unreliable"] == False]
 
     # Group by region and calculate mean metrics
-    summary = (
-        df.groupby("region_name")
-        .agg(
-            {
-                "birth_rate": "mean",
-                "death_rate": "mean",
-                "net_rate": "mean",
-                "gva_per_business": "mean",
-                "gva_per_capita": "mean",
-            }
-        )
-        .round(2)
+    summary = df.groupby("region_name", observed=True).agg(
+        {
+            "birth_rate": "mean",
+            "death_rate": "mean",
+            "net_rate": "mean",
+            "gva_per_business": "mean",
+            "gva_per_capita": "mean",
+        }
     )
 
+    # Churn from the unrounded means, then round everything for publishing
     summary["churn_rate"] = summary["birth_rate"] + summary["death_rate"]
+    summary = summary.round(2)
 
     summary = summary.sort_values(by="net_rate", ascending=False)
     summary.columns = [
@@ -33,9 +42,15 @@ def main():
         "GVA per Capita (£)",
         "Churn Index",
     ]
+    return summary
+
+
+@stage("analysis_table")
+def main():
+    summary = league_table(read_dataset("analysis_dataset"))
     print(summary.to_markdown())
 
-    summary.to_csv(PROCESSED_DIR / "analysis_regional_league_table.csv")
+    summary.to_csv(LEAGUE_TABLE_FILE)
 
 
 if __name__ == "__main__":
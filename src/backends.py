@@ -0,0 +1,240 @@
+# -- Imports --
+import pandas as pd
+from cleaning_helpers import prefix_mask
+from config import PROCESSED_FORMAT
+from metrics import evaluate
+from run_report import traced
+from storage import dataset_files, read_dataset
+
+KEYS = ["geo_id", "year"]
+
+# -- Backends --
+# The merge and derive stages are written once against the operations below, and each
+# backend implements them on its own table type:
+#   scan(name, columns, years, prefixes)  read a processed dataset with filters pushed down
+#   join(base, measures, keys)            left join (table, columns) pairs onto base
+#   derive(table, formulas)               add columns from {name: arithmetic formula}, with
+#                                         division by zero and other non-finite results missing
+#   dropna(table, column)                 drop rows where column is missing
+#   sort(table, columns)                  stable sort
+#   collect(table)                        run the query and return a pandas DataFrame
+#
+# "pandas" is eager and is the default. "polars" builds a LazyFrame and "duckdb" a SQL query,
+# so nothing is read until collect(), the year and prefix filters are pushed into the Parquet
+# scan, and joins run multi-threaded. Polars and DuckDB are optional and only imported when
+# their backend is used. The lazy backends only read Parquet.
+
+
+def _lazy_files(name: str) -> list:
+    if PROCESSED_FORMAT != "parquet":
+        raise ValueError(f"Lazy backends read Parquet, not {PROCESSED_FORMAT}")
+    return [str(path) for path in dataset_files(name) if path.exists()]
+
+
+# -- pandas --
+def _keyed(df: pd.DataFrame, columns: list, years: tuple, keys: list) -> pd.DataFrame:
+    """
+    Filters a table to the year window, then indexes it by its sorted keys.
+    """
+    if years is not None:
+        df = df[df["year"].between(*years)]
+    df = df.set_index(keys)[columns]
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind="stable")
+    return df
+
+
+def join_measures(
+    base: pd.DataFrame, measures: list, years: tuple = None, keys: list = KEYS
+) -> pd.DataFrame:
+    """
+    Left joins any number of measure tables onto a base table by (geo_id, year).
+
+    The year filter is applied to every input before joining, so rows outside the window are
+    never joined. Each input is indexed by sorted (geo_id, year), and every measure is aligned
+    to the base index with one reindex, rather than a chain of hash merges. Keys must be unique
+    in each measure table.
+
+    :param base: Table whose rows are all kept, e.g. demography counts
+    :type base: pd.DataFrame
+    :param measures: (table, columns) pairs to join onto the base
+    :type measures: list
+    :param years: Inclusive (first, last) year window, or None for all years
+    :type years: tuple
+    :param keys: Join keys, (geo_id, year) by default
+    :type keys: list
+    :return: Joined table, in key order
+    :rtype: DataFrame
+    """
+    base_columns = [c for c in base.columns if c not in keys]
+    joined = _keyed(base, base_columns, years, keys)
+
+    aligned = [joined]
+    for table, columns in measures:
+        measure = _keyed(table, columns, years, keys)
+        if not measure.index.is_unique:
+            raise ValueError(f"Duplicate {tuple(keys)} keys in measure {columns}")
+        aligned.append(measure.reindex(joined.index))
+
+    return pd.concat(aligned, axis=1).reset_index()
+
+
+def _pandas_scan(
+    name: str, columns: list = None, years: tuple = None, prefixes: list = None
+) -> pd.DataFrame:
+    df = read_dataset(name, columns=columns, years=years)
+    if prefixes is not None:
+        df = df[prefix_mask(df["geo_code"], prefixes)]
+    return df.reset_index(drop=True)
+
+
+def _pandas_derive(df: pd.DataFrame, formulas: dict) -> pd.DataFrame:
+    return df.assign(**evaluate(df, formulas))
+
+
+def _pandas_sort(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    if df.set_index(columns).index.is_monotonic_increasing:
+        return df
+    return df.sort_values(columns, kind="stable", ignore_index=True)
+
+
+# -- Polars --
+def _polars_scan(
+    name: str, columns: list = None, years: tuple = None, prefixes: list = None
+):
+    import polars as pl
+
+    table = pl.scan_parquet(_lazy_files(name))
+    if years is not None:
+        table = table.filter(pl.col("year").is_between(*years))
+    if prefixes is not None:
+        code = pl.col("geo_code").cast(pl.String)
+        table = table.filter(
+            pl.any_horizontal([code.str.starts_with(p) for p in prefixes])
+        )
+    if columns is not None:
+        table = table.select(columns)
+    return table
+
+
+def _polars_join(base, measures: list, keys: list = KEYS):
+    for table, columns in measures:
+        base = base.join(
+            table.select(keys + columns), on=keys, how="left", maintain_order="left"
+        )
+    return base
+
+
+def _polars_derive(table, formulas: dict):
+    import polars as pl
+
+    for name, formula in formulas.items():
+        value = pl.sql_expr(formula).cast(pl.Float64)
+        table = table.with_columns(pl.when(value.is_finite()).then(value).alias(name))
+    return table
+
+
+def _polars_sort(table, columns: list):
+    return table.sort(columns, maintain_order=True)
+
+
+def _polars_collect(table) -> pd.DataFrame:
+    return table.collect().to_pandas()
+
+
+# -- DuckDB --
+# Tables are SQL query strings, run by collect() on an in-process connection.
+def _duckdb_scan(
+    name: str, columns: list = None, years: tuple = None, prefixes: list = None
+) -> str:
+    select = ", ".join(columns) if columns is not None else "*"
+    where = []
+    if years is not None:
+        where.append(f"year BETWEEN {int(years[0])} AND {int(years[1])}")
+    if prefixes is not None:
+        where.append(
+            "(" + " OR ".join(f"starts_with(geo_code, '{p}')" for p in prefixes) + ")"
+        )
+    query = f"SELECT {select} FROM read_parquet({_lazy_files(name)!r})"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    return query
+
+
+def _duckdb_join(base: str, measures: list, keys: list = KEYS) -> str:
+    for table, columns in measures:
+        selected = ", ".join(keys + columns)
+        base = (
+            f"SELECT * FROM ({base}) LEFT JOIN (SELECT {selected} FROM ({table})) "
+            f"USING ({', '.join(keys)})"
+        )
+    return base
+
+
+def _duckdb_derive(table: str, formulas: dict) -> str:
+    for name, formula in formulas.items():
+        value = f"CAST({formula} AS DOUBLE)"
+        table = f"SELECT *, CASE WHEN isfinite({value}) THEN {value} END AS {name} FROM ({table})"
+    return table
+
+
+def _duckdb_dropna(table: str, column: str) -> str:
+    return f"SELECT * FROM ({table}) WHERE {column} IS NOT NULL"
+
+
+def _duckdb_sort(table: str, columns: list) -> str:
+    return f"SELECT * FROM ({table}) ORDER BY {', '.join(columns)}"
+
+
+def _duckdb_collect(table: str) -> pd.DataFrame:
+    import duckdb
+
+    with duckdb.connect() as con:
+        return con.sql(table).df()
+
+
+BACKENDS = {
+    "pandas": {
+        "scan": _pandas_scan,
+        "join": lambda base, measures, keys=KEYS: join_measures(
+            base, measures, keys=keys
+        ),
+        "derive": _pandas_derive,
+        "dropna": lambda df, column: df.dropna(subset=[column]),
+        "sort": _pandas_sort,
+        "collect": lambda df: df,
+    },
+    "polars": {
+        "scan": _polars_scan,
+        "join": _polars_join,
+        "derive": _polars_derive,
+        "dropna": lambda table, column: table.drop_nulls(subset=[column]),
+        "sort": _polars_sort,
+        "collect": _polars_collect,
+    },
+    "duckdb": {
+        "scan": _duckdb_scan,
+        "join": _duckdb_join,
+        "derive": _duckdb_derive,
+        "dropna": _duckdb_dropna,
+        "sort": _duckdb_sort,
+        "collect": _duckdb_collect,
+    },
+}
+
+
+def get_backend(name: str) -> dict:
+    """
+    The operations of a backend, by name.
+
+    :param name: "pandas", "polars" or "duckdb"
+    :type name: str
+    :return: Dict of operation name to function, each recorded as a step in run reports
+    :rtype: dict
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend: {name}, choose from {list(BACKENDS)}")
+    detail = ("name", "columns", "years")
+    return {
+        op: traced(func, name=op, detail=detail) for op, func in BACKENDS[name].items()
+    }
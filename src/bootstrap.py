@@ -0,0 +1,184 @@
+# -- Imports --
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Resampling is done with weights rather than index lists: a resample that draws row i three times
+# gives row i a weight of 3. Every resample then has the same shape, so a whole batch of resamples
+# is a (resamples x rows) weight matrix, and each statistic is a few matrix products over it.
+# Block resampling draws whole groups (e.g. every year of an LA) and gives each row its group's weight.
+
+
+# -- Resampling --
+def resample_weights(
+    n_resamples: int, groups: np.ndarray, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Bootstrap weights for a batch of resamples, drawing groups with replacement.
+
+    :param n_resamples: Number of resamples
+    :type n_resamples: int
+    :param groups: Group number of every row, 0 to n_groups - 1. Use np.arange(n_rows) to
+        resample rows on their own
+    :type groups: np.ndarray
+    :param rng: Random generator
+    :type rng: np.random.Generator
+    :return: Weight of every row in every resample, shape (n_resamples, n_rows)
+    :rtype: np.ndarray
+    """
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    counts = rng.multinomial(n_groups, np.full(n_groups, 1 / n_groups), n_resamples)
+    return counts[:, groups].astype("float64")
+
+
+# -- Weighted Statistics --
+def weighted_correlations(weights: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Pearson correlation matrix of the columns of values, for every row of weights at once.
+
+    :param weights: Row weights, shape (n_resamples, n_rows)
+    :type weights: np.ndarray
+    :param values: Variables, shape (n_rows, n_vars)
+    :type values: np.ndarray
+    :return: Correlation matrices, shape (n_resamples, n_vars, n_vars)
+    :rtype: np.ndarray
+    """
+    n_vars = values.shape[1]
+    # Centre on the full-sample mean first, so the sums of products stay well conditioned
+    values = values - values.mean(axis=0)
+    products = (values[:, :, None] * values[:, None, :]).reshape(len(values), -1)
+
+    total = weights.sum(axis=1)[:, None]
+    means = weights @ values / total
+    second = (weights @ products / total).reshape(-1, n_vars, n_vars)
+    cov = second - means[:, :, None] * means[:, None, :]
+    sd = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+    return cov / (sd[:, :, None] * sd[:, None, :])
+
+
+def weighted_ols(weights: np.ndarray, X: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Least squares coefficients for every row of weights at once, from batched normal equations.
+
+    :param weights: Row weights, shape (n_resamples, n_rows)
+    :type weights: np.ndarray
+    :param X: Regressors including any constant, shape (n_rows, n_coefs)
+    :type X: np.ndarray
+    :param y: Response, shape (n_rows,)
+    :type y: np.ndarray
+    :return: Coefficients, shape (n_resamples, n_coefs)
+    :rtype: np.ndarray
+    """
+    n_coefs = X.shape[1]
+    # Scale columns so X'WX is well conditioned, then scale the coefficients back
+    scale = np.abs(X).max(axis=0)
+    scale[scale == 0] = 1
+    Xs = X / scale
+    products = (Xs[:, :, None] * Xs[:, None, :]).reshape(len(Xs), -1)
+
+    xtwx = (weights @ products).reshape(-1, n_coefs, n_coefs)
+    xtwy = weights @ (Xs * y[:, None])
+    return np.linalg.solve(xtwx, xtwy[:, :, None])[:, :, 0] / scale
+
+
+# -- Bootstrap --
+def _bootstrap_batch(
+    seed: np.random.SeedSequence,
+    n_resamples: int,
+    groups: np.ndarray,
+    values: np.ndarray,
+    X: np.ndarray,
+    y: np.ndarray,
+) -> tuple:
+    """
+    One batch of resamples. Kept at module level so it can be sent to worker processes.
+    """
+    weights = resample_weights(n_resamples, groups, np.random.default_rng(seed))
+    return weighted_correlations(weights, values), weighted_ols(weights, X, y)
+
+
+def bootstrap(
+    values: np.ndarray,
+    X: np.ndarray,
+    y: np.ndarray,
+    groups: np.ndarray = None,
+    n_resamples: int = 2000,
+    seed: int = 0,
+    batch_size: int = 500,
+    workers: int = 1,
+) -> tuple:
+    """
+    Bootstrap distributions of a correlation matrix and of regression coefficients, from the same
+    resamples.
+
+    Resamples are split into batches of batch_size, each with its own seed spawned from seed, so
+    the result is the same whatever the number of workers. Batches bound the memory used by the
+    weight matrices, and with workers > 1 they are spread over a process pool.
+
+    :param values: Variables to correlate, shape (n_rows, n_vars)
+    :type values: np.ndarray
+    :param X: Regressors including any constant, shape (n_rows, n_coefs)
+    :type X: np.ndarray
+    :param y: Response, shape (n_rows,)
+    :type y: np.ndarray
+    :param groups: Group number of every row for block resampling, rows on their own if not passed
+    :type groups: np.ndarray
+    :param n_resamples: Number of resamples
+    :type n_resamples: int
+    :param seed: Random seed
+    :type seed: int
+    :param batch_size: Resamples per batch
+    :type batch_size: int
+    :param workers: Number of worker processes, 1 runs serially
+    :type workers: int
+    :return: Correlation matrices (n_resamples, n_vars, n_vars) and coefficients (n_resamples, n_coefs)
+    :rtype: tuple
+    """
+    if groups is None:
+        groups = np.arange(len(y))
+    sizes = [
+        min(batch_size, n_resamples - start)
+        for start in range(0, n_resamples, batch_size)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(s, size, groups, values, X, y) for s, size in zip(seeds, sizes)]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(args))) as pool:
+            results = list(pool.map(_bootstrap_batch, *zip(*args)))
+    else:
+        results = [_bootstrap_batch(*a) for a in args]
+
+    correlations = np.concatenate([r[0] for r in results])
+    coefficients = np.concatenate([r[1] for r in results])
+    return correlations, coefficients
+
+
+def intervals(
+    samples: np.ndarray, estimates: np.ndarray, names: list, level: float = 0.95
+) -> pd.DataFrame:
+    """
+    Percentile confidence intervals and standard errors from bootstrap samples.
+
+    :param samples: Bootstrap statistics, shape (n_resamples, n_stats)
+    :type samples: np.ndarray
+    :param estimates: Full-sample statistics, shape (n_stats,)
+    :type estimates: np.ndarray
+    :param names: Name of each statistic
+    :type names: list
+    :param level: Confidence level
+    :type level: float
+    :return: estimate, std_error, ci_lower and ci_upper for every statistic
+    :rtype: DataFrame
+    """
+    tail = (1 - level) / 2 * 100
+    lower, upper = np.nanpercentile(samples, [tail, 100 - tail], axis=0)
+    return pd.DataFrame(
+        {
+            "estimate": estimates,
+            "std_error": np.nanstd(samples, axis=0, ddof=1),
+            "ci_lower": lower,
+            "ci_upper": upper,
+        },
+        index=pd.Index(names, name="statistic"),
+    )
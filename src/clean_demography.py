@@ -1,40 +1,144 @@
 # -- Imports --
-from config import DEMOGRAPHY_FILE, PROCESSED_DIR
+from config import DEMOGRAPHY_FILE
 from cleaning_helpers import (
     normalise_geo,
-    check_duplicates,
+    sheet_years,
+    stage_arguments,
+    validate_append,
 )
+from geography import attach_geo_id
+from raw_cache import read_excel_cached
+from run_report import stage, step, traced
+from storage import append_dataset, dataset_years, read_dataset, write_dataset
+import re
 import pandas as pd
 
+# -- Sheet Specs --
+# Every sheet read from the DEMOGRAPHY_FILE. "layout" is either "single" (one year column)
+# or "multi" (several year columns), which picks the cleaning function to use.
+DEMOGRAPHY_SHEETS = [
+    {
+        "sheet_name": "Table 1.1a",
+        "layout": "single",
+        "header": 3,
+        "value_name": "births",
+    },
+    {
+        "sheet_name": "Table 1.1b",
+        "layout": "single",
+        "header": 3,
+        "value_name": "births",
+    },
+    {
+        "sheet_name": "Table 1.1c",
+        "layout": "multi",
+        "header": 3,
+        "value_name": "births",
+    },
+    {
+        "sheet_name": "Table 1.1d",
+        "layout": "single",
+        "header": 3,
+        "value_name": "births",
+    },
+    {
+        "sheet_name": "Table 2.1a",
+        "layout": "single",
+        "header": 3,
+        "value_name": "deaths",
+    },
+    {
+        "sheet_name": "Table 2.1b",
+        "layout": "single",
+        "header": 3,
+        "value_name": "deaths",
+    },
+    {
+        "sheet_name": "Table 2.1c",
+        "layout": "multi",
+        "header": 3,
+        "value_name": "deaths",
+    },
+    {
+        "sheet_name": "Table 2.1d",
+        "layout": "single",
+        "header": 3,
+        "value_name": "deaths",
+    },
+    {
+        "sheet_name": "Table 3.1a",
+        "layout": "single",
+        "header": 3,
+        "value_name": "active",
+    },
+    {
+        "sheet_name": "Table 3.1b",
+        "layout": "single",
+        "header": 3,
+        "value_name": "active",
+    },
+    {
+        "sheet_name": "Table 3.1c",
+        "layout": "multi",
+        "header": 3,
+        "value_name": "active",
+    },
+    {
+        "sheet_name": "Table 3.1d",
+        "layout": "single",
+        "header": 3,
+        "value_name": "active",
+    },
+]
+
+
+# Table number of each measure. A new ONS release adds the next sheet, e.g. "Table 1.1e"
+MEASURE_TABLES = {"1": "births", "2": "deaths", "3": "active"}
+SHEET_PATTERN = re.compile(r"Table ([0-9]+)\.1([a-z])$")
+
+
+# -- Loading Functions --
+@traced
+def load_demography_sheets(path_name=DEMOGRAPHY_FILE, specs=DEMOGRAPHY_SHEETS) -> dict:
+    """
+    Reads every sheet listed in the specs from the workbook in one pass.
+
+    The workbook is opened once, and sheets sharing a header row are parsed in a single
+    pd.read_excel call, instead of unzipping and re-reading the file for every sheet.
+    Sheets already in the raw cache are not parsed at all.
+
+    :param path_name: File path of the excel file
+    :type path_name: str
+    :param specs: Sheet specs to read, see DEMOGRAPHY_SHEETS
+    :type specs: list
+    :return: Raw DataFrames keyed by sheet name
+    :rtype: dict
+    """
+    sheets = {}
+    headers = sorted({spec["header"] for spec in specs})
+    for header in headers:
+        names = [spec["sheet_name"] for spec in specs if spec["header"] == header]
+        sheets.update(read_excel_cached(path_name, sheet_name=names, header=header))
+    return sheets
+
 
 # -- Cleaning Functions --
-def clean_single_year(
-    path_name: str, sheet_name: str, header: int, value_name: str
-) -> pd.DataFrame:
+def clean_single_year(df: pd.DataFrame, value_name: str) -> pd.DataFrame:
     """
     Cleans ONS Demographic Excel sheets that are of the format where there is a single year column with values under it.
-    It reads a sheet where the third column header is the year and the values are under it.
+    It takes a sheet already read into memory where the third column header is the year and the values are under it.
 
-    1) Reads Excel File with passed parameters
-    2) Renames the columns to be normalised with other processed datasets
-    3) Parses the year columns
-    4) Melts from wide to long format so there is only one year column, and the associated values for births/deaths/actives in this case
-    5) Then, makes year integer columns, and drops null rows
+    1) Renames the columns to be normalised with other processed datasets
+    2) Parses the year column
+    3) Adds the year as its own column, and drops null rows
 
-
-    :param path_name: File path of the excel file
-    :type path_name: str
-    :param sheet_name: Sheet name of the excel file
-    :type sheet_name: str
-    :param header: Row number to use as the column names
-    :type header: int
+    :param df: Raw sheet, as returned by load_demography_sheets
+    :type df: pd.DataFrame
     :param value_name: Name for the values column
     :type value_name: str
     :return: Cleaned DataFrame
     :rtype: DataFrame
     """
-    df = pd.read_excel(path_name, sheet_name=sheet_name, header=header)
-
     # Identify columns based on format
     geo_code_col = df.columns[0]
     geo_name_col = df.columns[1]
@@ -55,34 +159,23 @@ def clean_single_year(
     return df[["geo_code", "geo_name", "year", value_name]]
 
 
-def clean_multi_year(
-    path_name: str, sheet_name: str, header: int, value_name: str
-) -> pd.DataFrame:
+def clean_multi_year(df: pd.DataFrame, value_name: str) -> pd.DataFrame:
     """
-    Read ONS Demographic Excel sheets where columns from  3 onwards are multiple years (e.g 2021, 2022, 2023)
+    Cleans ONS Demographic Excel sheets where columns from 3 onwards are multiple years (e.g 2021, 2022, 2023).
+    It takes a sheet already read into memory.
 
-    1) Reads Excel File with passed parameters
-    2) Renames the columns to be normalised with other processed datasets
-    3) Automatically parses the year columns
-    4) Melts from wide to long format so there is only one year column, and the associated values for births/deaths/actives in this case
-    5) Then, makes year integer columns, and drops null rows
+    1) Renames the columns to be normalised with other processed datasets
+    2) Automatically parses the year columns
+    3) Melts from wide to long format so there is only one year column, and the associated values for births/deaths/actives in this case
+    4) Then, makes year integer columns, and drops null rows
 
-    :param path_name: File path of the excel file
-    :type path_name: str
-    :param sheet_name: Sheet name of the excel file
-    :type sheet_name: str
-    :param header: Row number to use as the column names
-    :type header: int
+    :param df: Raw sheet, as returned by load_demography_sheets
+    :type df: pd.DataFrame
     :param value_name: Name for the values column
     :type value_name: str
-    :return: Cleaned DataFrame
-    :rtype: DataFrame
-
     :return: Cleaned DataFrame
     :rtype: DataFrame
     """
-    df = pd.read_excel(path_name, sheet_name=sheet_name, header=header)
-
     # Rename columns to standardise names
     df = df.rename(
         columns={
@@ -107,159 +200,229 @@ def clean_multi_year(
     return df[["geo_code", "geo_name", "year", value_name]]
 
 
-def build_births() -> pd.DataFrame:
+CLEANERS = {"single": clean_single_year, "multi": clean_multi_year}
+
+
+def build_measure(value_name: str, sheets: dict = None) -> pd.DataFrame:
     """
-    Builds the births DataFrame by cleaning and combining multiple sheets from the DEMOGRAPHY_FILE. Calls the relevant cleaning functions.
+    Builds one measure (births, deaths or active) by cleaning and combining every sheet in DEMOGRAPHY_SHEETS for that measure.
 
-    :return: Cleaned and standardised births DataFrame
+    :param value_name: Measure to build, matching the value_name in the sheet specs
+    :type value_name: str
+    :param sheets: Raw sheets from load_demography_sheets, loaded if not passed
+    :type sheets: dict
+    :return: Cleaned and standardised DataFrame for the measure
     :rtype: DataFrame
     """
-    births_2019 = clean_single_year(
-        path_name=DEMOGRAPHY_FILE,
-        sheet_name="Table 1.1a",
-        header=3,
-        value_name="births",
-    )
-    births_2020 = clean_single_year(
-        path_name=DEMOGRAPHY_FILE,
-        sheet_name="Table 1.1b",
-        header=3,
-        value_name="births",
-    )
-    births_21_23 = clean_multi_year(
-        path_name=DEMOGRAPHY_FILE,
-        sheet_name="Table 1.1c",
-        header=3,
-        value_name="births",
-    )
-    births_2024 = clean_single_year(
-        path_name=DEMOGRAPHY_FILE,
-        sheet_name="Table 1.1d",
-        header=3,
-        value_name="births",
-    )
+    specs = [spec for spec in DEMOGRAPHY_SHEETS if spec["value_name"] == value_name]
+    if sheets is None:
+        sheets = load_demography_sheets(specs=specs)
 
-    births_all = pd.concat(
-        [births_2019, births_2020, births_21_23, births_2024],
-        ignore_index=True,
-    )
-    births_all = normalise_geo(births_all)
-    return births_all
+    frames = [
+        CLEANERS[spec["layout"]](sheets[spec["sheet_name"]], value_name)
+        for spec in specs
+    ]
+    measure_all = pd.concat(frames, ignore_index=True)
+    measure_all = normalise_geo(measure_all)
+    return measure_all
 
 
-def build_deaths() -> pd.DataFrame:
+def build_births(sheets: dict = None) -> pd.DataFrame:
     """
-    Cleans and combines multiple sheets from the DEMOGRAPHY_FILE to build the deaths DataFrame.
+    Builds the births DataFrame from the Table 1.1 sheets of the DEMOGRAPHY_FILE.
 
-    :return: Cleaned and standardised deaths DataFrame
+    :param sheets: Raw sheets from load_demography_sheets, loaded if not passed
+    :type sheets: dict
+    :return: Cleaned and standardised births DataFrame
     :rtype: DataFrame
     """
-    deaths_2019 = clean_single_year(
-        path_name=DEMOGRAPHY_FILE,
-        sheet_name="Table 2.1a",
-        header=3,
-        value_name="deaths",
-    )
-    deaths_2020 = clean_single_year(
-        path_name=DEMOGRAPHY_FILE,
-        sheet_name="Table 2.1b",
-        header=3,
-        value_name="deaths",
-    )
-    deaths_21_23 = clean_multi_year(
-        path_name=DEMOGRAPHY_FILE,
-        sheet_name="Table 2.1c",
-        header=3,
-        value_name="deaths",
-    )
-    deaths_2024 = clean_single_year(
-        path_name=DEMOGRAPHY_FILE,
-        sheet_name="Table 2.1d",
-        header=3,
-        value_name="deaths",
-    )
+    return build_measure("births", sheets)
 
-    deaths_all = pd.concat(
-        [deaths_2019, deaths_2020, deaths_21_23, deaths_2024],
-        ignore_index=True,
-    )
-    deaths_all = normalise_geo(deaths_all)
-    return deaths_all
 
+def build_deaths(sheets: dict = None) -> pd.DataFrame:
+    """
+    Builds the deaths DataFrame from the Table 2.1 sheets of the DEMOGRAPHY_FILE.
 
-def build_active() -> pd.DataFrame:
+    :param sheets: Raw sheets from load_demography_sheets, loaded if not passed
+    :type sheets: dict
+    :return: Cleaned and standardised deaths DataFrame
+    :rtype: DataFrame
     """
-    Cleans and combines multiple sheets from the DEMOGRAPHY_FILE to build the active businesses DataFrame.
+    return build_measure("deaths", sheets)
 
+
+def build_active(sheets: dict = None) -> pd.DataFrame:
+    """
+    Builds the active businesses DataFrame from the Table 3.1 sheets of the DEMOGRAPHY_FILE.
+
+    :param sheets: Raw sheets from load_demography_sheets, loaded if not passed
+    :type sheets: dict
     :return: Cleaned and standardised active businesses DataFrame
     :rtype: DataFrame
     """
-    active_2019 = clean_single_year(
-        path_name=DEMOGRAPHY_FILE,
-        sheet_name="Table 3.1a",
-        header=3,
-        value_name="active",
-    )
-    active_2020 = clean_single_year(
-        path_name=DEMOGRAPHY_FILE,
-        sheet_name="Table 3.1b",
-        header=3,
-        value_name="active",
-    )
-    active_21_23 = clean_multi_year(
-        path_name=DEMOGRAPHY_FILE,
-        sheet_name="Table 3.1c",
-        header=3,
-        value_name="active",
-    )
-    active_2024 = clean_single_year(
-        path_name=DEMOGRAPHY_FILE,
-        sheet_name="Table 3.1d",
-        header=3,
-        value_name="active",
-    )
+    return build_measure("active", sheets)
 
-    active_all = pd.concat(
-        [active_2019, active_2020, active_21_23, active_2024],
-        ignore_index=True,
-    )
-    active_all = normalise_geo(active_all)
-    return active_all
 
+@traced
+def stack_sheets(sheets: dict, specs: list = DEMOGRAPHY_SHEETS) -> pd.DataFrame:
+    """
+    Cleans every sheet and stacks them into one long frame, with a measure column saying
+    which value (births, deaths, active...) each row holds.
+
+    :param sheets: Raw sheets from load_demography_sheets
+    :type sheets: dict
+    :param specs: Sheet specs to stack, see DEMOGRAPHY_SHEETS
+    :type specs: list
+    :return: Long DataFrame with geo_code, geo_name, year, measure and value
+    :rtype: DataFrame
+    """
+    frames = []
+    for spec in specs:
+        raw = sheets[spec["sheet_name"]]
+        with step("clean_sheet", sheet=spec["sheet_name"], layout=spec["layout"]) as s:
+            s.input(raw)
+            df = CLEANERS[spec["layout"]](raw, "value")
+            df["measure"] = spec["value_name"]
+            s.output(df)
+        frames.append(df)
+
+    long = pd.concat(frames, ignore_index=True)
+    return normalise_geo(long)
+
+
+@traced
+def reshape_counts(long: pd.DataFrame, geography: pd.DataFrame) -> tuple:
+    """
+    Pivots the stacked measures to one row per (geo_id, year) and one column per measure, in one reshape.
+
+    Duplicates are found while building the pivot index, rather than in a separate pass. Codes and names
+    come from the geography dimension, as names can differ between sheets for the same area.
+    Every (geo_id, year) in any sheet gets a row, with NaN for measures it has no value for.
+
+    :param long: Stacked sheets from stack_sheets, with geo_id
+    :type long: pd.DataFrame
+    :param geography: Geography dimension
+    :type geography: pd.DataFrame
+    :return: (wide counts DataFrame, duplicated rows DataFrame)
+    :rtype: tuple
+    """
+    measures = list(pd.unique(long["measure"]))
+    indexed = long.set_index(["geo_id", "year", "measure"])["value"]
+    dup_columns = ["geo_code", "geo_name", "year", "measure"]
+    if not indexed.index.is_unique:
+        dup_mask = indexed.index.duplicated(keep=False)
+        return None, long.loc[dup_mask, dup_columns]
+
+    wide = indexed.unstack("measure")[measures]
+    wide = wide.reset_index()
+    wide.columns.name = None
+
+    positions = pd.Index(geography["geo_id"]).get_indexer(wide["geo_id"])
+    wide.insert(1, "geo_code", geography["geo_code"].to_numpy()[positions])
+    wide.insert(2, "geo_name", geography["geo_name"].to_numpy()[positions])
+    return wide, long.loc[[], dup_columns]
 
-def main():
+
+def demography_counts(long: pd.DataFrame, geography: pd.DataFrame) -> pd.DataFrame:
     """
-    Main function to build and save the combined demography dataset.
+    The business demography counts dataset from stacked sheets, without reading or writing files.
 
-    :return: None
-    :rtype: None
+    :param long: Stacked sheets from stack_sheets, left unchanged
+    :type long: pd.DataFrame
+    :param geography: Geography dimension
+    :type geography: pd.DataFrame
+    :return: One row per (geo_id, year), with births, deaths and active
+    :rtype: DataFrame
     """
+    long = attach_geo_id(long.copy(), geography)
+    counts, dup_rows = reshape_counts(long, geography)
+    if len(dup_rows) > 0:
+        raise ValueError(f"{len(dup_rows)} duplicate rows in the demography sheets")
+    return counts
 
-    # Build individual datasets
-    births_all = build_births()
-    deaths_all = build_deaths()
-    active_all = build_active()
 
-    # Merge datasets on geo_code, geo_name, and year
-    demog_counts = (
-        births_all.merge(deaths_all, on=["geo_code", "geo_name", "year"], how="left")
-        .merge(active_all, on=["geo_code", "geo_name", "year"], how="left")
-        .sort_values(["geo_code", "year"])
-    )
+def new_sheet_specs(
+    existing_years: set, path_name=DEMOGRAPHY_FILE, header: int = 3
+) -> list:
+    """
+    Specs for the sheets holding years not in existing_years, including sheets added by a new
+    release that are not in DEMOGRAPHY_SHEETS yet. Only the header row of each sheet is read.
 
-    # Check for duplicates
-    dup_rows = check_duplicates(demog_counts)
-    if len(dup_rows) > 0:
-        print("Duplicate rows found")
-        print(dup_rows)
+    :param existing_years: Years already in the processed dataset
+    :type existing_years: set
+    :param path_name: File path of the excel file
+    :type path_name: str
+    :param header: Header row of sheets not in DEMOGRAPHY_SHEETS
+    :type header: int
+    :return: Sheet specs, see DEMOGRAPHY_SHEETS
+    :rtype: list
+    """
+    known = {spec["sheet_name"]: spec for spec in DEMOGRAPHY_SHEETS}
+    specs = []
+    with pd.ExcelFile(path_name) as workbook:
+        for sheet_name in workbook.sheet_names:
+            match = SHEET_PATTERN.match(sheet_name)
+            if sheet_name not in known and not (
+                match and match.group(1) in MEASURE_TABLES
+            ):
+                continue
+
+            spec = known.get(sheet_name)
+            sheet_header = spec["header"] if spec else header
+            years = sheet_years(workbook, sheet_name, sheet_header)
+            if not years - existing_years:
+                continue
+            if spec is None:
+                spec = {
+                    "sheet_name": sheet_name,
+                    "layout": "single" if len(years) == 1 else "multi",
+                    "header": header,
+                    "value_name": MEASURE_TABLES[match.group(1)],
+                }
+            specs.append(spec)
+    return specs
+
+
+@stage("clean_demography")
+def main(append: bool = False):
+    """
+    Main function to build and save the combined demography dataset with demography_counts.
 
-    # Save the cleaned demography counts dataset as a csv file
+    With append=True, only sheets with years missing from the processed dataset are parsed,
+    and the new years are appended to it without rewriting the existing data.
+
+    :param append: Append new years instead of rebuilding everything
+    :type append: bool
+    :return: None
+    :rtype: None
+    """
+    existing_years = dataset_years("business_demography_counts") if append else set()
+    specs = new_sheet_specs(existing_years) if append else DEMOGRAPHY_SHEETS
+    if not specs:
+        print("No new years to append")
+        return
+
+    # Read every sheet once, stack them, then reshape to one column per measure
+    sheets = load_demography_sheets(specs=specs)
+    long = stack_sheets(sheets, specs)
+    long = long[~long["year"].isin(list(existing_years))]
+    demog_counts = demography_counts(long, read_dataset("geography"))
+
+    if append:
+        bad_rows = validate_append(demog_counts, existing_years)
+        if len(bad_rows) > 0:
+            print("Rows clash with the existing dataset")
+            print(bad_rows)
+        else:
+            paths = append_dataset(demog_counts, "business_demography_counts")
+            print(f"Appended {len(demog_counts)} rows in {len(paths)} new years")
+
+    # Save the cleaned demography counts dataset
     else:
-        PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-        path = PROCESSED_DIR / "business_demography_counts.csv"
-        demog_counts.to_csv(path, index=False)
+        path = write_dataset(demog_counts, "business_demography_counts")
         print(f"Saved {len(demog_counts)} rows to {path}")
 
 
 if __name__ == "__main__":
-    main()
+    args = stage_arguments("Clean the business demography tables.")
+    main(append=args.append)
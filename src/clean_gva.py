@@ -1,100 +1,158 @@
 # -- Imports --
-from config import PROCESSED_DIR, GVA_DIR
-from pathlib import Path
-from cleaning_helpers import normalise_geo, check_duplicates
+from config import GVA_DIR
+from concurrent.futures import ProcessPoolExecutor
+from cleaning_helpers import (
+    normalise_geo,
+    check_duplicates,
+    stage_arguments,
+    validate_append,
+)
+from geography import attach_geo_id
+from run_report import stage, traced
+from storage import append_dataset, dataset_years, read_dataset, write_dataset
 import pandas as pd
 
 
-# -- Cleaning Functions --
-def clean_single_gva(path_name: Path, sheet_name: str, header: int) -> pd.DataFrame:
+# -- Reading Functions --
+def _cell_value(value):
     """
-    Cleans a single GVA Excel sheet where columns from 3 onwards are multiple years (e.g 2021, 2022, 2023).
-
-    1) Reads Excel File with passed parameters
-    2) Renames the columns to be standardised with other processed datasets
-    3) Filters to only the 'Total' SIC07 rows, representing the total GVA for the area
-    4) Automatically parses the year columns
-    5) Melts from wide to long format so there is only one year column, and the associated values for GVA in this case
-    6) Then, makes year integer columns, and drops null rows
-
-    :param path_name: File path of the excel file
-    :type path_name: str
-    :param sheet_name: Sheet name of the excel file
-    :type sheet_name: str
-    :param header: Row number to use as the column names
-    :type header: int
-    :return: Cleaned DataFrame
-    :rtype: DataFrame
+    Matches pandas' handling of openpyxl cells, so whole number floats become ints
     """
-    df = pd.read_excel(path_name, sheet_name=sheet_name, header=header)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
 
-    # Rename columns to standard names
-    df = df.rename(columns={"LA code": "geo_code", "LA name": "geo_name"})
 
-    # Filter to only the 'Total' SIC07 rows
-    total_gva = df[df["SIC07"] == "Total"].copy()
+def gva_files() -> list:
+    """
+    The regional GVA workbooks, in sorted filename order.
+
+    :return: List of file paths
+    :rtype: list
+    """
+    return sorted(GVA_DIR.glob("regionalgrossvalueadded*.xlsx"))
 
-    # Identify year columns automatically
-    years_cols = [c for c in total_gva.columns if str(c).isdigit() and len(str(c)) == 4]
 
-    # Melt from wide to long format
-    total_gva = pd.melt(
-        total_gva,
-        id_vars=["geo_code", "geo_name"],
-        value_vars=years_cols,
-        var_name="year",
-        value_name="gva_million",
-    )
+def parse_files(parse, files: list, workers: int = 1, *args) -> dict:
+    """
+    Calls parse(file, *args) on every file, in a process pool with more than one worker. A file that
+    fails is reported and skipped, so one corrupt workbook does not stop the others being parsed.
+
+    :param parse: Module level function taking a file path, so it can be sent to worker processes
+    :param files: File paths, in the order the results should come back in
+    :type files: list
+    :param workers: Number of worker processes, 1 runs serially
+    :type workers: int
+    :param args: Further arguments passed to parse after the file
+    :return: Results keyed by file, in the order of files, without the files that failed
+    :rtype: dict
+    """
+    if not files:
+        raise FileNotFoundError(f"No GVA workbooks found in {GVA_DIR}")
+
+    results = {}
+    failures = {}
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+            futures = {path: pool.submit(parse, path, *args) for path in files}
+            for path, future in futures.items():
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    failures[path] = e
+    else:
+        for path in files:
+            print(f"Processing {path}")
+            try:
+                results[path] = parse(path, *args)
+            except Exception as e:
+                failures[path] = e
 
-    total_gva["year"] = total_gva["year"].astype(int)
-    total_gva["gva_million"] = pd.to_numeric(total_gva["gva_million"], errors="coerce")
+    for path, error in failures.items():
+        print(f"Failed to process {path}: {error}")
+    if not results:
+        raise RuntimeError(f"All {len(files)} GVA workbooks failed to process")
 
-    return total_gva[["geo_code", "geo_name", "year", "gva_million"]]
+    return {path: results[path] for path in files if path in results}
 
 
-def build_gva() -> pd.DataFrame:
+# -- Cleaning Functions --
+def gva_dataset(totals: pd.DataFrame, geography: pd.DataFrame) -> pd.DataFrame:
     """
-    Build the cleaned GVA DataFrame by calling the relevant functions
+    The GVA dataset from the 'Total' rows of every workbook, without reading or writing files.
 
-    :return: Cleaned and normalised GVA DataFrame
+    :param totals: 'Total' rows of every workbook, from total_gva or clean_gva_industry.build_totals
+    :type totals: pd.DataFrame
+    :param geography: Geography dimension
+    :type geography: pd.DataFrame
+    :return: GVA DataFrame with geo_id, geo_code, geo_name, year and gva_million, in (geo_id, year) order
     :rtype: DataFrame
     """
-    # Combine all GVA files
-    all_gva = []
-    gva_files = list(GVA_DIR.glob("regionalgrossvalueadded*.xlsx"))
-    print(f"Found {len(gva_files)} files")
+    gva = attach_geo_id(normalise_geo(totals.copy()), geography)
+    dup_rows = check_duplicates(gva)
+    if len(dup_rows) > 0:
+        raise ValueError(f"{len(dup_rows)} duplicate rows in the GVA workbooks")
+    return gva.sort_values(["geo_id", "year"], ignore_index=True)
+
+
+@traced
+def total_gva(years: list = None) -> pd.DataFrame:
+    """
+    The 'Total' SIC07 rows of the industry-level GVA dataset, which only reads that code from each
+    partition file. Imported here rather than at the top, as clean_gva_industry imports this module.
 
-    for gva_file in gva_files:
-        print(f"Processing {gva_file}")
-        gva = clean_single_gva(path_name=gva_file, sheet_name="Table 2", header=1)
-        gva = normalise_geo(gva)
-        all_gva.append(gva)
+    :param years: Only these years, all years if not passed
+    :type years: list
+    :return: Long DataFrame with geo_code, geo_name, year and gva_million, see gva_dataset
+    :rtype: DataFrame
+    """
+    from clean_gva_industry import TOTAL_COLUMNS, read_gva_industry
 
-    return pd.concat(all_gva, ignore_index=True)
+    return read_gva_industry(columns=TOTAL_COLUMNS, sic07=["Total"], years=years)
 
 
-def main():
+@stage("clean_gva")
+def main(append: bool = False):
     """
-    Main function to build and save the GVA dataset.
+    Main function to build and save the GVA dataset, from the 'Total' rows of the industry-level
+    dataset built by clean_gva_industry.py.
+
+    With append=True, only years missing from the processed dataset are read, and appended
+    without rewriting the existing data.
 
+    :param append: Append new years instead of rebuilding everything
+    :type append: bool
     :return: None
     :rtype: None
     """
-    gva = build_gva()
+    from clean_gva_industry import industry_years
 
-    dup_rows = check_duplicates(gva)
+    existing_years = set()
+    new_years = None
+    if append:
+        existing_years = dataset_years("gva")
+        new_years = sorted(industry_years() - existing_years)
+        if not new_years:
+            print("No new years to append")
+            return
+
+    gva = gva_dataset(total_gva(years=new_years), read_dataset("geography"))
 
     # Quality checks
-    if len(dup_rows) > 0:
-        print("Duplicate rows found")
-        print(dup_rows)
+    if append:
+        bad_rows = validate_append(gva, existing_years)
+        if len(bad_rows) > 0:
+            print("Rows clash with the existing dataset")
+            print(bad_rows)
+        else:
+            paths = append_dataset(gva, "gva")
+            print(f"Appended {len(gva)} rows in {len(paths)} new years")
 
     else:
-        PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-        out_path = PROCESSED_DIR / "gva.csv"
-        gva.to_csv(out_path, index=False)
+        out_path = write_dataset(gva, "gva")
         print(f"\nSaved {len(gva)} rows to {out_path}")
 
 
 if __name__ == "__main__":
-    main()
+    args = stage_arguments("Clean the regional GVA tables.")
+    main(append=args.append)
@@ -0,0 +1,488 @@
+# -- Imports --
+import re
+import shutil
+from pathlib import Path
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from config import GVA_CHUNK_ROWS, GVA_WORKERS
+from cleaning_helpers import normalise_geo, stage_arguments
+from contracts import check_chunk, enforce, merge_states, new_state, report
+from clean_gva import _cell_value, gva_files, parse_files
+from geography import attach_geo_id
+from raw_cache import cached
+from run_report import stage, traced
+from storage import (
+    partitioned_dir,
+    read_dataset,
+    read_partitioned,
+    write_dataset,
+    write_manifest,
+)
+
+# Folder levels of the partitioned output, gva_industry/region=<ITL1 region>/year=<year>/
+PARTITIONS = {"region": pa.string(), "year": pa.int16()}
+
+# Columns stored in each partition file, region and year are in the folder names
+FILE_SCHEMA = pa.schema(
+    [
+        ("geo_id", pa.int32()),
+        ("geo_code", pa.string()),
+        ("geo_name", pa.string()),
+        ("sic07", pa.string()),
+        ("gva_million", pa.float64()),
+    ]
+)
+
+# Columns of the 'Total' rows the GVA dataset is built from, see clean_gva.gva_dataset
+TOTAL_COLUMNS = ["geo_code", "geo_name", "year", "gva_million"]
+
+SECTOR_PATTERN = re.compile(r"^([A-Z])-([A-Z])$")  # e.g. "A-E", production sector
+LETTER_PATTERN = re.compile(r"^([A-Z]{1,2})(?:-[A-Z]{1,2})? \(")  # e.g. "C (10-33)"
+
+
+# -- SIC07 Hierarchy --
+def sic07_hierarchy(codes: dict) -> pd.DataFrame:
+    """
+    Classifies the SIC07 rows of Table 2 into a hierarchy, from the order they appear in for each LA:
+    Total, then sectors (A-E, G-T), sections (C (10-33)), sub-sections of a single-letter section
+    (CA-CB (10-15)) and divisions (41, 49-51, 68IMP). Every row gets its level, its section letters
+    and the code of its parent.
+
+    :param codes: SIC07 code to description, in sheet order
+    :type codes: dict
+    :return: One row per SIC07 code, in sheet order
+    :rtype: DataFrame
+    """
+    sectors = {}
+    rows = []
+    section = subsection = None
+    for code, description in codes.items():
+        sector_match = SECTOR_PATTERN.match(code)
+        letter_match = LETTER_PATTERN.match(code)
+        if code == "Total":
+            level, parent, letters = "total", None, None
+        elif sector_match:
+            sectors[code] = sector_match.groups()
+            level, parent, letters = "sector", "Total", None
+        elif letter_match:
+            letters = letter_match.group(1)
+            if (
+                section is not None
+                and len(section[1]) == 1
+                and len(letters) == 2
+                and letters[0] == section[1]
+            ):
+                level, parent = "subsection", section[0]
+                subsection = code
+                letters = section[1]
+            else:
+                covering = [
+                    sector
+                    for sector, (first, last) in sectors.items()
+                    if first <= letters[0] <= last
+                ]
+                level, parent = "section", covering[0] if covering else "Total"
+                section, subsection = (code, letters), None
+        else:
+            level = "division"
+            parent = subsection or (section[0] if section else "Total")
+            letters = section[1] if section else None
+        rows.append((code, description, level, letters, parent))
+
+    return pd.DataFrame(
+        rows, columns=["sic07", "description", "level", "section", "parent"]
+    )
+
+
+# -- Reading Functions --
+def iter_industry_chunks(
+    path_name: Path,
+    sheet_name: str = "Table 2",
+    header: int = 1,
+    years: list = None,
+    chunk_rows: int = GVA_CHUNK_ROWS,
+):
+    """
+    Streams every SIC07 row of a GVA sheet, yielding it in wide chunks of at most chunk_rows rows,
+    so only one chunk of the sheet is ever held in memory.
+
+    :param path_name: File path of the excel file
+    :type path_name: Path
+    :param sheet_name: Sheet name of the excel file
+    :type sheet_name: str
+    :param header: Row number to use as the column names
+    :type header: int
+    :param years: Only keep these year columns, all years if not passed
+    :type years: list
+    :param chunk_rows: Number of sheet rows per chunk
+    :type chunk_rows: int
+    :return: Wide DataFrames with region, geo_code, geo_name, sic07, description and one column per year
+    """
+    workbook = openpyxl.load_workbook(path_name, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        for _ in range(header):
+            next(rows)
+        columns = [str(c) for c in next(rows)]
+
+        id_idx = [
+            columns.index(c)
+            for c in ["ITL1 region", "LA code", "LA name", "SIC07", "SIC07 description"]
+        ]
+        year_idx = [i for i, c in enumerate(columns) if c.isdigit() and len(c) == 4]
+        if years is not None:
+            year_idx = [i for i in year_idx if int(columns[i]) in years]
+        names = ["region", "geo_code", "geo_name", "sic07", "description"] + [
+            int(columns[i]) for i in year_idx
+        ]
+
+        chunk = []
+        for row in rows:
+            if row[id_idx[3]] is None:
+                continue
+            chunk.append(
+                [row[i] for i in id_idx] + [_cell_value(row[i]) for i in year_idx]
+            )
+            if len(chunk) == chunk_rows:
+                yield pd.DataFrame(chunk, columns=names)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=names)
+    finally:
+        workbook.close()
+
+
+def workbook_years(files: list, sheet_name: str = "Table 2", header: int = 1) -> set:
+    """
+    Year columns in a sheet of any of the GVA workbooks, from the header row of each, so a
+    workbook without data rows still counts. Every workbook is closed before the next is opened.
+
+    :param files: File paths of the excel files
+    :type files: list
+    :param sheet_name: Sheet name of the excel files
+    :type sheet_name: str
+    :param header: Row number of the column names
+    :type header: int
+    :return: Set of years
+    :rtype: set
+    """
+    years = set()
+    for gva_file in files:
+        workbook = openpyxl.load_workbook(gva_file, read_only=True, data_only=True)
+        try:
+            rows = workbook[sheet_name].iter_rows(
+                min_row=header + 1, max_row=header + 1, values_only=True
+            )
+            columns = [str(c) for c in next(rows)]
+        finally:
+            workbook.close()
+        years |= {int(c) for c in columns if c.isdigit() and len(c) == 4}
+    return years
+
+
+# -- Cleaning Functions --
+def melt_rows(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Melts wide rows to long format, one row per LA, SIC07 code and year, with cleaned values.
+
+    :param chunk: Wide chunk from iter_industry_chunks
+    :type chunk: pd.DataFrame
+    :return: Long DataFrame with region, geo_code, geo_name, sic07, year and gva_million
+    :rtype: DataFrame
+    """
+    year_cols = [c for c in chunk.columns if isinstance(c, int)]
+    long = pd.melt(
+        chunk,
+        id_vars=["region", "geo_code", "geo_name", "sic07"],
+        value_vars=year_cols,
+        var_name="year",
+        value_name="gva_million",
+    )
+    long = normalise_geo(long)
+    long["year"] = long["year"].astype(int)
+    long["region"] = long["region"].astype(str).str.strip()
+    long["sic07"] = long["sic07"].astype(str).str.strip()
+    long["gva_million"] = pd.to_numeric(long["gva_million"], errors="coerce")
+    return long
+
+
+@traced
+def melt_chunk(chunk: pd.DataFrame, geography: pd.DataFrame) -> pd.DataFrame:
+    """
+    Melts one wide chunk to long format with melt_rows, and adds the geo_id of every row.
+
+    :param chunk: Wide chunk from iter_industry_chunks
+    :type chunk: pd.DataFrame
+    :param geography: Geography dimension, with geo_id and geo_code
+    :type geography: pd.DataFrame
+    :return: Long DataFrame with region, geo_id, geo_code, geo_name, sic07, year and gva_million
+    :rtype: DataFrame
+    """
+    return attach_geo_id(melt_rows(chunk), geography)
+
+
+@traced(detail=("gva_file",))
+def industry_total_rows(gva_file: Path, years: list = None) -> pd.DataFrame:
+    """
+    The 'Total' SIC07 rows of one GVA workbook, melted and cleaned as write_industry_file writes
+    them, without reading or writing any dataset. Read through the raw cache, keyed on the
+    workbook's content hash and years, so warm reruns skip parsing it. Kept at module level so it
+    can be sent to worker processes.
+
+    :param gva_file: File path of the excel file
+    :type gva_file: Path
+    :param years: Only keep these years, all years if not passed
+    :type years: list
+    :return: Long DataFrame with geo_code, geo_name, year and gva_million
+    :rtype: DataFrame
+    """
+
+    def parse():
+        chunks = [
+            melt_rows(chunk[chunk["sic07"].astype(str).str.strip() == "Total"])
+            for chunk in iter_industry_chunks(gva_file, years=years)
+        ]
+        return pd.concat(chunks, ignore_index=True)[TOTAL_COLUMNS]
+
+    return cached(gva_file, ("gva_totals", years and tuple(years)), parse)
+
+
+@traced(detail=("workers",))
+def build_totals(workers: int = 1, years: list = None) -> pd.DataFrame:
+    """
+    The 'Total' SIC07 rows of every GVA workbook, the same rows clean_gva.total_gva reads back from
+    the industry-level dataset, for building the GVA dataset in memory. Files are parsed by
+    clean_gva.parse_files.
+
+    :param workers: Number of worker processes, 1 runs serially
+    :type workers: int
+    :param years: Only keep these years, all years if not passed
+    :type years: list
+    :return: Long DataFrame with geo_code, geo_name, year and gva_million
+    :rtype: DataFrame
+    """
+    results = parse_files(industry_total_rows, gva_files(), workers, years)
+    return pd.concat(results.values(), ignore_index=True)
+
+
+def year_partition(region: str, year: int, root: Path = None) -> Path:
+    """
+    Folder holding one region and year of the industry-level GVA dataset, or of a build of it under root.
+    """
+    root = partitioned_dir("gva_industry") if root is None else root
+    return root / f"region={region}" / f"year={year}"
+
+
+@traced(detail=("gva_file",))
+def write_industry_file(gva_file: Path, years: list = None, root: Path = None) -> tuple:
+    """
+    Melts Table 2 of one GVA workbook chunk by chunk, writing each chunk straight to its region and
+    year partitions. Each partition gets one file per workbook, with one row group per chunk.
+    Kept at module level so it can be sent to worker processes.
+
+    :param gva_file: File path of the excel file
+    :type gva_file: Path
+    :param years: Only write these years, all years if not passed
+    :type years: list
+    :param root: Folder to write the partitions under, the dataset's own folder if not passed
+    :type root: Path
+    :return: Number of rows written, SIC07 code to description in sheet order, and the data
+        contract state of the rows written
+    :rtype: tuple
+    """
+    geography = read_dataset("geography", columns=["geo_id", "geo_code"])
+    contract = new_state("gva_industry")
+    codes = {}
+    writers = {}
+    n_rows = 0
+    try:
+        for chunk in iter_industry_chunks(gva_file, years=years):
+            for code, description in zip(chunk["sic07"], chunk["description"]):
+                codes.setdefault(str(code).strip(), str(description).strip())
+
+            long = melt_chunk(chunk, geography)
+            check_chunk(contract, long)
+            for (region, year), rows in long.groupby(["region", "year"], sort=False):
+                key = (region, year)
+                if key not in writers:
+                    folder = year_partition(region, year, root)
+                    folder.mkdir(parents=True, exist_ok=True)
+                    path = folder / f"{gva_file.stem}.parquet"
+                    if path.exists():
+                        raise ValueError(f"{path} already exists")
+                    writers[key] = pq.ParquetWriter(path, FILE_SCHEMA)
+                table = pa.Table.from_pandas(
+                    rows[FILE_SCHEMA.names], schema=FILE_SCHEMA, preserve_index=False
+                )
+                writers[key].write_table(table)
+                n_rows += len(rows)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return n_rows, codes, contract
+
+
+def swap_in(build: Path, replace: bool) -> None:
+    """
+    Moves a finished build of the industry-level GVA dataset into place. A full build replaces the
+    dataset's folder, which is only deleted once the build is in its place. A build of new years
+    moves its year folders in, and raises before moving anything if one already exists.
+
+    :param build: Folder the build was written under
+    :type build: Path
+    :param replace: Replace the whole dataset, rather than add the build's years to it
+    :type replace: bool
+    :return: None
+    :rtype: None
+    """
+    folder = partitioned_dir("gva_industry")
+    if replace:
+        old = folder.with_name(f".{folder.name}.old")
+        shutil.rmtree(old, ignore_errors=True)
+        if folder.exists():
+            folder.rename(old)
+        build.rename(folder)
+        shutil.rmtree(old, ignore_errors=True)
+        return
+
+    targets = {
+        part: folder / part.relative_to(build)
+        for part in sorted(build.glob("region=*/year=*"))
+    }
+    for target in targets.values():
+        if target.exists():
+            raise ValueError(f"{target} already exists")
+    for part, target in targets.items():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        part.rename(target)
+
+
+@traced(detail=("workers",))
+def build_gva_industry(workers: int = 1, years: list = None) -> pd.DataFrame:
+    """
+    Builds the industry-level GVA dataset from every regional workbook, one workbook per worker process.
+    Without years the whole dataset is rebuilt, with years only those year partitions are added.
+    Each worker checks its chunks against the data contract as they are written, into a separate
+    build folder. The combined report is saved, raising if it failed, and only then is the build
+    swapped in, so a broken build never replaces the dataset. Every workbook is still parsed when
+    one fails, so all failures are reported, but the build then raises before the swap rather than
+    publish a dataset without those regions.
+
+    :param workers: Number of worker processes, 1 runs serially
+    :type workers: int
+    :param years: Only build these years, all years if not passed
+    :type years: list
+    :return: SIC07 hierarchy, from the first workbook's sheet order
+    :rtype: DataFrame
+    """
+    files = gva_files()
+    print(f"Found {len(files)} files")
+    folder = partitioned_dir("gva_industry")
+    build = folder.with_name(f".{folder.name}.build")
+    shutil.rmtree(build, ignore_errors=True)
+
+    try:
+        results = parse_files(write_industry_file, files, workers, years, build)
+        failed = [gva_file.name for gva_file in files if gva_file not in results]
+        if failed:
+            raise RuntimeError(
+                f"{len(failed)} GVA workbooks failed, keeping the previous dataset: "
+                + ", ".join(failed)
+            )
+
+        codes = {}
+        for gva_file, (n_rows, file_codes, _) in results.items():
+            print(f"Wrote {n_rows} rows from {gva_file.name}")
+            for code, description in file_codes.items():
+                codes.setdefault(code, description)
+
+        contract_states = [contract for _, _, contract in results.values()]
+        enforce(report(merge_states(contract_states)))
+        swap_in(build, replace=years is None)
+    finally:
+        shutil.rmtree(build, ignore_errors=True)
+    return sic07_hierarchy(codes)
+
+
+def industry_years() -> set:
+    """
+    Years already in the industry-level GVA dataset, from its partition folders.
+
+    :return: Set of years
+    :rtype: set
+    """
+    folder = partitioned_dir("gva_industry")
+    return {int(p.name.split("=")[1]) for p in folder.glob("region=*/year=*")}
+
+
+@traced(detail=("sic07", "regions", "years"))
+def read_gva_industry(
+    columns: list = None, sic07: list = None, regions: list = None, years: list = None
+) -> pd.DataFrame:
+    """
+    Reads the industry-level GVA dataset. Region and year filters only open the matching partition
+    folders, and the SIC07 filter uses the Parquet statistics within them. sic07 comes back as a
+    categorical ordered like the published tables.
+
+    :param columns: Only read these columns
+    :type columns: list
+    :param sic07: Only these SIC07 codes, e.g. ["Total"] or ["C (10-33)"]
+    :type sic07: list
+    :param regions: Only these ITL1 regions, e.g. ["Wales"]
+    :type regions: list
+    :param years: Only these years
+    :type years: list
+    :return: Long DataFrame
+    :rtype: DataFrame
+    """
+    filters = []
+    if sic07 is not None:
+        filters.append(ds.field("sic07").isin(sic07))
+    if regions is not None:
+        filters.append(ds.field("region").isin(regions))
+    if years is not None:
+        filters.append(ds.field("year").isin(list(years)))
+    expression = None
+    for f in filters:
+        expression = f if expression is None else expression & f
+
+    df = read_partitioned("gva_industry", columns, expression, PARTITIONS)
+    if "sic07" in df.columns:
+        order = read_dataset("sic07", columns=["sic07"])["sic07"]
+        df["sic07"] = pd.Categorical(df["sic07"], categories=order, ordered=True)
+    return df
+
+
+@stage("clean_gva_industry")
+def main(append: bool = False):
+    """
+    Main function to build and save the industry-level GVA dataset and the SIC07 hierarchy.
+
+    With append=True, only years missing from the dataset are read and added as new partitions.
+
+    :param append: Append new years instead of rebuilding everything
+    :type append: bool
+    :return: None
+    :rtype: None
+    """
+    years = None
+    if append:
+        existing = industry_years()
+        years = sorted(workbook_years(gva_files()) - existing)
+        if not years:
+            print("No new years to append")
+            return
+
+    sic07 = build_gva_industry(workers=GVA_WORKERS, years=years)
+    if not append:
+        write_dataset(sic07, "sic07")
+    manifest = write_manifest("gva_industry")
+    print(f"Saved {len(sic07)} SIC07 codes and partitions listed in {manifest}")
+
+
+if __name__ == "__main__":
+    args = stage_arguments("Build the industry-level GVA dataset.")
+    main(append=args.append)
@@ -1,40 +1,43 @@
 # -- Imports --
-from config import PROCESSED_DIR, POPULATION_FILE
-from cleaning_helpers import normalise_geo, check_duplicates
+from config import POPULATION_FILE, POPULATION_FILL
+from cleaning_helpers import (
+    normalise_geo,
+    check_duplicates,
+    fill_within_groups,
+    group_starts,
+    sheet_years,
+    stage_arguments,
+    validate_append,
+)
+import numpy as np
+from geography import attach_geo_id
+from raw_cache import read_excel_cached
+from run_report import stage, traced
+from storage import append_dataset, dataset_years, read_dataset, write_dataset
 import pandas as pd
 
 
 # -- Cleaning Functions --
-def clean_multi_year(
-    path_name: str, sheet_name: str, header: int, value_name: str
-) -> pd.DataFrame:
+def melt_years(df: pd.DataFrame, value_name: str, years: list = None) -> pd.DataFrame:
     """
-    Cleans ONS population Excel sheets where columns from 3 onwards are multiple years (e.g 2021, 2022, 2023).
-
-    1) Reads Excel File with passed parameters
-    2) Renames the columns to be normalised with other processed datasets
-    3) Automatically parses the year columns
-    4) Melts from wide to long format so there is only one year column, and the associated values for population in this case
-    5) Then, makes year integer columns, and drops null rows
+    Melts a population sheet already read into memory from one column per year to long format.
 
-    :param path_name: File path of the excel file
-    :type path_name: str
-    :param sheet_name: Sheet name of the excel file
-    :type sheet_name: str
-    :param header: Row number to use as the column names
-    :type header: int
+    :param df: Raw sheet, with "LA code", "LA name" and one column per year
+    :type df: pd.DataFrame
     :param value_name: Name for the values column
     :type value_name: str
-    :return: Cleaned DataFrame
+    :param years: Only melt these years, all years if not passed
+    :type years: list
+    :return: Long DataFrame with geo_code, geo_name, year and the values
     :rtype: DataFrame
     """
-    df = pd.read_excel(path_name, sheet_name=sheet_name, header=header)
-
     # Rename columns to standard names
     df = df.rename(columns={"LA code": "geo_code", "LA name": "geo_name"})
 
     # Identify year columns automatically
     years_cols = [c for c in df.columns if str(c).isdigit() and len(str(c)) == 4]
+    if years is not None:
+        years_cols = [c for c in years_cols if int(c) in years]
 
     # Melt from wide to long format
     df = pd.melt(
@@ -51,63 +54,194 @@ def clean_multi_year(
     return df[["geo_code", "geo_name", "year", value_name]]
 
 
-def build_population() -> pd.DataFrame:
+@traced(detail=("sheet_name", "years"))
+def clean_multi_year(
+    path_name: str, sheet_name: str, header: int, value_name: str, years: list = None
+) -> pd.DataFrame:
+    """
+    Cleans ONS population Excel sheets where columns from 3 onwards are multiple years (e.g 2021, 2022, 2023).
+
+    1) Reads Excel File with passed parameters, through the raw cache
+    2) Renames the columns to be normalised with other processed datasets
+    3) Automatically parses the year columns
+    4) Melts from wide to long format so there is only one year column, and the associated values for population in this case
+    5) Then, makes year integer columns, and drops null rows
+
+    Steps 2-5 are done by melt_years.
+
+    :param path_name: File path of the excel file
+    :type path_name: str
+    :param sheet_name: Sheet name of the excel file
+    :type sheet_name: str
+    :param header: Row number to use as the column names
+    :type header: int
+    :param value_name: Name for the values column
+    :type value_name: str
+    :param years: Only melt these years, all years if not passed
+    :type years: list
+    :return: Cleaned DataFrame
+    :rtype: DataFrame
+    """
+    df = read_excel_cached(path_name, sheet_name=sheet_name, header=header)
+    return melt_years(df, value_name, years)
+
+
+def build_population(years: list = None, sheet: pd.DataFrame = None) -> pd.DataFrame:
     """
     Build the cleaned population DataFrame by calling the relevant functions
 
+    :param years: Only build these years, all years if not passed
+    :type years: list
+    :param sheet: "Population data" sheet already in memory, read from POPULATION_FILE if not passed
+    :type sheet: pd.DataFrame
     :return: Cleaned and normalised population DataFrame
     :rtype: DataFrame
     """
+    if sheet is not None:
+        return normalise_geo(melt_years(sheet, "population", years))
+
     population = clean_multi_year(
         path_name=POPULATION_FILE,
         sheet_name="Population data",
         header=0,
         value_name="population",
+        years=years,
     )
     population = normalise_geo(population)
     return population
 
 
-def main():
+def flag_unreliable(population: pd.DataFrame) -> pd.DataFrame:
     """
-    Main function to build and save the population dataset.
+    Turns the '[u]' uncertainty markers into missing values, flagged in an is_unreliable column.
 
-    It also handles uncertainty flags to make analysis easier, and add a flag column.
-    :return: None
-    :rtype: None
+    :param population: Cleaned population, with the raw population values
+    :type population: pd.DataFrame
+    :return: The same frame, with numeric population and is_unreliable
+    :rtype: DataFrame
     """
-    population = build_population()
-
-    # Handle the uncertainity flags '[u]'
     population["population"] = pd.to_numeric(
         population["population"], errors="coerce"
     )  # convert the [u] flags to NaN
     population["is_unreliable"] = population[
         "population"
     ].isna()  # Flag the unreliable values
+    return population
+
+
+def fill_population(
+    population: pd.DataFrame, policy: str = POPULATION_FILL
+) -> pd.DataFrame:
+    """
+    Fills the unreliable values within each area, on the array sorted by (geo_id, year).
+
+    :param population: Flagged population, from flag_unreliable
+    :type population: pd.DataFrame
+    :param policy: "ffill", "interpolate" or "none", see cleaning_helpers.fill_within_groups
+    :type policy: str
+    :return: Population in (geo_id, year) order, with whole filled values
+    :rtype: DataFrame
+    """
+    population = population.sort_values(["geo_id", "year"])
+    filled = fill_within_groups(
+        population["population"].to_numpy(dtype=float),
+        group_starts(population["geo_id"].to_numpy()),
+        policy=policy,
+        x=population["year"].to_numpy(),
+    )
+    population["population"] = np.round(filled)  # interpolated people are whole
+    return population
 
-    population = population.sort_values(["geo_code", "year"])
-    population["population"] = population.groupby("geo_code")[
-        "population"
-    ].ffill()  # forward fill the uncertain values
+
+def population_dataset(
+    sheet: pd.DataFrame,
+    geography: pd.DataFrame,
+    policy: str = POPULATION_FILL,
+    years: list = None,
+    history: pd.DataFrame = None,
+) -> pd.DataFrame:
+    """
+    The population dataset from the "Population data" sheet, without reading or writing files.
+
+    :param sheet: Raw "Population data" sheet, read with header=0
+    :type sheet: pd.DataFrame
+    :param geography: Geography dimension
+    :type geography: pd.DataFrame
+    :param policy: Fill policy for '[u]' values, see fill_population
+    :type policy: str
+    :param years: Only build these years, all years if not passed
+    :type years: list
+    :param history: Rows of earlier years, already built, to fill from but not return
+    :type history: pd.DataFrame
+    :return: One row per (geo_id, year), with population and is_unreliable
+    :rtype: DataFrame
+    """
+    population = attach_geo_id(build_population(years, sheet), geography)
+    population = flag_unreliable(population)
+    if history is not None:
+        population = pd.concat([history[population.columns], population])
+    population = fill_population(population, policy)
+    if history is not None:
+        population = population[~population["year"].isin(history["year"])]
+    dup_rows = check_duplicates(population)
+    if len(dup_rows) > 0:
+        raise ValueError(f"{len(dup_rows)} duplicate rows in the population sheet")
+    return population
+
+
+@stage("clean_population")
+def main(append: bool = False):
+    """
+    Main function to build and save the population dataset with population_dataset.
+
+    It also handles uncertainty flags to make analysis easier, and add a flag column.
+    Flagged values are filled with the POPULATION_FILL policy from config.
+
+    With append=True, only year columns missing from the processed dataset are cleaned, and
+    appended without rewriting the existing data. The latest existing year is used to fill them.
+
+    :param append: Append new years instead of rebuilding everything
+    :type append: bool
+    :return: None
+    :rtype: None
+    """
+    existing_years = set()
+    new_years = None
+    history = None
+    if append:
+        existing_years = dataset_years("population")
+        all_years = sheet_years(POPULATION_FILE, "Population data", header=0)
+        new_years = sorted(all_years - existing_years)
+        if not new_years:
+            print("No new years to append")
+            return
+        history = read_dataset("population")
+        history = history[history["year"] == max(existing_years)]
+
+    sheet = read_excel_cached(POPULATION_FILE, sheet_name="Population data", header=0)
+    population = population_dataset(
+        sheet, read_dataset("geography"), POPULATION_FILL, new_years, history
+    )
 
     print(f"After uncertainty handling: {len(population)} rows")
     print(
         f"Unreliable flags: {population['is_unreliable'].sum()} ({population['is_unreliable'].mean():.1%})"
     )
 
-    # Check duplicates
-    dup_rows = check_duplicates(population)
-    if len(dup_rows) > 0:
-        print("Duplicate rows found")
-        print(dup_rows)
+    if append:
+        bad_rows = validate_append(population, existing_years)
+        if len(bad_rows) > 0:
+            print("Rows clash with the existing dataset")
+            print(bad_rows)
+        else:
+            paths = append_dataset(population, "population")
+            print(f"Appended {len(population)} rows in {len(paths)} new years")
 
     else:
-        PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-        path = PROCESSED_DIR / "population.csv"
-        population.to_csv(path, index=False)
+        path = write_dataset(population, "population")
         print(f"Saved {len(population)} rows to {path}")
 
 
 if __name__ == "__main__":
-    main()
+    args = stage_arguments("Clean the population estimates.")
+    main(append=args.append)
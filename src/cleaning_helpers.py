@@ -1,31 +1,202 @@
 # Cleaning functions used more than once
+import argparse
+import numpy as np
 import pandas as pd
+from run_report import traced
+
+
+def _strip_values(values: pd.Series) -> pd.Series:
+    """
+    Same result as values.astype(str).str.strip(), but the strings are only converted and stripped
+    once per distinct value, as codes and names repeat for every year.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    stripped = pd.Index(uniques).astype(str).str.strip()
+    return pd.Series(stripped.take(codes), index=values.index)
 
 
 def normalise_geo(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Docstring for _normalise_geo - todo
-    :param df: Description
-    :type df: pd.
+    Normalises geo_code and geo_name to stripped strings, so they match across datasets.
 
-    DataFrame
-    :return: Description
+    :param df: DataFrame with geo_code and geo_name columns
+    :type df: pd.DataFrame
+    :return: DataFrame with normalised geo columns
     :rtype: DataFrame
     """
-    df["geo_code"] = df["geo_code"].astype(str).str.strip()
-    df["geo_name"] = df["geo_name"].astype(str).str.strip()
+    df["geo_code"] = _strip_values(df["geo_code"])
+    df["geo_name"] = _strip_values(df["geo_name"])
     return df
 
 
+def key_hashes(df: pd.DataFrame, keys: list) -> np.ndarray:
+    """
+    One 64-bit hash per row of the key columns, so uniqueness can be checked on a single integer
+    array with a hash table instead of sorting or comparing several columns.
+
+    :param df: DataFrame with the key columns
+    :type df: pd.DataFrame
+    :param keys: Key column names
+    :type keys: list
+    :return: uint64 hash per row
+    :rtype: np.ndarray
+    """
+    return pd.util.hash_pandas_object(df[keys], index=False).to_numpy()
+
+
+def prefix_mask(codes: pd.Series, prefixes: list) -> np.ndarray:
+    """
+    Which codes start with any of the prefixes. Each distinct code is checked once, then the result is
+    looked up by category code, rather than matching every row's string.
+
+    :param codes: Codes, ideally categorical
+    :type codes: pd.Series
+    :param prefixes: Allowed prefixes, e.g. ["E06", "W06"]
+    :type prefixes: list
+    :return: Boolean mask, False for missing codes
+    :rtype: np.ndarray
+    """
+    codes = pd.Categorical(codes)
+    keep = np.asarray(codes.categories.astype(str).str.startswith(tuple(prefixes)))
+    return np.append(keep, False)[codes.codes]
+
+
 def check_duplicates(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Docstring for check_duplicates - todo
+    Finds rows that share a geo_id and year, which should be unique in every processed dataset.
+    Only the duplicated rows, usually none, are sorted.
 
-    :param df: Description
+    :param df: DataFrame with geo_id, geo_code, geo_name and year columns
     :type df: pd.DataFrame
-    :return: Description
+    :return: The duplicated rows
     :rtype: DataFrame
     """
-    dup_mask = df.duplicated(subset=["geo_code", "year"], keep=False)
-    dup_rows = df[dup_mask].sort_values(["geo_code", "year"])
+    hashes = pd.Series(key_hashes(df, ["geo_id", "year"]), index=df.index)
+    dup_mask = hashes.duplicated(keep=False)
+    dup_rows = df[dup_mask].sort_values(["geo_id", "year"])
     return dup_rows[["geo_code", "geo_name", "year"]]
+
+
+def group_starts(groups: np.ndarray) -> np.ndarray:
+    """
+    Offsets where each group starts, for an array already sorted by group.
+
+    :param groups: Group keys, sorted so each group is contiguous
+    :type groups: np.ndarray
+    :return: Start offset of every group
+    :rtype: np.ndarray
+    """
+    groups = np.asarray(groups)
+    if len(groups) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+
+
+@traced(name="fill", detail=("policy",))
+def fill_within_groups(
+    values: np.ndarray, starts: np.ndarray, policy: str = "ffill", x: np.ndarray = None
+) -> np.ndarray:
+    """
+    Fills NaN values within contiguous groups in one vectorised pass, never across a group boundary.
+
+    Policies:
+    - "ffill": carry the last valid value forward, like groupby().ffill()
+    - "interpolate": linear interpolation between the valid values either side, using x
+      (e.g. the year) for spacing. Leading and trailing gaps stay NaN
+    - "none": leave missing values as NaN
+
+    :param values: Values sorted by group (and by x within each group)
+    :type values: np.ndarray
+    :param starts: Group start offsets, from group_starts
+    :type starts: np.ndarray
+    :param policy: "ffill", "interpolate" or "none"
+    :type policy: str
+    :param x: Positions used to interpolate, defaults to the row number
+    :type x: np.ndarray
+    :return: Filled copy of values
+    :rtype: np.ndarray
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if policy == "none" or n == 0:
+        return values.copy()
+    if policy not in ("ffill", "interpolate"):
+        raise ValueError(f"Unknown fill policy: {policy}")
+
+    pos = np.arange(n)
+    valid = ~np.isnan(values)
+    bounds = np.append(starts, n)
+    row_start = np.repeat(bounds[:-1], np.diff(bounds))
+
+    # Last valid position at or before each row, if it is in the same group
+    prev = np.maximum.accumulate(np.where(valid, pos, -1))
+    has_prev = prev >= row_start
+    prev_values = values[np.maximum(prev, 0)]
+
+    if policy == "ffill":
+        return np.where(has_prev, prev_values, np.nan)
+
+    # Next valid position at or after each row, if it is in the same group
+    row_end = np.repeat(bounds[1:], np.diff(bounds))
+    nxt = np.minimum.accumulate(np.where(valid, pos, n)[::-1])[::-1]
+    has_next = nxt < row_end
+    next_values = values[np.minimum(nxt, n - 1)]
+
+    x = pos.astype(np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    x_prev = x[np.maximum(prev, 0)]
+    x_next = x[np.minimum(nxt, n - 1)]
+    gap = ~valid & has_prev & has_next
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = (x - x_prev) / (x_next - x_prev)
+    filled = np.where(gap, prev_values + weight * (next_values - prev_values), np.nan)
+    return np.where(valid, values, filled)
+
+
+def sheet_years(path_name, sheet_name, header: int) -> set:
+    """
+    Years in a sheet's column headers, read without parsing the rows below the header.
+
+    :param path_name: File path of the excel file, or an open pd.ExcelFile
+    :param sheet_name: Sheet name of the excel file
+    :param header: Row number to use as the column names
+    :type header: int
+    :return: Set of years
+    :rtype: set
+    """
+    columns = pd.read_excel(path_name, sheet_name=sheet_name, header=header, nrows=0)
+    return {int(c) for c in columns.columns if str(c).isdigit() and len(str(c)) == 4}
+
+
+def validate_append(new: pd.DataFrame, existing_years: set) -> pd.DataFrame:
+    """
+    Checks rows about to be appended to a processed dataset: their years must be new, and each
+    (geo_id, year) must appear once. Unknown geo codes are already rejected by attach_geo_id.
+
+    :param new: Rows to append, with geo_id, geo_code, geo_name and year columns
+    :type new: pd.DataFrame
+    :param existing_years: Years already in the processed dataset
+    :type existing_years: set
+    :return: The rows that fail the checks
+    :rtype: DataFrame
+    """
+    clash = new["year"].isin(list(existing_years))
+    bad = clash | new.duplicated(subset=["geo_id", "year"], keep=False)
+    return new.loc[bad, ["geo_code", "geo_name", "year"]]
+
+
+def stage_arguments(description: str) -> argparse.Namespace:
+    """
+    Command line options shared by the cleaning scripts.
+
+    :param description: Help text for the script
+    :type description: str
+    :return: Parsed arguments
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="only parse years missing from the processed dataset and append them",
+    )
+    return parser.parse_args()
@@ -1,4 +1,5 @@
 # -- Imports --
+import os
 from pathlib import Path
 
 # -- Project Root --
@@ -16,3 +17,71 @@ GVA_DIR = (
     RAW_DIR  # There are multiple GVA files in this directory, so point to the folder
 )
 POPULATION_FILE = RAW_DIR / "populationestimatesbylocalauthority.xlsx"
+REGION_LOOKUP_FILE = RAW_DIR / "lasregionew2021lookup.xlsx"
+
+# -- Years --
+YEAR_WINDOW = (2019, 2023)  # years where demography, population and GVA all overlap
+
+# -- Geographies --
+LA_PREFIXES = ["E06", "E07", "E08", "E09", "N09", "S12", "W06"]  # Local Authority codes
+REGION_FALLBACKS = (
+    {  # region_name by geo_code prefix, for codes missing from the region lookup
+        "S": "Scotland",
+        "N": "Northern Ireland",
+        "W": "Wales",
+    }
+)
+
+# -- Execution --
+BACKEND = "pandas"  # merge and analysis_prepare engine: "pandas", "polars" or "duckdb"
+
+# -- Cleaning --
+POPULATION_FILL = (
+    "ffill"  # "ffill", "interpolate" or "none" for '[u]' population values
+)
+
+# -- Processed Storage --
+PROCESSED_FORMAT = "parquet"  # "parquet", "feather" or "csv", see storage.py
+EXPORT_CSV = True  # also write a CSV copy of each processed dataset
+
+# -- Cache --
+CACHE_DIR = DATA_DIR / "cache"  # parsed raw sheets, keyed by file content hash
+CACHE_MAX_BYTES = 500_000_000  # least recently used entries are evicted above this size
+
+# -- Run Reports --
+# Stage reports are recorded while RUN_REPORT is on, see run_report.py. pipeline.py --report
+# and --profile set these for the stages it runs.
+RUN_REPORT = os.environ.get("RUN_REPORT") == "1"
+RUN_PROFILE = os.environ.get("RUN_PROFILE") == "1"  # also a cProfile dump per stage
+RUN_REPORT_DIR = DATA_DIR / "runs"  # one folder of reports per run
+TRACE_MEMORY = False  # tracemalloc peak per step, exact but slows pure-Python steps ~5x
+
+# -- Parallelism --
+GVA_WORKERS = min(12, os.cpu_count() or 1)  # one worker per regional GVA workbook
+PIPELINE_WORKERS = 3  # at most three stages are ever independent of each other
+
+# -- Readers --
+GVA_CHUNK_ROWS = (
+    2_000  # wide Table 2 rows melted at a time by the industry-level GVA build
+)
+
+# -- Statistics --
+STATS_CHUNK_ROWS = 65_536  # rows per chunk when streaming summary statistics
+STATS_BREAKDOWNS = [
+    "year",
+    "region_name",
+]  # summary statistics per value of each column
+BOOTSTRAP_RESAMPLES = 2_000  # resamples for confidence intervals, 0 turns them off
+BOOTSTRAP_BY_LA = True  # resample whole LAs with all their years
+BOOTSTRAP_SEED = 0
+BOOTSTRAP_WORKERS = 1  # worker processes for the bootstrap batches
+
+# -- Figures --
+FIGURE_DPI = 300
+PREVIEW_DPI = 60  # analysis_plots.py --preview
+PLOT_WORKERS = min(4, os.cpu_count() or 1)  # one worker process per figure
+PLOT_MODE = "auto"  # scatter plots as "points", as a "density" grid, or "auto"
+DENSITY_ABOVE = (
+    5_000  # in "auto" mode, scatter plots with more points are drawn as a grid
+)
+DENSITY_BINS = 200  # grid cells along each axis
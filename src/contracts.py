@@ -0,0 +1,330 @@
+# -- Imports --
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from config import LA_PREFIXES, PROCESSED_DIR, YEAR_WINDOW
+from cleaning_helpers import key_hashes, prefix_mask
+from run_report import traced
+from storage import SCHEMAS
+
+REPORT_DIR = PROCESSED_DIR / "contracts"
+
+# Any UK statistical geography: England, the UK/GB totals, Northern Ireland, Scotland and Wales
+ALL_PREFIXES = ["E", "K", "N", "S", "W"]
+
+# -- Contracts --
+# What every processed dataset promises to later stages. Each entry may set:
+#   unique:       lists of columns whose combined values never repeat
+#   dtypes:       check every column against its schema in storage.SCHEMAS
+#   ranges:       inclusive (min, max) per column, None for an open end. Missing values are skipped
+#   geo_prefixes: allowed starts of geo_code
+#   years:        exact inclusive (first, last) years, every year in it present
+#   min_rows_per_year: fewest rows any year may have
+#   nan_budget:   largest share of missing values per column, 0 when not listed
+#   optional:     columns that may be left out, e.g. metrics not asked for, skipped by dtypes and
+#                 ranges when absent
+COUNT_RANGES = {"births": (0, None), "deaths": (0, None), "active": (0, None)}
+
+CONTRACTS = {
+    "geography": {
+        "unique": [["geo_id"], ["geo_code"]],
+        "ranges": {"geo_id": (0, None)},
+        "geo_prefixes": ALL_PREFIXES,
+        "nan_budget": {"region_code": 0.3, "region_name": 0.2},
+    },
+    "business_demography_counts": {
+        "unique": [["geo_id", "year"]],
+        "ranges": COUNT_RANGES,
+        "geo_prefixes": ALL_PREFIXES,
+        "min_rows_per_year": 300,
+        "nan_budget": {"births": 0.05, "deaths": 0.05, "active": 0.05},
+    },
+    "population": {
+        "unique": [["geo_id", "year"]],
+        "ranges": {"population": (1, None)},
+        "geo_prefixes": LA_PREFIXES,
+        "min_rows_per_year": 300,
+        "nan_budget": {"population": 0.01},
+    },
+    "gva": {
+        "unique": [["geo_id", "year"]],
+        "ranges": {"gva_million": (0, None)},
+        "geo_prefixes": LA_PREFIXES,
+        "min_rows_per_year": 300,
+        "nan_budget": {"gva_million": 0.01},
+    },
+    "gva_industry": {
+        "unique": [["geo_id", "year", "sic07"]],
+        "dtypes": False,
+        "geo_prefixes": LA_PREFIXES,
+        "min_rows_per_year": 300,
+        "nan_budget": {"gva_million": 0.05},
+    },
+    "sic07": {
+        "unique": [["sic07"]],
+        "nan_budget": {"section": 0.1, "parent": 0.05},
+    },
+    "final_dataset": {
+        "unique": [["geo_id", "year"]],
+        "ranges": {**COUNT_RANGES, "population": (1, None), "gva_million": (0, None)},
+        "geo_prefixes": ALL_PREFIXES,
+        "years": YEAR_WINDOW,
+        "min_rows_per_year": 300,
+        "nan_budget": {"population": 0.25, "is_unreliable": 0.25, "gva_million": 0.25},
+    },
+    "analysis_dataset": {
+        "unique": [["geo_id", "year"]],
+        "ranges": {
+            **COUNT_RANGES,
+            "population": (1, None),
+            "gva_million": (0, None),
+            "birth_rate": (0, 100),
+            "death_rate": (0, 100),
+            "net_rate": (-100, 100),
+            "gva_per_capita": (0, None),
+            "gva_per_business": (0, None),
+        },
+        "geo_prefixes": LA_PREFIXES,
+        "years": YEAR_WINDOW,
+        "min_rows_per_year": 300,
+        "nan_budget": {
+            "population": 0.1,
+            "is_unreliable": 0.1,
+            "gva_million": 0.1,
+            "gva_per_capita": 0.1,
+            "gva_per_business": 0.1,
+            "region_code": 0.2,
+        },
+        # The metrics of metrics.METRICS, only those asked for are built
+        "optional": [
+            "birth_rate",
+            "death_rate",
+            "net_change",
+            "net_rate",
+            "gva_per_capita",
+            "gva_per_business",
+        ],
+    },
+}
+
+
+# -- Checking --
+def new_state(name: str) -> dict:
+    """
+    Empty running totals for checking a dataset chunk by chunk.
+
+    :param name: Dataset name, a key of CONTRACTS
+    :type name: str
+    :return: State to pass to check_chunk
+    :rtype: dict
+    """
+    return {
+        "dataset": name,
+        "rows": 0,
+        "hashes": {tuple(keys): [] for keys in CONTRACTS[name].get("unique", [])},
+        "dtypes": {},
+        "out_of_range": {},
+        "bad_prefixes": {},
+        "rows_per_year": {},
+        "missing": {},
+    }
+
+
+def check_chunk(state: dict, chunk: pd.DataFrame) -> dict:
+    """
+    Adds one chunk to the running totals. Every check is one vectorised pass over a column, and keys
+    are kept as 64-bit hashes, so chunks never need to be held together.
+
+    :param state: From new_state
+    :type state: dict
+    :param chunk: Rows of the dataset
+    :type chunk: pd.DataFrame
+    :return: The updated state
+    :rtype: dict
+    """
+    contract = CONTRACTS[state["dataset"]]
+    absent = set(contract.get("optional", [])) - set(chunk.columns)
+    state["rows"] += len(chunk)
+
+    for keys, hashes in state["hashes"].items():
+        hashes.append(key_hashes(chunk, list(keys)))
+
+    if contract.get("dtypes", True):
+        for col, dtype in SCHEMAS[state["dataset"]].items():
+            if col in absent:
+                continue
+            actual = str(chunk[col].dtype) if col in chunk.columns else "missing"
+            if actual != dtype:
+                state["dtypes"][col] = [actual, dtype]
+
+    for col, (low, high) in contract.get("ranges", {}).items():
+        if col in absent:
+            continue
+        values = chunk[col].to_numpy(dtype="float64", na_value=np.nan)
+        bad = np.zeros(len(values), dtype=bool)
+        if low is not None:
+            bad |= values < low
+        if high is not None:
+            bad |= values > high
+        state["out_of_range"][col] = state["out_of_range"].get(col, 0) + int(bad.sum())
+
+    if "geo_prefixes" in contract:
+        bad = ~prefix_mask(chunk["geo_code"], contract["geo_prefixes"])
+        for code, n in chunk.loc[bad, "geo_code"].astype(str).value_counts().items():
+            state["bad_prefixes"][code] = state["bad_prefixes"].get(code, 0) + int(n)
+
+    if "year" in chunk.columns:
+        years, counts = np.unique(chunk["year"].to_numpy(), return_counts=True)
+        for year, n in zip(years.tolist(), counts.tolist()):
+            state["rows_per_year"][year] = state["rows_per_year"].get(year, 0) + n
+
+    for col, n in chunk.isna().sum().items():
+        state["missing"][col] = state["missing"].get(col, 0) + int(n)
+    return state
+
+
+def merge_states(states: list) -> dict:
+    """
+    Combines states built on separate chunks, e.g. by separate worker processes.
+
+    :param states: States of the same dataset
+    :type states: list
+    :return: Combined state
+    :rtype: dict
+    """
+    merged = new_state(states[0]["dataset"])
+    for state in states:
+        merged["rows"] += state["rows"]
+        for keys, hashes in state["hashes"].items():
+            merged["hashes"][keys].extend(hashes)
+        merged["dtypes"].update(state["dtypes"])
+        for field in ["out_of_range", "bad_prefixes", "rows_per_year", "missing"]:
+            for key, n in state[field].items():
+                merged[field][key] = merged[field].get(key, 0) + n
+    return merged
+
+
+def report(state: dict) -> dict:
+    """
+    Turns the running totals into a report, one entry per check with whether it passed.
+
+    :param state: From check_chunk or merge_states
+    :type state: dict
+    :return: JSON-serialisable report
+    :rtype: dict
+    """
+    contract = CONTRACTS[state["dataset"]]
+    rows = state["rows"]
+    checks = {}
+
+    duplicates = {}
+    for keys, hashes in state["hashes"].items():
+        all_hashes = pd.Series(np.concatenate(hashes) if hashes else [], dtype="uint64")
+        duplicates[",".join(keys)] = int(all_hashes.duplicated().sum())
+    checks["unique"] = {
+        "passed": not any(duplicates.values()),
+        "duplicates": duplicates,
+    }
+
+    if contract.get("dtypes", True):
+        checks["dtypes"] = {
+            "passed": not state["dtypes"],
+            "mismatches": state["dtypes"],
+        }
+
+    if "ranges" in contract:
+        violations = {c: n for c, n in state["out_of_range"].items() if n}
+        checks["ranges"] = {"passed": not violations, "violations": violations}
+
+    if "geo_prefixes" in contract:
+        checks["geo_prefixes"] = {
+            "passed": not state["bad_prefixes"],
+            "violations": state["bad_prefixes"],
+        }
+
+    if state["rows_per_year"]:
+        per_year = dict(sorted(state["rows_per_year"].items()))
+        first, last = contract.get("years", (min(per_year), max(per_year)))
+        expected = set(range(first, last + 1))
+        sparse = [
+            y for y, n in per_year.items() if n < contract.get("min_rows_per_year", 1)
+        ]
+        checks["coverage"] = {
+            "passed": set(per_year) == expected and not sparse,
+            "rows_per_year": {str(y): n for y, n in per_year.items()},
+            "missing_years": sorted(expected - set(per_year)),
+            "unexpected_years": sorted(set(per_year) - expected),
+            "sparse_years": sparse,
+        }
+
+    budget = contract.get("nan_budget", {})
+    shares = {c: n / rows for c, n in state["missing"].items() if rows and n}
+    over = {c: round(s, 4) for c, s in shares.items() if s > budget.get(c, 0)}
+    checks["nan_budget"] = {
+        "passed": not over,
+        "missing_share": {c: round(s, 4) for c, s in shares.items()},
+        "over_budget": over,
+    }
+
+    return {
+        "dataset": state["dataset"],
+        "rows": rows,
+        "passed": all(check["passed"] for check in checks.values()),
+        "checks": checks,
+    }
+
+
+@traced(name="check_contract", detail=("name",))
+def validate(df: pd.DataFrame, name: str, chunk_rows: int = None) -> dict:
+    """
+    Checks a dataset against its contract.
+
+    :param df: Dataset to check
+    :type df: pd.DataFrame
+    :param name: Dataset name, a key of CONTRACTS
+    :type name: str
+    :param chunk_rows: Check this many rows at a time, all at once if not passed
+    :type chunk_rows: int
+    :return: Report from report()
+    :rtype: dict
+    """
+    state = new_state(name)
+    step = chunk_rows or max(len(df), 1)
+    for start in range(0, max(len(df), 1), step):
+        check_chunk(state, df.iloc[start : start + step])
+    return report(state)
+
+
+def save_report(result: dict) -> Path:
+    """
+    Writes a report as JSON to REPORT_DIR/<dataset>.json.
+
+    :param result: Report from report() or validate()
+    :type result: dict
+    :return: Path of the report
+    :rtype: Path
+    """
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    path = REPORT_DIR / f"{result['dataset']}.json"
+    path.write_text(json.dumps(result, indent=2))
+    return path
+
+
+def enforce(result: dict) -> None:
+    """
+    Saves a report, then raises if any check failed, so a broken dataset is never written.
+
+    :param result: Report from report() or validate()
+    :type result: dict
+    :return: None
+    :rtype: None
+    """
+    path = save_report(result)
+    if not result["passed"]:
+        failed = [
+            name for name, check in result["checks"].items() if not check["passed"]
+        ]
+        raise ValueError(
+            f"{result['dataset']} breaks its data contract ({', '.join(failed)}), see {path}"
+        )
@@ -0,0 +1,247 @@
+# -- Imports --
+import numpy as np
+import pandas as pd
+from config import GVA_WORKERS, REGION_FALLBACKS, REGION_LOOKUP_FILE
+from raw_cache import cached, file_hash
+from run_report import stage, traced
+from storage import dataset_path, read_dataset, write_dataset
+
+# Region lookups already loaded in this process, keyed by the lookup file's content hash
+_REGION_LOOKUPS = {}
+
+
+# -- Regions --
+def _parse_region_lookup() -> pd.DataFrame:
+    """
+    Parses the LA to region lookup workbook into a compact table with categorical regions.
+    """
+    lookup = pd.read_excel(REGION_LOOKUP_FILE, sheet_name=0, header=4)
+    lookup = lookup.rename(
+        columns={
+            "LA code": "geo_code",
+            "Region code": "region_code",
+            "Region name": "region_name",
+        }
+    )
+    lookup = lookup[["geo_code", "region_code", "region_name"]]
+    lookup["geo_code"] = lookup["geo_code"].astype(str).str.strip()
+    return lookup.astype({"region_code": "category", "region_name": "category"})
+
+
+@traced
+def region_lookup() -> pd.DataFrame:
+    """
+    The LA to region lookup, loaded once per process. Across processes it comes from the raw cache,
+    so the workbook is only parsed again when its contents change.
+
+    :return: geo_code, region_code and region_name, one row per LA
+    :rtype: DataFrame
+    """
+    key = file_hash(REGION_LOOKUP_FILE)
+    if key not in _REGION_LOOKUPS:
+        _REGION_LOOKUPS[key] = cached(
+            REGION_LOOKUP_FILE, ("region_lookup",), _parse_region_lookup
+        )
+    return _REGION_LOOKUPS[key]
+
+
+def regions_for(codes) -> pd.DataFrame:
+    """
+    Region code and name for any array of geo_codes, in one vectorised lookup.
+
+    Each distinct code is resolved once. Codes missing from the lookup get the region_name of the
+    first matching prefix in REGION_FALLBACKS (Scotland, Northern Ireland, Wales), and no region_code.
+
+    :param codes: geo_codes, e.g. a column or a list
+    :return: region_code and region_name for every code, with the index of codes if it has one
+    :rtype: DataFrame
+    """
+    index = codes.index if isinstance(codes, pd.Series) else None
+    positions, uniques = pd.factorize(pd.Series(codes).astype(str))
+    uniques = pd.Index(uniques)
+
+    lookup = region_lookup()
+    found = pd.Index(lookup["geo_code"]).get_indexer(uniques)
+    region_code = lookup["region_code"].astype(object).to_numpy()[found]
+    region_name = lookup["region_name"].astype(object).to_numpy()[found]
+    region_code[found < 0] = None
+    region_name[found < 0] = None
+
+    for prefix, name in REGION_FALLBACKS.items():
+        fallback = (found < 0) & np.asarray(uniques.str.startswith(prefix))
+        region_name[fallback & pd.isna(region_name)] = name
+
+    return pd.DataFrame(
+        {
+            "region_code": pd.array(region_code[positions], dtype="str"),
+            "region_name": pd.array(region_name[positions], dtype="str"),
+        },
+        index=index,
+    )
+
+
+@traced
+def attach_regions(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds region_code and region_name columns for the geo_code column.
+
+    :param df: DataFrame with a geo_code column
+    :type df: pd.DataFrame
+    :return: Copy of df with the region columns
+    :rtype: DataFrame
+    """
+    regions = regions_for(df["geo_code"].reset_index(drop=True))
+    return df.assign(
+        region_code=regions["region_code"].to_numpy(),
+        region_name=regions["region_name"].to_numpy(),
+    )
+
+
+# -- Dimension --
+@traced
+def source_geographies() -> pd.DataFrame:
+    """
+    Every (geo_code, geo_name) pair in the raw demography, population and GVA tables.
+
+    Uses the cleaners' own build functions, so the raw sheets are read through the same cache
+    entries the cleaners use afterwards. Imported here rather than at the top, as the cleaners
+    import this module.
+
+    :return: Normalised geo_code and geo_name, one row per pair seen
+    :rtype: DataFrame
+    """
+    from clean_demography import build_active, build_births, build_deaths
+    from clean_demography import load_demography_sheets
+    from clean_gva_industry import build_totals
+    from clean_population import build_population
+
+    sheets = load_demography_sheets()
+    frames = [
+        build_births(sheets),
+        build_deaths(sheets),
+        build_active(sheets),
+        build_population(),
+        build_totals(workers=GVA_WORKERS),
+    ]
+    return geographies_in(frames)
+
+
+def geographies_in(frames: list) -> pd.DataFrame:
+    """
+    Every (geo_code, geo_name) pair in cleaned frames, in the order first seen.
+
+    :param frames: Cleaned DataFrames with normalised geo_code and geo_name columns
+    :type frames: list
+    :return: geo_code and geo_name, one row per pair seen
+    :rtype: DataFrame
+    """
+    geo = pd.concat([f[["geo_code", "geo_name"]] for f in frames], ignore_index=True)
+    return geo.drop_duplicates()
+
+
+@traced
+def build_geography(
+    existing: pd.DataFrame = None, sources: pd.DataFrame = None
+) -> pd.DataFrame:
+    """
+    Builds the geography dimension: one row per geo_code with an integer geo_id, a name and a region.
+
+    Ids already in an existing dimension are kept, so ids never change between runs. New codes get
+    the next ids, in geo_code order. The name is the first one seen in the sources, as names can
+    differ between sheets (e.g. footnote markers like "Leicester*").
+
+    :param existing: Previously built dimension, if any
+    :type existing: pd.DataFrame
+    :param sources: (geo_code, geo_name) pairs from geographies_in, read from the raw tables with
+        source_geographies if not passed
+    :type sources: pd.DataFrame
+    :return: Geography dimension
+    :rtype: DataFrame
+    """
+    if sources is None:
+        sources = source_geographies()
+    geo = sources.drop_duplicates(subset="geo_code")
+
+    if existing is None or existing.empty:
+        next_id = 0
+        known = pd.DataFrame({"geo_code": [], "geo_id": []})
+    else:
+        next_id = int(existing["geo_id"].max()) + 1
+        known = existing[["geo_code", "geo_id"]].astype({"geo_code": str})
+
+    geo = geo.merge(known, on="geo_code", how="left")
+    new = geo["geo_id"].isna()
+    new_codes = np.sort(geo.loc[new, "geo_code"].to_numpy())
+    new_ids = pd.Series(
+        np.arange(next_id, next_id + len(new_codes)), index=new_codes, dtype="int64"
+    )
+    geo.loc[new, "geo_id"] = geo.loc[new, "geo_code"].map(new_ids)
+
+    # Codes only in the existing dimension stay in it
+    if existing is not None and not existing.empty:
+        dropped = existing[~existing["geo_code"].isin(geo["geo_code"])]
+        geo = pd.concat([geo, dropped[["geo_code", "geo_name", "geo_id"]]])
+
+    geo = geo.astype({"geo_id": "int64"}).sort_values("geo_id")
+    geo = attach_regions(geo)
+    return geo[["geo_id", "geo_code", "geo_name", "region_code", "region_name"]]
+
+
+def geo_ids(codes: pd.Series, geography: pd.DataFrame = None) -> np.ndarray:
+    """
+    Maps normalised geo_codes to their integer geo_id in one vectorised lookup.
+
+    :param codes: Normalised geo_codes
+    :type codes: pd.Series
+    :param geography: Geography dimension, read from PROCESSED_DIR if not passed
+    :type geography: pd.DataFrame
+    :return: geo_id for every code
+    :rtype: np.ndarray
+    """
+    if geography is None:
+        geography = read_dataset("geography", columns=["geo_id", "geo_code"])
+    positions = pd.Index(geography["geo_code"].astype(str)).get_indexer(codes)
+    if (positions < 0).any():
+        unknown = pd.unique(np.asarray(codes)[positions < 0])
+        raise ValueError(
+            f"{len(unknown)} geo_codes missing from the geography dimension, "
+            f"rebuild it with geography.py: {list(unknown[:5])}"
+        )
+    return geography["geo_id"].to_numpy()[positions]
+
+
+@traced
+def attach_geo_id(df: pd.DataFrame, geography: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Adds the geo_id column as the first column of a cleaned dataset.
+
+    :param df: Cleaned dataset with a normalised geo_code column
+    :type df: pd.DataFrame
+    :param geography: Geography dimension, read from PROCESSED_DIR if not passed
+    :type geography: pd.DataFrame
+    :return: Dataset with geo_id
+    :rtype: DataFrame
+    """
+    df.insert(0, "geo_id", geo_ids(df["geo_code"], geography))
+    return df
+
+
+@stage("geography")
+def main():
+    """
+    Main function to build and save the geography dimension.
+
+    :return: None
+    :rtype: None
+    """
+    existing = None
+    if dataset_path("geography").exists():
+        existing = read_dataset("geography")
+
+    geography = build_geography(existing)
+    path = write_dataset(geography, "geography")
+    print(f"Saved {len(geography)} geographies to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,116 @@
 # -- Imports --
 import pandas as pd
-from config import PROCESSED_DIR
+from backends import KEYS, get_backend
+from config import BACKEND, YEAR_WINDOW
+from run_report import stage, traced
+from storage import write_dataset
+
+FINAL_COLUMNS = [
+    "geo_id",
+    "geo_code",
+    "geo_name",
+    "year",
+    "births",
+    "deaths",
+    "active",
+    "population",
+    "is_unreliable",
+    "gva_million",
+]
 
 
 # -- Functions --
-def merge_all_datasets():
+@traced(detail=("years", "backend"))
+def merge_measures(years: tuple = YEAR_WINDOW, backend: str = BACKEND):
     """
-    Merges business demography, population, and GVA datasets into a final dataset for the years 2019-2023.
+    Joins the processed population and GVA datasets onto business demography, for a year window.
 
-    :return: None
+    :param years: Inclusive (first, last) year window
+    :type years: tuple
+    :param backend: Execution backend, "pandas", "polars" or "duckdb"
+    :type backend: str
+    :return: Final dataset, in (geo_id, year) order
     :rtype: DataFrame
     """
-    # Load datasets from csvs
-    demography = pd.read_csv(PROCESSED_DIR / "business_demography_counts.csv")
-    population = pd.read_csv(PROCESSED_DIR / "population.csv")
-    gva = pd.read_csv(PROCESSED_DIR / "gva.csv")
+    ops = get_backend(backend)
 
-    # Merge datasets using left joins on geo_code and year, to retain all demography records
-    merged = demography.merge(
-        population[["geo_code", "year", "population", "is_unreliable"]],
-        on=["geo_code", "year"],
-        how="left",
-    )
-    merged = merged.merge(
-        gva[["geo_code", "year", "gva_million"]], on=["geo_code", "year"], how="left"
-    )
+    # Scan processed datasets, with the year window pushed into each scan
+    demography = ops["scan"]("business_demography_counts", years=years)
+    population = ops["scan"]("population", years=years)
+    gva = ops["scan"]("gva", years=years)
+    return join_datasets(ops, demography, population, gva)
 
-    # Filter for years 2019-2023
-    merged = merged[merged["year"].between(2019, 2023)]
 
-    # Reorder columns
-    merged = merged[
+def join_datasets(ops: dict, demography, population, gva):
+    """
+    Left joins population and GVA onto business demography, as tables of the backend's type.
+
+    :param ops: Backend operations, from backends.get_backend
+    :type ops: dict
+    :return: Final dataset, in (geo_id, year) order
+    :rtype: DataFrame
+    """
+    # Left joins on geo_id and year, to retain all demography records
+    merged = ops["join"](
+        demography,
         [
-            "geo_code",
-            "geo_name",
-            "year",
-            "births",
-            "deaths",
-            "active",
-            "population",
-            "is_unreliable",
-            "gva_million",
-        ]
+            (population, ["population", "is_unreliable"]),
+            (gva, ["gva_million"]),
+        ],
+    )
+    merged = ops["collect"](ops["sort"](merged, KEYS))
+
+    # Reorder columns
+    return merged[FINAL_COLUMNS]
+
+
+def merge_frames(
+    demography: pd.DataFrame,
+    population: pd.DataFrame,
+    gva: pd.DataFrame,
+    years: tuple = YEAR_WINDOW,
+) -> pd.DataFrame:
+    """
+    The final dataset from the processed datasets already in memory, without reading or writing files.
+
+    :param demography: Business demography counts
+    :type demography: pd.DataFrame
+    :param population: Population dataset
+    :type population: pd.DataFrame
+    :param gva: GVA dataset
+    :type gva: pd.DataFrame
+    :param years: Inclusive (first, last) year window
+    :type years: tuple
+    :return: Final dataset, in (geo_id, year) order
+    :rtype: DataFrame
+    """
+    tables = [
+        df[df["year"].between(*years)].reset_index(drop=True)
+        for df in (demography, population, gva)
     ]
+    return join_datasets(get_backend("pandas"), *tables)
+
+
+@stage("merge_datasets")
+def merge_all_datasets(years: tuple = YEAR_WINDOW, backend: str = BACKEND):
+    """
+    Merges business demography, population, and GVA datasets into a final dataset for the years in
+    YEAR_WINDOW (2019-2023).
+
+    :param years: Inclusive (first, last) year window
+    :type years: tuple
+    :param backend: Execution backend, "pandas", "polars" or "duckdb"
+    :type backend: str
+    :return: None
+    :rtype: DataFrame
+    """
+    merged = merge_measures(years, backend)
 
-    # Save final dataset to csv
-    out_path = PROCESSED_DIR / "final_dataset.csv"
-    merged.to_csv(out_path, index=False)
+    # Save final dataset
+    write_dataset(merged, "final_dataset")
 
-    print(f"Final dataset: {len(merged)} rows (2019-2023)")
+    print(f"Final dataset: {len(merged)} rows ({years[0]}-{years[1]})")
 
 
-merge_all_datasets()
+if __name__ == "__main__":
+    merge_all_datasets()
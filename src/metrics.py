@@ -0,0 +1,170 @@
+# -- Imports --
+import ast
+import numpy as np
+import pandas as pd
+
+# -- Registry --
+# Every derived measure, with its formula and the columns or metrics it needs. Formulas are plain
+# arithmetic (+ - * / and brackets) on column names, so every backend can evaluate them. A metric
+# may use another metric as an input, e.g. net_rate uses net_change.
+METRICS = {
+    "birth_rate": {
+        "formula": "births / active * 100",
+        "inputs": ["births", "active"],
+        "description": "Births per 100 active businesses",
+    },
+    "death_rate": {
+        "formula": "deaths / active * 100",
+        "inputs": ["deaths", "active"],
+        "description": "Deaths per 100 active businesses",
+    },
+    "net_change": {
+        "formula": "births - deaths",
+        "inputs": ["births", "deaths"],
+        "description": "Net change in business counts for that year",
+    },
+    "net_rate": {
+        "formula": "net_change / active * 100",
+        "inputs": ["net_change", "active"],
+        "description": "Net change rate per 100 active businesses",
+    },
+    "gva_per_capita": {
+        "formula": "gva_million * 1000000 / population",
+        "inputs": ["gva_million", "population"],
+        "description": "GVA per person",
+    },
+    "gva_per_business": {
+        "formula": "gva_million * 1000000 / active",
+        "inputs": ["gva_million", "active"],
+        "description": "GVA per active business",
+    },
+}
+
+OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+}
+
+
+# -- Functions --
+def resolve(names: list = None) -> list:
+    """
+    The metrics needed to compute the requested ones, each after the metrics it uses.
+
+    :param names: Requested metric names, all metrics if not passed
+    :type names: list
+    :return: Metric names in the order to compute them
+    :rtype: list
+    """
+    order = []
+
+    def visit(name):
+        if name not in METRICS:
+            raise ValueError(f"Unknown metric: {name}, choose from {list(METRICS)}")
+        for dependency in METRICS[name]["inputs"]:
+            if dependency in METRICS and dependency not in order:
+                visit(dependency)
+        if name not in order:
+            order.append(name)
+
+    for name in names if names is not None else METRICS:
+        visit(name)
+    return order
+
+
+def formulas(names: list = None) -> dict:
+    """
+    Formulas of the requested metrics and the metrics they use, in the order to compute them.
+
+    :param names: Requested metric names, all metrics if not passed
+    :type names: list
+    :return: Metric name to formula
+    :rtype: dict
+    """
+    return {name: METRICS[name]["formula"] for name in resolve(names)}
+
+
+def _evaluate(node: ast.AST, arrays: dict, out: np.ndarray) -> np.ndarray:
+    """
+    Evaluates a formula into out, applying each operator in place, so a chain like a / b * 100
+    needs no temporary arrays. Only a bracketed right-hand operand gets its own buffer.
+    """
+    if isinstance(node, ast.Name):
+        np.copyto(out, arrays[node.id])
+    elif isinstance(node, ast.Constant):
+        out.fill(node.value)
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        _evaluate(node.operand, arrays, out)
+        np.negative(out, out=out)
+    elif isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+        _evaluate(node.left, arrays, out)
+        if isinstance(node.right, ast.Name):
+            right = arrays[node.right.id]
+        elif isinstance(node.right, ast.Constant):
+            right = node.right.value
+        else:
+            right = _evaluate(node.right, arrays, np.empty_like(out))
+        OPERATORS[type(node.op)](out, right, out=out)
+    else:
+        raise ValueError(f"Unsupported expression in formula: {ast.dump(node)}")
+    return out
+
+
+def evaluate(df: pd.DataFrame, metric_formulas: dict) -> dict:
+    """
+    Evaluates formulas on a DataFrame in one pass per metric. Each input column is converted to a
+    float64 array once, with missing values as NaN, and shared by every formula. numexpr is used
+    when installed, otherwise each formula is applied in place into its output array.
+
+    Division by zero, and anything else that is not finite, always gives a missing value, so a
+    zero denominator never shows up as inf in averages or plots.
+
+    :param df: DataFrame with the input columns
+    :type df: pd.DataFrame
+    :param metric_formulas: Metric name to formula, in the order to compute them
+    :type metric_formulas: dict
+    :return: Metric name to float64 array
+    :rtype: dict
+    """
+    try:
+        import numexpr
+    except ImportError:
+        numexpr = None
+
+    arrays = {}
+    results = {}
+    for name, formula in metric_formulas.items():
+        tree = ast.parse(formula, mode="eval").body
+        for column in {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)}:
+            if column not in arrays:
+                arrays[column] = df[column].to_numpy(dtype="float64", na_value=np.nan)
+
+        out = np.empty(len(df), dtype="float64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if numexpr is not None:
+                numexpr.evaluate(formula, local_dict=arrays, out=out)
+            else:
+                _evaluate(tree, arrays, out)
+        np.copyto(out, np.nan, where=np.isinf(out))
+
+        arrays[name] = results[name] = out
+    return results
+
+
+def compute_metrics(df: pd.DataFrame, names: list = None) -> pd.DataFrame:
+    """
+    Adds the requested metrics to a DataFrame. Only those metrics, and the metrics they use, are
+    computed; helper metrics that were not requested are not added.
+
+    :param df: DataFrame with the input columns, e.g. the final dataset
+    :type df: pd.DataFrame
+    :param names: Metric names, all metrics if not passed
+    :type names: list
+    :return: Copy of df with one column per requested metric
+    :rtype: DataFrame
+    """
+    results = evaluate(df, formulas(names))
+    wanted = names if names is not None else list(METRICS)
+    return df.assign(**{name: results[name] for name in wanted})
@@ -0,0 +1,479 @@
+# -- Imports --
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+import pandas as pd
+from analysis_prepare import prepare_analysis
+from analysis_table import LEAGUE_TABLE_FILE, league_table
+from clean_demography import demography_counts, load_demography_sheets, stack_sheets
+from clean_gva import gva_dataset
+from clean_gva_industry import build_totals
+from clean_population import build_population, population_dataset
+from cleaning_helpers import normalise_geo
+from config import (
+    DEMOGRAPHY_FILE,
+    FIGURES_DIR,
+    GVA_DIR,
+    GVA_WORKERS,
+    PIPELINE_WORKERS,
+    POPULATION_FILE,
+    PROCESSED_DIR,
+    REGION_LOOKUP_FILE,
+    YEAR_WINDOW,
+)
+from geography import build_geography, geographies_in
+from merge_datasets import merge_frames
+from raw_cache import file_hash, read_excel_cached
+from run_report import load_stage_reports, stage, summary_text, write_run_report
+from storage import (
+    SCHEMAS,
+    apply_schema,
+    dataset_files,
+    dataset_path,
+    partitioned_dir,
+    write_dataset,
+)
+
+SRC_DIR = Path(__file__).resolve().parent
+STATE_FILE = PROCESSED_DIR / ".pipeline_state.json"
+
+# -- Stages --
+# Each stage is one of the scripts in src/, with the files it reads and writes. The modules it
+# imports are found from its source, see local_imports. Stages depend on whichever stages write
+# their inputs, so the geography dimension is built first and the cleaners then run side by side.
+STAGES = [
+    {
+        "name": "geography",
+        "inputs": [DEMOGRAPHY_FILE, POPULATION_FILE, REGION_LOOKUP_FILE]
+        + sorted(GVA_DIR.glob("regionalgrossvalueadded*.xlsx")),
+        "outputs": [dataset_path("geography")],
+    },
+    {
+        "name": "clean_demography",
+        "inputs": [DEMOGRAPHY_FILE, dataset_path("geography")],
+        "outputs": [dataset_path("business_demography_counts")],
+    },
+    {
+        "name": "clean_population",
+        "inputs": [POPULATION_FILE, dataset_path("geography")],
+        "outputs": [dataset_path("population")],
+    },
+    {
+        "name": "clean_gva_industry",
+        "inputs": sorted(GVA_DIR.glob("regionalgrossvalueadded*.xlsx"))
+        + [dataset_path("geography")],
+        "outputs": [
+            partitioned_dir("gva_industry") / "_manifest.json",
+            dataset_path("sic07"),
+        ],
+    },
+    {
+        "name": "clean_gva",
+        "inputs": [
+            partitioned_dir("gva_industry") / "_manifest.json",
+            dataset_path("geography"),
+        ],
+        "outputs": [dataset_path("gva")],
+    },
+    {
+        "name": "merge_datasets",
+        "inputs": [
+            dataset_path("business_demography_counts"),
+            dataset_path("population"),
+            dataset_path("gva"),
+        ],
+        "outputs": [dataset_path("final_dataset")],
+    },
+    {
+        "name": "analysis_prepare",
+        "inputs": [dataset_path("final_dataset"), dataset_path("geography")],
+        "outputs": [dataset_path("analysis_dataset")],
+    },
+    {
+        "name": "analysis_stats",
+        "inputs": [dataset_path("analysis_dataset")],
+        "outputs": [
+            PROCESSED_DIR / "analysis_statistics_summary.csv",
+            PROCESSED_DIR / "analysis_statistics_correlation.csv",
+            PROCESSED_DIR / "analysis_statistics_regression.txt",
+            PROCESSED_DIR / "analysis_statistics_panel.txt",
+            PROCESSED_DIR / "analysis_statistics_by_year.csv",
+            PROCESSED_DIR / "analysis_statistics_by_region_name.csv",
+            PROCESSED_DIR / "analysis_statistics_bootstrap.csv",
+        ],
+    },
+    {
+        "name": "analysis_table",
+        "inputs": [dataset_path("analysis_dataset")],
+        "outputs": [PROCESSED_DIR / "analysis_regional_league_table.csv"],
+    },
+    {
+        "name": "analysis_plots",
+        "inputs": [dataset_path("analysis_dataset")],
+        "outputs": [
+            FIGURES_DIR / "fig1_business_churn.png",
+            FIGURES_DIR / "avg_birth_death_rates_over_time.png",
+            FIGURES_DIR / "fig2_net_growth_boxplot.png",
+            FIGURES_DIR / "fig3_productivity_over_growth.png",
+        ],
+    },
+]
+
+
+# -- Functions --
+def dependencies(stages: list = STAGES) -> dict:
+    """
+    Maps each stage name to the names of the stages that write its inputs.
+
+    :param stages: Stage declarations
+    :type stages: list
+    :return: Upstream stage names for every stage
+    :rtype: dict
+    """
+    producers = {out: spec["name"] for spec in stages for out in spec["outputs"]}
+    return {
+        spec["name"]: {producers[i] for i in spec["inputs"] if i in producers}
+        for spec in stages
+    }
+
+
+def local_imports(module: str) -> list:
+    """
+    The modules in src/ a script imports, directly or through the modules it imports, including
+    imports inside functions.
+
+    :param module: Script name without .py, e.g. "merge_datasets"
+    :type module: str
+    :return: Sorted file names, without the script itself
+    :rtype: list
+    """
+    found = set()
+    todo = [module]
+    while todo:
+        tree = ast.parse((SRC_DIR / f"{todo.pop()}.py").read_text())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0:
+                names = [node.module]
+            else:
+                continue
+            for name in (n.split(".")[0] for n in names):
+                if name not in found and (SRC_DIR / f"{name}.py").exists():
+                    found.add(name)
+                    todo.append(name)
+    return sorted(f"{name}.py" for name in found - {module})
+
+
+def input_files(path: Path) -> list:
+    """
+    An input file, followed by the year partitions appended to it if it is a processed dataset,
+    so appending years changes the fingerprint of every stage reading the dataset.
+
+    :param path: Input file declared by a stage
+    :type path: Path
+    :return: List of paths
+    :rtype: list
+    """
+    path = Path(path)
+    if path.parent == PROCESSED_DIR and path.stem in SCHEMAS:
+        return dataset_files(path.stem, path.suffix[1:])
+    return [path]
+
+
+def fingerprint(spec: dict) -> str:
+    """
+    Hash of a stage's source code, the modules it imports, and its input file contents,
+    including any year partitions appended to its input datasets.
+
+    :param spec: Stage declaration
+    :type spec: dict
+    :return: Hex digest, or None if an input is missing
+    :rtype: str
+    """
+    code = [f"{spec['name']}.py"] + local_imports(spec["name"])
+    files = [SRC_DIR / name for name in code]
+    files += [f for path in spec["inputs"] for f in input_files(path)]
+    digest = hashlib.sha256()
+    for path in files:
+        if not Path(path).exists():
+            return None
+        digest.update(f"{path}:{file_hash(path)}\n".encode())
+    return digest.hexdigest()
+
+
+def is_stale(spec: dict, state: dict) -> bool:
+    """
+    A stage is stale if an output is missing or its fingerprint changed since the last successful run.
+
+    :param spec: Stage declaration
+    :type spec: dict
+    :param state: Fingerprints from the last run, keyed by stage name
+    :type state: dict
+    :return: Whether the stage needs to run
+    :rtype: bool
+    """
+    if not all(Path(out).exists() for out in spec["outputs"]):
+        return True
+    return state.get(spec["name"]) != fingerprint(spec)
+
+
+def run_stage(spec: dict, env: dict = None) -> float:
+    """
+    Runs a stage's script in its own interpreter, exactly as when it is run by hand.
+
+    :param spec: Stage declaration
+    :type spec: dict
+    :param env: Environment variables for the script, this process's if not passed
+    :type env: dict
+    :return: Wall time in seconds
+    :rtype: float
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, str(SRC_DIR / f"{spec['name']}.py")],
+        cwd=SRC_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines() or [f"exit code {result.returncode}"]
+        raise RuntimeError(lines[-1])
+    return time.perf_counter() - start
+
+
+def load_state() -> dict:
+    if STATE_FILE.exists():
+        return json.loads(STATE_FILE.read_text())
+    return {}
+
+
+def save_state(state: dict) -> None:
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    STATE_FILE.write_text(json.dumps(state, indent=2, sort_keys=True))
+
+
+def run(
+    workers: int = PIPELINE_WORKERS,
+    force: bool = False,
+    report: bool = False,
+    profile: bool = False,
+) -> dict:
+    """
+    Runs the stages whose inputs changed, in dependency order.
+
+    A stage is started as soon as all its upstream stages are done, so independent stages
+    (the three cleaners, then stats/table/plots) run at the same time. Each stage is checked
+    when it becomes ready, so if an upstream stage rewrites identical outputs its downstream
+    stages are skipped.
+
+    With report=True every stage that runs writes its run report (see run_report.py) to one
+    folder for the run, and the pipeline combines them into run.json there.
+
+    :param workers: Maximum number of stages running at once
+    :type workers: int
+    :param force: Run every stage even if nothing changed
+    :type force: bool
+    :param report: Record a run report for every stage that runs
+    :type report: bool
+    :param profile: Also save a cProfile dump per stage, implies report
+    :type profile: bool
+    :return: Outcome per stage name: "ran", "skipped", "failed" or "blocked"
+    :rtype: dict
+    """
+    stages = {spec["name"]: spec for spec in STAGES}
+    upstream = dependencies(STAGES)
+    state = load_state()
+    outcome = {}
+    running = {}
+    fingerprints = {}
+    seconds = {}
+
+    env = None
+    if report or profile:
+        run_id = time.strftime("%Y%m%d-%H%M%S")
+        env = {**os.environ, "RUN_REPORT": "1", "RUN_ID": run_id}
+        env["RUN_PROFILE"] = "1" if profile else "0"
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while len(outcome) < len(stages):
+            # Start or skip every stage whose upstream stages have all finished
+            for name, spec in stages.items():
+                if name in outcome or name in running.values():
+                    continue
+                if not upstream[name].issubset(outcome):
+                    continue
+                if any(outcome[u] in ("failed", "blocked") for u in upstream[name]):
+                    outcome[name] = "blocked"
+                elif force or is_stale(spec, state):
+                    # Fingerprint before running, so inputs edited mid-run rerun next time
+                    fingerprints[name] = fingerprint(spec)
+                    running[pool.submit(run_stage, spec, env)] = name
+                else:
+                    outcome[name] = "skipped"
+                    print(f"[skip] {name}")
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    seconds[name] = future.result()
+                except Exception as e:
+                    outcome[name] = "failed"
+                    state.pop(name, None)
+                    print(f"[fail] {name}: {e}")
+                else:
+                    outcome[name] = "ran"
+                    state[name] = fingerprints[name]
+                    print(f"[done] {name} ({seconds[name]:.1f}s)")
+                save_state(state)
+
+    if env is not None:
+        stages_run = {
+            name: {"outcome": outcome[name], "wall_s": round(seconds.get(name, 0), 3)}
+            for name in stages
+        }
+        path = write_run_report(run_id, stages_run, time.perf_counter() - start)
+        print(summary_text(load_stage_reports(run_id)))
+        print(f"Run report saved to {path}")
+    return outcome
+
+
+# -- In Memory --
+# The same stages as pure functions of DataFrames, chained without writing or reading any
+# processed dataset. Every dataset gets its schema applied as it would be by write_dataset, so
+# each one equals what read_dataset gives after the scripts have run.
+def load_raw(workers: int = GVA_WORKERS) -> dict:
+    """
+    Reads the raw tables the cleaners start from, through the raw cache, the GVA 'Total' rows
+    included.
+
+    :param workers: Worker processes reading the GVA workbooks
+    :type workers: int
+    :return: "demography" sheets by name, the "population" sheet and the "gva" 'Total' rows of
+        every workbook, see clean_gva_industry.build_totals
+    :rtype: dict
+    """
+    return {
+        "demography": load_demography_sheets(),
+        "population": read_excel_cached(
+            POPULATION_FILE, sheet_name="Population data", header=0
+        ),
+        "gva": build_totals(workers=workers),
+    }
+
+
+def _as_written(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    return apply_schema(df.reset_index(drop=True), name)
+
+
+@stage("run_pipeline")
+def run_pipeline(
+    raw: dict = None,
+    years: tuple = YEAR_WINDOW,
+    metrics: list = None,
+    existing: pd.DataFrame = None,
+    persist: bool = False,
+    analyses: bool = False,
+) -> dict:
+    """
+    Runs every stage from the raw tables to the regional league table in memory.
+
+    With persist=True the processed datasets and the league table are also written, checked
+    against their contracts, as the stage scripts would write them. The industry-level GVA
+    dataset is not built. With analyses=True the statistics and figures are made from the
+    analysis dataset in memory.
+
+    :param raw: Raw tables, see load_raw, which reads them if not passed
+    :type raw: dict
+    :param years: Inclusive (first, last) year window of the final dataset
+    :type years: tuple
+    :param metrics: Metrics from metrics.METRICS to add, all of them if not passed
+    :type metrics: list
+    :param existing: Previously built geography dimension, whose ids are kept
+    :type existing: pd.DataFrame
+    :param persist: Also write every dataset to PROCESSED_DIR
+    :type persist: bool
+    :param analyses: Also write the statistics and figures
+    :type analyses: bool
+    :return: Dataset name to DataFrame, plus "league_table"
+    :rtype: dict
+    """
+    raw = load_raw() if raw is None else raw
+    demography = stack_sheets(raw["demography"])
+    gva = normalise_geo(raw["gva"].copy())
+    sources = geographies_in(
+        [demography, build_population(sheet=raw["population"]), gva]
+    )
+    geography = _as_written(build_geography(existing, sources), "geography")
+
+    datasets = {
+        "geography": geography,
+        "business_demography_counts": demography_counts(demography, geography),
+        "population": population_dataset(raw["population"], geography),
+        "gva": gva_dataset(gva, geography),
+    }
+    datasets = {name: _as_written(df, name) for name, df in datasets.items()}
+    datasets["final_dataset"] = _as_written(
+        merge_frames(
+            datasets["business_demography_counts"],
+            datasets["population"],
+            datasets["gva"],
+            years,
+        ),
+        "final_dataset",
+    )
+    datasets["analysis_dataset"] = _as_written(
+        prepare_analysis(datasets["final_dataset"], geography, metrics),
+        "analysis_dataset",
+    )
+    table = league_table(datasets["analysis_dataset"])
+
+    if persist:
+        for name, df in datasets.items():
+            write_dataset(df, name)
+        table.to_csv(LEAGUE_TABLE_FILE)
+    if analyses:
+        # Imported here, as statsmodels and matplotlib are slow to import
+        import analysis_plots
+        import analysis_stats
+
+        analysis_stats.main(datasets["analysis_dataset"])
+        analysis_plots.main(analysis=datasets["analysis_dataset"])
+    return {**datasets, "league_table": table}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the stages whose inputs changed.")
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS)
+    parser.add_argument("--force", action="store_true", help="run every stage")
+    parser.add_argument(
+        "--report", action="store_true", help="record a run report for every stage"
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="also save a cProfile dump per stage"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    outcome = run(
+        workers=args.workers, force=args.force, report=args.report, profile=args.profile
+    )
+    print(f"Pipeline finished in {time.perf_counter() - start:.1f}s")
+    if "failed" in outcome.values():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
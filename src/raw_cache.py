@@ -0,0 +1,203 @@
+# -- Imports --
+import argparse
+import hashlib
+import os
+import pickle
+from pathlib import Path
+import pandas as pd
+from config import CACHE_DIR, CACHE_MAX_BYTES
+from run_report import traced
+
+# File hashes already computed in this process, keyed by (path, size, mtime)
+_FILE_HASHES = {}
+
+# Bytes in each cache directory when this process last counted them, plus the entries it wrote since
+_CACHE_BYTES = {}
+
+
+# -- Keys --
+def file_hash(path_name: Path) -> str:
+    """
+    SHA-256 of a file's contents, remembered per process while the file is unchanged.
+
+    :param path_name: File path to hash
+    :type path_name: Path
+    :return: Hex digest of the file contents
+    :rtype: str
+    """
+    stat = os.stat(path_name)
+    memo_key = (str(path_name), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _FILE_HASHES:
+        digest = hashlib.sha256()
+        with open(path_name, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _FILE_HASHES[memo_key] = digest.hexdigest()
+    return _FILE_HASHES[memo_key]
+
+
+def cache_path(path_name: Path, *parts) -> Path:
+    """
+    Cache file for a raw file plus whatever identifies the parsed result (sheet name, header row...).
+
+    :param path_name: Raw file the result was parsed from
+    :type path_name: Path
+    :param parts: Values that identify the parse
+    :return: Path of the cache entry
+    :rtype: Path
+    """
+    key = "|".join([file_hash(path_name)] + [repr(p) for p in parts])
+    return CACHE_DIR / f"{hashlib.sha256(key.encode()).hexdigest()}.pkl"
+
+
+# -- Reading and Writing Entries --
+def _load(entry: Path):
+    """
+    Returns the cached DataFrame, or None on a miss. Hits are touched so eviction is least recently used.
+    """
+    try:
+        df = pd.read_pickle(entry)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+    os.utime(entry)
+    return df
+
+
+def _store(entry: Path, df: pd.DataFrame) -> None:
+    """
+    Writes an entry atomically, so parallel workers never read half-written files. The directory is
+    only listed on a process's first write and once the size limit is passed, when it evicts.
+    """
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+    df.to_pickle(tmp)
+    os.replace(tmp, entry)
+    if CACHE_DIR in _CACHE_BYTES:
+        _CACHE_BYTES[CACHE_DIR] += entry.stat().st_size
+    else:
+        _CACHE_BYTES[CACHE_DIR] = sum(p.stat().st_size for p in cache_entries())
+    if _CACHE_BYTES[CACHE_DIR] > CACHE_MAX_BYTES:
+        evict(CACHE_MAX_BYTES)
+
+
+def cached(path_name: Path, parts: tuple, loader):
+    """
+    Returns the cached result for (path_name, parts), calling loader() and storing its result on a miss.
+
+    :param path_name: Raw file the result is parsed from
+    :type path_name: Path
+    :param parts: Values that identify the parse
+    :type parts: tuple
+    :param loader: Function with no arguments that parses the raw file
+    :return: Parsed DataFrame
+    :rtype: DataFrame
+    """
+    entry = cache_path(path_name, *parts)
+    df = _load(entry)
+    if df is None:
+        df = loader()
+        _store(entry, df)
+    return df
+
+
+@traced(name="read_excel", detail=("sheet_name", "header"))
+def read_excel_cached(path_name: Path, sheet_name, header: int):
+    """
+    Cached drop-in for pd.read_excel(path_name, sheet_name=sheet_name, header=header).
+
+    Keyed on the file's content hash, the sheet name and the header row, so a changed workbook
+    is always parsed again. A list of sheet names returns a dict like pd.read_excel does, and only
+    the sheets missing from the cache are parsed, in a single pass over the workbook.
+
+    :param path_name: File path of the excel file
+    :type path_name: Path
+    :param sheet_name: Sheet name, or list of sheet names
+    :type sheet_name: str | list
+    :param header: Row number to use as the column names
+    :type header: int
+    :return: Parsed sheet, or dict of parsed sheets keyed by name
+    :rtype: DataFrame | dict
+    """
+    if not isinstance(sheet_name, list):
+        return cached(
+            path_name,
+            ("excel", sheet_name, header),
+            lambda: pd.read_excel(path_name, sheet_name=sheet_name, header=header),
+        )
+
+    entries = {
+        name: cache_path(path_name, "excel", name, header) for name in sheet_name
+    }
+    sheets = {name: _load(entry) for name, entry in entries.items()}
+    missing = [name for name, df in sheets.items() if df is None]
+    if missing:
+        parsed = pd.read_excel(path_name, sheet_name=missing, header=header)
+        for name, df in parsed.items():
+            _store(entries[name], df)
+            sheets[name] = df
+    return sheets
+
+
+# -- Maintenance --
+def cache_entries() -> list:
+    """
+    Cache files, least recently used first.
+
+    :return: List of cache file paths
+    :rtype: list
+    """
+    if not CACHE_DIR.exists():
+        return []
+    return sorted(CACHE_DIR.glob("*.pkl"), key=lambda p: p.stat().st_mtime)
+
+
+def evict(max_bytes: int = CACHE_MAX_BYTES) -> int:
+    """
+    Deletes least recently used entries until the cache is no bigger than max_bytes.
+
+    :param max_bytes: Size limit of the cache directory in bytes
+    :type max_bytes: int
+    :return: Number of entries deleted
+    :rtype: int
+    """
+    entries = cache_entries()
+    total = sum(p.stat().st_size for p in entries)
+    deleted = 0
+    for entry in entries:
+        if total <= max_bytes:
+            break
+        total -= entry.stat().st_size
+        entry.unlink(missing_ok=True)
+        deleted += 1
+    _CACHE_BYTES[CACHE_DIR] = total
+    return deleted
+
+
+def clear() -> int:
+    """
+    Deletes every cache entry.
+
+    :return: Number of entries deleted
+    :rtype: int
+    """
+    return evict(max_bytes=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the parsed raw sheet cache.")
+    parser.add_argument("command", choices=["clear", "info"])
+    args = parser.parse_args()
+
+    if args.command == "clear":
+        print(f"Deleted {clear()} cache entries from {CACHE_DIR}")
+    else:
+        entries = cache_entries()
+        size = sum(p.stat().st_size for p in entries)
+        print(
+            f"{len(entries)} cache entries, {size / 1e6:.1f} MB "
+            f"(limit {CACHE_MAX_BYTES / 1e6:.0f} MB) in {CACHE_DIR}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+# -- Imports --
+import argparse
+import cProfile
+import functools
+import inspect
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from config import RUN_PROFILE, RUN_REPORT, RUN_REPORT_DIR, TRACE_MEMORY
+
+try:
+    import resource
+except ImportError:  # not available on Windows, where peak RSS is left out
+    resource = None
+
+# Every stage script's entry point is wrapped with stage(), and its sub-steps (sheet reads, melts,
+# joins, fills, derives, writes) with traced() or step(). While RUN_REPORT is on, each step records
+# its wall and CPU time, its memory peak and the rows and bytes going in and out, and the stage
+# writes them to RUN_REPORT_DIR/<run id>/<stage>.json, with a cProfile dump next to it if
+# RUN_PROFILE is on. When no stage is being recorded, a step is one check of an empty list.
+#
+# Work done in worker processes counts towards the step that waits for it: its CPU time once the
+# pool has shut down, its memory not at all. Run with one worker to get a step per file or figure.
+
+_ACTIVE = []  # steps being recorded, innermost last, empty unless a stage is reported
+_RECORDS = []  # records of the stage being reported, in start order
+
+# Keys of a step record set by the step itself, the others are details of the call
+METRICS = [
+    "step",
+    "path",
+    "wall_s",
+    "cpu_s",
+    "traced_peak_mb",
+    "max_rss_mb",
+    "rows_in",
+    "bytes_in",
+    "rows_out",
+    "bytes_out",
+    "error",
+]
+
+
+# -- Measuring --
+def measure(obj) -> tuple:
+    """
+    Rows and in-memory bytes of a step's input or output. Object columns are not inspected deeply.
+    Files count their size on disk, and dicts, lists and tuples the sum of the DataFrames, Series
+    and files in them, so e.g. a dict of sheets counts every sheet.
+
+    :param obj: DataFrame, Series, array, file path, or a collection of them
+    :return: (rows, bytes), either None if it cannot be measured
+    :rtype: tuple
+    """
+    if isinstance(obj, pd.DataFrame):
+        return len(obj), int(obj.memory_usage(index=False).sum())
+    if isinstance(obj, pd.Series):
+        return len(obj), int(obj.memory_usage(index=False))
+    if isinstance(obj, np.ndarray):
+        return len(obj) if obj.ndim else 1, int(obj.nbytes)
+    if isinstance(obj, Path):
+        return None, obj.stat().st_size if obj.is_file() else None
+    if isinstance(obj, (dict, list, tuple)):
+        items = obj.values() if isinstance(obj, dict) else obj
+        rows, size = None, None
+        parts = [i for i in items if isinstance(i, (pd.DataFrame, pd.Series, Path))]
+        for item_rows, item_size in map(measure, parts):
+            if item_rows is not None:
+                rows = (rows or 0) + item_rows
+            if item_size is not None:
+                size = (size or 0) + item_size
+        return rows, size
+    return None, None
+
+
+def _cpu_seconds() -> float:
+    """
+    CPU time of this process, plus that of its finished child processes.
+    """
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
+
+
+def _max_rss_mb() -> float:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB on Linux
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1024
+
+
+# -- Steps --
+class _Step:
+    """
+    One recorded step. Nested steps are recorded inside their parent, whose memory peak includes
+    theirs, as tracemalloc's peak is reset at the start of every step.
+    """
+
+    def __init__(self, name: str, detail: dict):
+        path = "/".join([s.record["step"] for s in _ACTIVE[1:]] + [name])
+        self.record = {"step": name, "path": path, **detail}
+        self._peak = 0
+
+    def __enter__(self):
+        if _ACTIVE:
+            _RECORDS.append(self.record)
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if _ACTIVE:
+                _ACTIVE[-1]._peak = max(_ACTIVE[-1]._peak, peak)
+            tracemalloc.reset_peak()
+            self._base = self._peak = current
+        _ACTIVE.append(self)
+        self._cpu = _cpu_seconds()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, error_type, error, tb):
+        self.record["wall_s"] = round(time.perf_counter() - self._start, 6)
+        self.record["cpu_s"] = round(_cpu_seconds() - self._cpu, 6)
+        _ACTIVE.pop()
+        if tracemalloc.is_tracing():
+            peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            self.record["traced_peak_mb"] = round((peak - self._base) / 1e6, 3)
+            if _ACTIVE:
+                _ACTIVE[-1]._peak = max(_ACTIVE[-1]._peak, peak)
+        self.record["max_rss_mb"] = _max_rss_mb()
+        if error_type is not None:
+            self.record["error"] = f"{error_type.__name__}: {error}"
+        return False
+
+    def _add(self, direction: str, obj) -> None:
+        rows, size = measure(obj)
+        for key, value in ((f"rows_{direction}", rows), (f"bytes_{direction}", size)):
+            if value is not None:
+                self.record[key] = self.record.get(key, 0) + value
+
+    def input(self, obj) -> None:
+        """
+        Adds the rows and bytes of obj to the step's input, see measure.
+        """
+        self._add("in", obj)
+
+    def output(self, obj) -> None:
+        """
+        Adds the rows and bytes of obj to the step's output, see measure.
+        """
+        self._add("out", obj)
+
+
+class _Off:
+    """
+    Stands in for a step while nothing is being reported.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, tb):
+        return False
+
+    def input(self, obj) -> None:
+        pass
+
+    def output(self, obj) -> None:
+        pass
+
+
+_OFF = _Off()
+
+
+def step(name: str, **detail):
+    """
+    Context manager recording a block of code as a step of the running stage. Call .input() and
+    .output() on it with the data going in and out.
+
+    :param name: Step name, e.g. "fill"
+    :type name: str
+    :param detail: Values to record with the step, e.g. sheet="Table 1.1a"
+    :return: Step, or a stand-in that records nothing if no stage is being reported
+    """
+    if not _ACTIVE:
+        return _OFF
+    return _Step(name, detail)
+
+
+def _value(value):
+    if isinstance(value, Path):
+        return value.name
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)) and len(value) <= 20:
+        return [_value(v) for v in value]
+    return str(value)
+
+
+def traced(func=None, *, name: str = None, detail: tuple = ()):
+    """
+    Decorator recording every call of a function as a step of the running stage. Its first
+    argument is measured as the input and its return value as the output.
+
+    :param func: Function to record, when used without arguments
+    :param name: Step name, the function's name if not passed
+    :type name: str
+    :param detail: Names of arguments whose values are recorded with the step
+    :type detail: tuple
+    :return: Wrapped function, or a decorator
+    """
+    if func is None:
+        return functools.partial(traced, name=name, detail=detail)
+
+    label = name or func.__name__
+    signature = inspect.signature(func) if detail else None
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _ACTIVE:
+            return func(*args, **kwargs)
+
+        values = {}
+        if signature is not None:
+            bound = signature.bind_partial(*args, **kwargs).arguments
+            values = {key: _value(bound[key]) for key in detail if key in bound}
+        with _Step(label, values) as s:
+            if args:
+                s.input(args[0])
+            result = func(*args, **kwargs)
+            s.output(result)
+        return result
+
+    return wrapper
+
+
+# -- Stages --
+def run_id() -> str:
+    """
+    Folder name of the current run: RUN_ID when set by pipeline.py, otherwise the time now.
+    """
+    return os.environ.get("RUN_ID") or time.strftime("%Y%m%d-%H%M%S")
+
+
+def _forget() -> None:
+    """
+    Worker processes forked during a stage record nothing, as their records would be lost.
+    """
+    _ACTIVE.clear()
+    _RECORDS.clear()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget)
+
+
+def _record_stage(name: str, func, args: tuple, kwargs: dict):
+    """
+    Runs a stage's entry point while recording its steps, then writes the stage report.
+    """
+    out_dir = RUN_REPORT_DIR / run_id()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tracing = TRACE_MEMORY and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if RUN_PROFILE else None
+    started = time.strftime("%Y-%m-%dT%H:%M:%S")
+    root = _Step(name, {})
+    _RECORDS.clear()
+    try:
+        with root:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+    finally:
+        if tracing:
+            tracemalloc.stop()
+        report = {
+            "stage": name,
+            "run_id": out_dir.name,
+            "started": started,
+            **{k: v for k, v in root.record.items() if k not in ("step", "path")},
+            "steps": list(_RECORDS),
+        }
+        _RECORDS.clear()
+        if profiler is not None:
+            profiler.dump_stats(out_dir / f"{name}.prof")
+            report["profile"] = f"{name}.prof"
+        path = out_dir / f"{name}.json"
+        path.write_text(json.dumps(report, indent=1))
+        print(f"Run report saved to {path}")
+
+
+def stage(name: str):
+    """
+    Decorator for the entry point of a stage script, which writes the stage's run report while
+    RUN_REPORT is on. Called from inside another stage, it is recorded as one of its steps.
+
+    :param name: Stage name, the script's name in pipeline.STAGES
+    :type name: str
+    :return: Decorator
+    """
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _ACTIVE:
+                with _Step(name, {}):
+                    return func(*args, **kwargs)
+            if not RUN_REPORT:
+                return func(*args, **kwargs)
+            return _record_stage(name, func, args, kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+# -- Run Reports --
+def load_stage_reports(run: str) -> dict:
+    """
+    The stage reports of a run, keyed by stage name.
+
+    :param run: Run id, a folder in RUN_REPORT_DIR
+    :type run: str
+    :return: Stage reports
+    :rtype: dict
+    """
+    paths = sorted((RUN_REPORT_DIR / run).glob("*.json"))
+    reports = {}
+    for path in paths:
+        if path.name != "run.json":
+            reports[path.stem] = json.loads(path.read_text())
+    return reports
+
+
+def write_run_report(run: str, stages: dict, wall_s: float) -> Path:
+    """
+    Combines the stage reports of a pipeline run into RUN_REPORT_DIR/<run>/run.json.
+
+    :param run: Run id
+    :type run: str
+    :param stages: Stage name to {"outcome": ..., "wall_s": ...} from the pipeline
+    :type stages: dict
+    :param wall_s: Wall time of the whole run
+    :type wall_s: float
+    :return: Path of the run report
+    :rtype: Path
+    """
+    reports = load_stage_reports(run)
+    report = {
+        "run_id": run,
+        "wall_s": round(wall_s, 3),
+        "stages": {
+            name: {**outcome, "report": reports.get(name)}
+            for name, outcome in stages.items()
+        },
+    }
+    path = RUN_REPORT_DIR / run / "run.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=1))
+    return path
+
+
+def summary_text(reports: dict, top: int = 10) -> str:
+    """
+    Plain-text summary of stage reports: one line per stage, then the slowest steps of all.
+
+    :param reports: Stage reports keyed by stage name, see load_stage_reports
+    :type reports: dict
+    :param top: Number of slowest steps to list
+    :type top: int
+    :return: Summary
+    :rtype: str
+    """
+
+    def mb(value):
+        return "-" if value is None else f"{value:.0f}"
+
+    lines = [f"{'stage':<22}{'wall s':>9}{'cpu s':>9}{'peak MB':>9}{'rss MB':>9}"]
+    steps = []
+    for name, report in reports.items():
+        lines.append(
+            f"{name:<22}{report['wall_s']:>9.2f}{report['cpu_s']:>9.2f}"
+            f"{mb(report.get('traced_peak_mb')):>9}{mb(report.get('max_rss_mb')):>9}"
+        )
+        steps += [(name, s) for s in report["steps"]]
+
+    header = (
+        f"{'slowest steps':<22}{'':<40}{'wall s':>9}{'rows in':>10}{'rows out':>10}"
+    )
+    lines += ["", header]
+    steps.sort(key=lambda item: item[1]["wall_s"], reverse=True)
+    for name, s in steps[:top]:
+        detail = [str(v) for k, v in s.items() if k not in METRICS and v is not None]
+        label = " ".join([s["step"]] + detail)
+        if len(label) > 39:
+            label = f"{label[:18]}...{label[-18:]}"
+        rows_in, rows_out = s.get("rows_in", "-"), s.get("rows_out", "-")
+        lines.append(
+            f"{name:<22}{label[:39]:<40}{s['wall_s']:>9.2f}{rows_in:>10}{rows_out:>10}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise the reports of a run.")
+    parser.add_argument("run", nargs="?", help="run id, the latest run if not passed")
+    parser.add_argument("--top", type=int, default=10, help="slowest steps to list")
+    args = parser.parse_args()
+
+    runs = sorted(p.name for p in RUN_REPORT_DIR.glob("*") if p.is_dir())
+    if not runs:
+        print(f"No run reports in {RUN_REPORT_DIR}")
+        return
+    run = args.run or runs[-1]
+    print(f"Run {run}")
+    print(summary_text(load_stage_reports(run), args.top))
+
+
+if __name__ == "__main__":
+    main()
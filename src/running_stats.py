@@ -0,0 +1,242 @@
+# -- Imports --
+import numpy as np
+import pandas as pd
+
+# Summary statistics built up chunk by chunk, so a dataset never has to be held in memory at once.
+# A state holds, for every pair of columns (i, j), the count, the mean and the sum of squared
+# deviations of column i over the rows where both are present, and the co-moment of the pair.
+# These combine exactly across chunks (Chan et al.'s update of Welford's method), and the pairwise
+# counts give the same missing-value handling as DataFrame.corr(). Quantiles come from a t-digest
+# sketch per column: a few hundred weighted centroids, smallest in the tails, that also combine.
+# States built by separate workers are combined with merge_states.
+
+COMPRESSION = 1000  # t-digest compression, more centroids give more exact quantiles
+QUANTILES = [0.25, 0.5, 0.75]  # reported by describe(), as in DataFrame.describe()
+
+
+# -- Quantile Sketch --
+def _compress(means: np.ndarray, weights: np.ndarray, compression: int) -> tuple:
+    """
+    Merges neighbouring centroids so each covers at most one unit of the t-digest scale
+    k(q) = compression / (2 pi) * asin(2q - 1), which keeps centroids small near the tails.
+    """
+    order = np.argsort(means, kind="stable")
+    means, weights = means[order], weights[order]
+    middle = (np.cumsum(weights) - weights / 2) / weights.sum()
+    k = np.floor(compression / (2 * np.pi) * np.arcsin(2 * middle - 1))
+    bins = (k - k[0]).astype("int64")
+    total = np.bincount(bins, weights=weights)
+    keep = total > 0
+    centroid_means = np.bincount(bins, weights=means * weights)[keep] / total[keep]
+    return centroid_means, total[keep]
+
+
+def sketch_quantiles(sketch: tuple, low: float, high: float, q: list) -> np.ndarray:
+    """
+    Quantiles from a sketch, interpolated between centroids like numpy's linear method, so they
+    are exact while every centroid is a single value.
+
+    :param sketch: (means, weights) of the centroids, in order
+    :type sketch: tuple
+    :param low: Smallest value seen
+    :type low: float
+    :param high: Largest value seen
+    :type high: float
+    :param q: Quantiles between 0 and 1
+    :type q: list
+    :return: One value per quantile
+    :rtype: np.ndarray
+    """
+    means, weights = sketch
+    if not len(means):
+        return np.full(len(q), np.nan)
+    # Rank of each centroid's middle value, counting from 0
+    ranks = np.cumsum(weights) - (weights + 1) / 2
+    n = weights.sum()
+    ranks = np.concatenate([[0], ranks, [n - 1]])
+    means = np.concatenate([[low], means, [high]])
+    return np.interp(np.asarray(q) * (n - 1), ranks, means)
+
+
+# -- Accumulating --
+def new_state(columns: list) -> dict:
+    """
+    Empty running totals for the given columns.
+
+    :param columns: Numeric columns to summarise
+    :type columns: list
+    :return: State to pass to update
+    :rtype: dict
+    """
+    k = len(columns)
+    return {
+        "columns": list(columns),
+        "count": np.zeros((k, k)),
+        "mean": np.zeros((k, k)),
+        "m2": np.zeros((k, k)),
+        "comoment": np.zeros((k, k)),
+        "min": np.full(k, np.inf),
+        "max": np.full(k, -np.inf),
+        "sketches": [(np.empty(0), np.empty(0)) for _ in range(k)],
+    }
+
+
+def _combine(a: dict, b: dict, compression: int = COMPRESSION) -> dict:
+    """
+    Combines the moments and sketches of two states into a new state.
+    """
+    count = a["count"] + b["count"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = np.where(count > 0, b["count"] / count, 0)
+    delta = b["mean"] - a["mean"]
+    weight = a["count"] * share  # n_a * n_b / n
+    sketches = []
+    for (ma, wa), (mb, wb) in zip(a["sketches"], b["sketches"]):
+        means, weights = np.concatenate([ma, mb]), np.concatenate([wa, wb])
+        sketches.append(
+            _compress(means, weights, compression) if len(means) else (means, weights)
+        )
+    return {
+        "columns": a["columns"],
+        "count": count,
+        "mean": a["mean"] + delta * share,
+        "m2": a["m2"] + b["m2"] + delta**2 * weight,
+        "comoment": a["comoment"] + b["comoment"] + delta * delta.T * weight,
+        "min": np.minimum(a["min"], b["min"]),
+        "max": np.maximum(a["max"], b["max"]),
+        "sketches": sketches,
+    }
+
+
+def chunk_state(chunk: pd.DataFrame, columns: list) -> dict:
+    """
+    State of a single chunk, from a few matrix products over its values.
+
+    :param chunk: Rows to summarise
+    :type chunk: pd.DataFrame
+    :param columns: Numeric columns to summarise
+    :type columns: list
+    :return: State of the chunk
+    :rtype: dict
+    """
+    values = chunk[columns].to_numpy(dtype="float64", na_value=np.nan)
+    present = ~np.isnan(values)
+    # Shift by the chunk means first, so the sums of products stay well conditioned
+    shift = np.nanmean(np.where(present.any(axis=0), values, 0), axis=0)
+    z = np.where(present, values - shift, 0)
+    p = present.astype("float64")
+
+    count = p.T @ p
+    sums = z.T @ p  # sums[i, j]: sum of column i over rows where i and j are present
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(count > 0, sums / count, 0)
+    state = new_state(columns)
+    state.update(
+        count=count,
+        mean=mean + shift[:, None],
+        m2=(z * z).T @ p - sums * mean,
+        comoment=z.T @ z - sums * mean.T,
+        min=np.where(present, values, np.inf).min(axis=0),
+        max=np.where(present, values, -np.inf).max(axis=0),
+        sketches=[
+            (np.sort(values[present[:, i], i]), np.ones(present[:, i].sum()))
+            for i in range(len(columns))
+        ],
+    )
+    return state
+
+
+def update(state: dict, chunk: pd.DataFrame) -> dict:
+    """
+    Adds one chunk to the running totals.
+
+    :param state: From new_state
+    :type state: dict
+    :param chunk: Rows with the state's columns
+    :type chunk: pd.DataFrame
+    :return: The updated state
+    :rtype: dict
+    """
+    return _combine(state, chunk_state(chunk, state["columns"]))
+
+
+def update_groups(states: dict, chunk: pd.DataFrame, by: str, columns: list) -> dict:
+    """
+    Adds one chunk to a running state per value of a column, e.g. per year or region, so every
+    breakdown is built in the same pass as the overall totals.
+
+    :param states: Group value to state, empty to start
+    :type states: dict
+    :param chunk: Rows with the columns and the by column
+    :type chunk: pd.DataFrame
+    :param by: Column to break down by
+    :type by: str
+    :param columns: Numeric columns to summarise
+    :type columns: list
+    :return: The updated states
+    :rtype: dict
+    """
+    for key, rows in chunk.groupby(by, observed=True, sort=False):
+        states[key] = update(states.get(key, new_state(columns)), rows)
+    return states
+
+
+def merge_states(states: list) -> dict:
+    """
+    Combines states built on separate chunks, e.g. by separate worker processes.
+
+    :param states: States of the same columns
+    :type states: list
+    :return: Combined state
+    :rtype: dict
+    """
+    merged = new_state(states[0]["columns"])
+    for state in states:
+        merged = _combine(merged, state)
+    return merged
+
+
+# -- Results --
+def describe(state: dict) -> pd.DataFrame:
+    """
+    Count, mean, standard deviation, minimum, quartiles and maximum of every column, laid out like
+    DataFrame.describe(). Quartiles come from the sketches, everything else is exact.
+
+    :param state: From update or merge_states
+    :type state: dict
+    :return: One column per summarised column
+    :rtype: DataFrame
+    """
+    count = np.diag(state["count"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(count > 0, np.diag(state["mean"]), np.nan)
+        std = np.sqrt(np.diag(state["m2"]) / (count - 1))
+    std[count < 2] = np.nan
+    low = np.where(count > 0, state["min"], np.nan)
+    high = np.where(count > 0, state["max"], np.nan)
+    quartiles = np.column_stack(
+        [
+            sketch_quantiles(sketch, lo, hi, QUANTILES)
+            for sketch, lo, hi in zip(state["sketches"], low, high)
+        ]
+    )
+    rows = [count, mean, std, low, *quartiles, high]
+    index = ["count", "mean", "std", "min"]
+    index += [f"{q:.0%}" for q in QUANTILES] + ["max"]
+    return pd.DataFrame(rows, index=index, columns=state["columns"])
+
+
+def corr(state: dict) -> pd.DataFrame:
+    """
+    Pearson correlation matrix, each pair over the rows where both columns are present, as in
+    DataFrame.corr().
+
+    :param state: From update or merge_states
+    :type state: dict
+    :return: Correlation matrix
+    :rtype: DataFrame
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        matrix = state["comoment"] / np.sqrt(state["m2"] * state["m2"].T)
+    matrix[state["count"] < 2] = np.nan
+    return pd.DataFrame(matrix, index=state["columns"], columns=state["columns"])
@@ -0,0 +1,380 @@
+# -- Imports --
+import json
+import shutil
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from config import EXPORT_CSV, PROCESSED_DIR, PROCESSED_FORMAT
+from raw_cache import file_hash
+from run_report import traced
+
+# -- Schemas --
+# Explicit dtypes for every processed dataset, so each stage reads back exactly what was written
+# instead of re-inferring types from text. Counts are nullable integers, measures and metrics are
+# float64, as float32 changes the published values (710331.27 reads back as 710331.25).
+GEO_COLUMNS = {
+    "geo_id": "int32",
+    "geo_code": "category",
+    "geo_name": "category",
+    "year": "int16",
+}
+COUNT_COLUMNS = {"births": "Int32", "deaths": "Int32", "active": "Int32"}
+MERGED_COLUMNS = {
+    **GEO_COLUMNS,
+    **COUNT_COLUMNS,
+    "population": "Int32",
+    "is_unreliable": "boolean",
+    "gva_million": "float64",
+}
+
+SCHEMAS = {
+    "geography": {
+        "geo_id": "int32",
+        "geo_code": "category",
+        "geo_name": "category",
+        "region_code": "category",
+        "region_name": "category",
+    },
+    "business_demography_counts": {**GEO_COLUMNS, **COUNT_COLUMNS},
+    "population": {**GEO_COLUMNS, "population": "Int32", "is_unreliable": "boolean"},
+    "gva": {**GEO_COLUMNS, "gva_million": "float64"},
+    "gva_industry": {
+        **GEO_COLUMNS,
+        "region": "category",
+        "sic07": "category",
+        "gva_million": "float64",
+    },
+    "sic07": {
+        "sic07": "str",
+        "description": "str",
+        "level": "category",
+        "section": "category",
+        "parent": "str",
+    },
+    "final_dataset": MERGED_COLUMNS,
+    "analysis_dataset": {
+        **MERGED_COLUMNS,
+        "birth_rate": "float64",
+        "death_rate": "float64",
+        "net_change": "Int32",
+        "net_rate": "float64",
+        "gva_per_capita": "float64",
+        "gva_per_business": "float64",
+        "region_code": "category",
+        "region_name": "category",
+    },
+}
+
+
+# -- Functions --
+def dataset_path(name: str, fmt: str = PROCESSED_FORMAT) -> Path:
+    """
+    Path of a processed dataset in the given format ("parquet", "feather" or "csv").
+
+    :param name: Dataset name, e.g. "final_dataset"
+    :type name: str
+    :param fmt: File format
+    :type fmt: str
+    :return: Path in PROCESSED_DIR
+    :rtype: Path
+    """
+    return PROCESSED_DIR / f"{name}.{fmt}"
+
+
+def apply_schema(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    """
+    Casts the columns of a dataset to the dtypes in its schema. Columns not in the schema are left as they are.
+
+    :param df: Dataset to cast
+    :type df: pd.DataFrame
+    :param name: Dataset name, a key of SCHEMAS
+    :type name: str
+    :return: DataFrame with schema dtypes
+    :rtype: DataFrame
+    """
+    schema = SCHEMAS[name]
+    dtypes = {col: dtype for col, dtype in schema.items() if col in df.columns}
+    return df.astype(dtypes)
+
+
+def parts_dir(name: str) -> Path:
+    """
+    Folder holding the year partitions appended to a dataset since it was last fully written.
+
+    :param name: Dataset name, e.g. "population"
+    :type name: str
+    :return: Path in PROCESSED_DIR
+    :rtype: Path
+    """
+    return PROCESSED_DIR / f"{name}.parts"
+
+
+def _write_file(df: pd.DataFrame, path: Path, fmt: str) -> None:
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    elif fmt == "feather":
+        df.to_feather(path)
+    elif fmt == "csv":
+        df.to_csv(path, index=False)
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+
+def _read_file(path: Path, fmt: str, columns: list = None) -> pd.DataFrame:
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    if fmt == "feather":
+        return pd.read_feather(path, columns=columns)
+    if fmt == "csv":
+        return pd.read_csv(path, usecols=columns)
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def check_contract(df: pd.DataFrame, name: str) -> None:
+    """
+    Checks rows about to be written against the dataset's contract in contracts.py, saving the
+    report and raising if it fails. Imported here rather than at the top, as contracts imports
+    this module.
+    """
+    from contracts import CONTRACTS, enforce, validate
+
+    if name in CONTRACTS:
+        enforce(validate(df, name))
+
+
+@traced(detail=("name",))
+def write_dataset(
+    df: pd.DataFrame,
+    name: str,
+    fmt: str = PROCESSED_FORMAT,
+    export_csv: bool = EXPORT_CSV,
+) -> Path:
+    """
+    Writes a processed dataset with its schema applied, as Parquet or Feather, and optionally as CSV too.
+    A full write replaces any appended year partitions. Rows are checked against the dataset's
+    contract first, and nothing is written if it fails.
+
+    :param df: Dataset to write
+    :type df: pd.DataFrame
+    :param name: Dataset name, a key of SCHEMAS
+    :type name: str
+    :param fmt: File format, "parquet", "feather" or "csv"
+    :type fmt: str
+    :param export_csv: Also write a CSV copy next to it
+    :type export_csv: bool
+    :return: Path of the written file
+    :rtype: Path
+    """
+    df = apply_schema(df.reset_index(drop=True), name)
+    check_contract(df, name)
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    path = dataset_path(name, fmt)
+    _write_file(df, path, fmt)
+    shutil.rmtree(parts_dir(name), ignore_errors=True)
+
+    if export_csv and fmt != "csv":
+        df.to_csv(dataset_path(name, "csv"), index=False)
+    return path
+
+
+@traced(detail=("name",))
+def append_dataset(
+    df: pd.DataFrame,
+    name: str,
+    fmt: str = PROCESSED_FORMAT,
+    export_csv: bool = EXPORT_CSV,
+) -> list:
+    """
+    Appends new years to a processed dataset, one partition file per year, without rewriting existing files.
+    The CSV copy is appended to in place. The new rows are checked against the dataset's contract first.
+
+    :param df: New rows, only for years not already in the dataset
+    :type df: pd.DataFrame
+    :param name: Dataset name, a key of SCHEMAS
+    :type name: str
+    :param fmt: File format, "parquet", "feather" or "csv"
+    :type fmt: str
+    :param export_csv: Also append the rows to the CSV copy
+    :type export_csv: bool
+    :return: Paths of the written partitions
+    :rtype: list
+    """
+    df = apply_schema(df.reset_index(drop=True), name)
+    check_contract(df, name)
+    folder = parts_dir(name)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for year, rows in df.groupby("year", sort=True):
+        path = folder / f"year={year}.{fmt}"
+        if path.exists():
+            raise ValueError(f"{name} already has an appended partition for {year}")
+        _write_file(rows.reset_index(drop=True), path, fmt)
+        paths.append(path)
+
+    csv_path = dataset_path(name, "csv")
+    if export_csv and fmt != "csv" and csv_path.exists():
+        df.to_csv(csv_path, mode="a", header=False, index=False)
+    return paths
+
+
+def dataset_files(name: str, fmt: str = PROCESSED_FORMAT) -> list:
+    """
+    Files making up a processed dataset: the base file, then any appended year partitions.
+
+    :param name: Dataset name, e.g. "final_dataset"
+    :type name: str
+    :param fmt: File format
+    :type fmt: str
+    :return: List of paths
+    :rtype: list
+    """
+    return [dataset_path(name, fmt)] + sorted(parts_dir(name).glob(f"year=*.{fmt}"))
+
+
+@traced(detail=("name", "columns", "years"))
+def read_dataset(
+    name: str, fmt: str = PROCESSED_FORMAT, columns: list = None, years: tuple = None
+):
+    """
+    Reads a processed dataset, plus any appended year partitions, with its schema applied.
+
+    A year window is pushed down into the Parquet reader, so row groups outside it are skipped.
+
+    :param name: Dataset name, a key of SCHEMAS
+    :type name: str
+    :param fmt: File format, "parquet", "feather" or "csv"
+    :type fmt: str
+    :param columns: Only read these columns
+    :type columns: list
+    :param years: Inclusive (first, last) year window, or None for all years
+    :type years: tuple
+    :return: Dataset
+    :rtype: DataFrame
+    """
+    frames = []
+    for path in dataset_files(name, fmt):
+        if fmt == "parquet" and years is not None:
+            filters = [("year", ">=", years[0]), ("year", "<=", years[1])]
+            frames.append(pd.read_parquet(path, columns=columns, filters=filters))
+        else:
+            frames.append(_read_file(path, fmt, columns))
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    if years is not None and fmt != "parquet":
+        df = df[df["year"].between(*years)].reset_index(drop=True)
+    return apply_schema(df, name)
+
+
+def iter_dataset(
+    name: str,
+    fmt: str = PROCESSED_FORMAT,
+    columns: list = None,
+    batch_rows: int = 65_536,
+):
+    """
+    Streams a processed dataset, plus any appended year partitions, in chunks of at most batch_rows
+    rows with its schema applied, so the whole dataset is never held in memory. Parquet is read one
+    record batch at a time and CSV with a chunked reader; Feather files are read whole, then split.
+
+    :param name: Dataset name, a key of SCHEMAS
+    :type name: str
+    :param fmt: File format, "parquet", "feather" or "csv"
+    :type fmt: str
+    :param columns: Only read these columns
+    :type columns: list
+    :param batch_rows: Most rows per chunk
+    :type batch_rows: int
+    :return: DataFrames
+    """
+    for path in dataset_files(name, fmt):
+        if fmt == "parquet":
+            batches = pq.ParquetFile(path).iter_batches(batch_rows, columns=columns)
+            chunks = (batch.to_pandas() for batch in batches)
+        elif fmt == "csv":
+            chunks = pd.read_csv(path, usecols=columns, chunksize=batch_rows)
+        else:
+            df = _read_file(path, fmt, columns)
+            chunks = (
+                df.iloc[start : start + batch_rows]
+                for start in range(0, len(df), batch_rows)
+            )
+        for chunk in chunks:
+            yield apply_schema(chunk, name)
+
+
+def partitioned_dir(name: str) -> Path:
+    """
+    Folder of a dataset written as Hive-style partitions, e.g. gva_industry/region=Wales/year=2023/.
+
+    :param name: Dataset name, e.g. "gva_industry"
+    :type name: str
+    :return: Path in PROCESSED_DIR
+    :rtype: Path
+    """
+    return PROCESSED_DIR / name
+
+
+@traced(detail=("name", "columns"))
+def read_partitioned(
+    name: str, columns: list = None, filters=None, partitions: dict = None
+) -> pd.DataFrame:
+    """
+    Reads a partitioned Parquet dataset with its schema applied. Partition keys come back as columns,
+    and filters on them skip whole folders, so reading one region or year only opens its files.
+
+    :param name: Dataset name, a key of SCHEMAS
+    :type name: str
+    :param columns: Only read these columns
+    :type columns: list
+    :param filters: pyarrow expression to filter rows by
+    :param partitions: Partition key names and their pyarrow types, in folder order
+    :type partitions: dict
+    :return: Dataset
+    :rtype: DataFrame
+    """
+    partitioning = ds.partitioning(
+        pa.schema(list((partitions or {}).items())), flavor="hive"
+    )
+    dataset = ds.dataset(
+        partitioned_dir(name), format="parquet", partitioning=partitioning
+    )
+    table = dataset.to_table(columns=columns, filter=filters)
+    return apply_schema(table.to_pandas(), name)
+
+
+@traced(detail=("name",))
+def write_manifest(name: str) -> Path:
+    """
+    Writes a manifest of a partitioned dataset's files and their content hashes, as one file that
+    changes whenever any partition does. Files starting with "_" are skipped by Parquet readers.
+
+    :param name: Dataset name, e.g. "gva_industry"
+    :type name: str
+    :return: Path of the manifest
+    :rtype: Path
+    """
+    folder = partitioned_dir(name)
+    files = {
+        str(path.relative_to(folder)): file_hash(path)
+        for path in sorted(folder.rglob("*.parquet"))
+    }
+    path = folder / "_manifest.json"
+    path.write_text(json.dumps(files, indent=1))
+    return path
+
+
+def dataset_years(name: str) -> set:
+    """
+    Years already in a processed dataset, or an empty set if it has not been built.
+
+    :param name: Dataset name, a key of SCHEMAS
+    :type name: str
+    :return: Set of years
+    :rtype: set
+    """
+    if not dataset_path(name).exists():
+        return set()
+    return set(read_dataset(name, columns=["year"])["year"].unique().tolist())
@@ -0,0 +1,892 @@
+# -- Imports --
+import argparse
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from config import (
+    DATA_DIR,
+    DEMOGRAPHY_FILE,
+    POPULATION_FILE,
+    POPULATION_FILL,
+    REGION_FALLBACKS,
+    REGION_LOOKUP_FILE,
+)
+from cleaning_helpers import fill_within_groups, group_starts
+from storage import apply_schema
+
+# Seeded stand-ins for the raw ONS workbooks, at any number of areas, years and industries, for
+# load testing the cleaners without the real files or network access. Every workbook has the
+# sheet names, header rows and quirks the cleaners rely on: title rows above the demography
+# headers (header=3), one single-year sheet per early year and a multi-year sheet, aggregate
+# rows (UK, countries, regions) and padded codes in the demography tables, '[u]' markers and a
+# source footer in the population table, and one Table 2 per ITL1 region with every SIC07 row.
+# Areas abolished in a boundary change only appear in the demography years before it.
+#
+# The matching processed datasets (geography, business_demography_counts, population and gva)
+# are written as Parquet next to the workbooks, so the merge and analysis stages can be scaled
+# without running the cleaners first.
+#
+# Sheets are written as XML straight into the .xlsx zip, one chunk of rows at a time, with every
+# cell of a chunk formatted by Arrow compute functions rather than a Python loop, so writing a
+# gigabyte of workbooks takes minutes rather than hours as it would with openpyxl.
+
+N_AREAS = 376  # LAs across the regions below, about the real data size
+YEARS = range(1998, 2024)  # population and GVA years, demography runs one year later
+DEMOGRAPHY_YEARS = 6  # demography covers the last five years of YEARS and the next one
+SUPPRESSION = {  # share of values suppressed in each source
+    "demography": 0.001,  # left blank
+    "population": 0.002,  # marked '[u]', on top of Northern Ireland's latest year
+    "gva": 0.0,
+}
+ABOLISHED_SHARE = 0.03  # share of districts (E07) abolished during the demography years
+CHUNK_ROWS = 50_000  # sheet rows formatted at a time
+EXCEL_MAX_ROWS = 1_048_576
+GVA_FILE_PREFIX = "regionalgrossvalueaddedbalancedbyindustrylocalauthorities"
+
+# ITL1 regions: GVA file suffix, name, region code, and LAs per code prefix in the real data
+REGIONS = [
+    ("tlcnortheast", "North East", "E12000001", {"E06": 7, "E08": 5}),
+    ("tldnorthwest", "North West", "E12000002", {"E06": 9, "E07": 20, "E08": 10}),
+    (
+        "tleyorkshireandthehumber",
+        "Yorkshire and The Humber",
+        "E12000003",
+        {"E06": 6, "E08": 9},
+    ),
+    ("tlfeastmidlands", "East Midlands", "E12000004", {"E06": 5, "E07": 30}),
+    ("tlgwestmidlands", "West Midlands", "E12000005", {"E06": 4, "E07": 19, "E08": 7}),
+    ("tlheast", "East", "E12000006", {"E06": 6, "E07": 39}),
+    ("tlilondon", "London", "E12000007", {"E09": 33}),
+    ("tljsoutheast", "South East", "E12000008", {"E06": 19, "E07": 45}),
+    ("tlksouthwest", "South West", "E12000009", {"E06": 11, "E07": 18}),
+    ("tllwales", "Wales", "W92000004", {"W06": 22}),
+    ("tlmscotland", "Scotland", "S92000003", {"S12": 32}),
+    ("tlnnorthernireland", "Northern Ireland", "N92000002", {"N09": 11}),
+]
+
+# Totals above the regions in the demography tables, and the region codes they add up
+TOTALS = [
+    ("K02000001", "UNITED KINGDOM", ("E", "W", "S", "N")),
+    ("K03000001", "GREAT BRITAIN", ("E", "W", "S")),
+    ("K04000001", "ENGLAND AND WALES", ("E", "W")),
+    ("E92000001", "ENGLAND", ("E",)),
+]
+
+# Demography table number of each measure
+MEASURES = {"births": "1", "deaths": "2", "active": "3"}
+
+# SIC07 rows of Table 2, in sheet order. Extra industries are added as further divisions
+SIC07 = [
+    ("Total", "All industries"),
+    ("A-E", "Production sector"),
+    ("AB (1-9)", "Agriculture, forestry and fishing; mining and quarrying"),
+    ("C (10-33)", "Manufacturing"),
+    ("CA-CB (10-15)", "Manufacture of food, beverages, textiles and clothing"),
+    ("CC (16-18)", "Manufacture of wood and paper products and printing"),
+    ("CD-CG (19-23)", "Manufacture of petroleum, chemicals and other minerals"),
+    ("CH (24-25)", "Manufacture of basic and fabricated metal products"),
+    ("CI-CL (26-30)", "Manufacture of electrical products and machinery"),
+    ("CM (31-33)", "Other manufacturing, repair and installation"),
+    ("DE (35-39)", "Electricity, gas, water; sewerage and waste management"),
+    ("F (41-43)", "Construction"),
+    ("41", "Construction of buildings"),
+    ("42", "Civil engineering"),
+    ("43", "Specialised construction activities"),
+    ("G-T", "Services sector"),
+    ("G (45-47)", "Wholesale and retail trade; repair of motor vehicles"),
+    ("45", "Motor trades"),
+    ("46", "Wholesale trade"),
+    ("47", "Retail trade"),
+    ("H (49-53)", "Transportation and storage"),
+    ("49-51", "Land, water and air transport"),
+    ("52-53", "Warehousing, transport support, postal and courier activities"),
+    ("I (55-56)", "Accommodation and food service activities"),
+    ("J (58-63)", "Information and communication"),
+    ("58-60", "Publishing; film and TV production and broadcasting"),
+    ("61-63", "Telecommunications; information technology"),
+    ("K (64-66)", "Financial and insurance activities"),
+    ("L (68)", "Real estate activities"),
+    ("68IMP", "Owner-occupiers' imputed rental"),
+    ("68", "Real estate activities, excluding imputed rental"),
+    ("M (69-75)", "Professional, scientific and technical activities"),
+    ("69", "Legal and accounting activities"),
+    ("70", "Head offices and management consultancy"),
+    ("71", "Architectural and engineering activities"),
+    ("72-75", "Other professional, scientific and technical activities"),
+    ("N (77-82)", "Administrative and support service activities"),
+    ("77", "Rental and leasing activities"),
+    ("78-80", "Employment activities; tourism and security services"),
+    ("81", "Services to buildings and landscape activities"),
+    ("82", "Office administration and business support activities"),
+    ("O (84)", "Public administration and defence"),
+    ("P (85)", "Education"),
+    ("Q (86-88)", "Human health and social work activities"),
+    ("R (90-93)", "Arts, entertainment and recreation"),
+    ("S (94-96)", "Other service activities"),
+    ("94-95", "Membership organisations; repair of household goods"),
+    ("96", "Other personal service activities"),
+    ("T (97-98)", "Activities of households"),
+]
+
+
+# -- Areas and Values --
+def synthetic_areas(
+    n_areas: int, demography_years: list, rng: np.random.Generator
+) -> pd.DataFrame:
+    """
+    Local authorities spread over the ITL1 regions in their real proportions, with codes of the
+    real prefixes (E06, E07, ... S12, N09). A share of districts is abolished part way through the
+    demography years.
+
+    :param n_areas: Number of LAs
+    :type n_areas: int
+    :param demography_years: Years of the demography tables
+    :type demography_years: list
+    :param rng: Random generator
+    :type rng: np.random.Generator
+    :return: geo_code, geo_name, region (index into REGIONS) and last_year, in region order
+    :rtype: DataFrame
+    """
+    sizes = np.array([sum(prefixes.values()) for *_, prefixes in REGIONS])
+    region = np.sort(rng.choice(len(REGIONS), n_areas, p=sizes / sizes.sum()))
+
+    prefixes = np.empty(n_areas, dtype=object)
+    for r, (*_, weights) in enumerate(REGIONS):
+        in_region = region == r
+        counts = np.array(list(weights.values()))
+        prefixes[in_region] = rng.choice(
+            list(weights), in_region.sum(), p=counts / counts.sum()
+        )
+    serial = pd.Series(prefixes).groupby(prefixes).cumcount().to_numpy() + 1
+    codes = [f"{p}{s:06d}" for p, s in zip(prefixes, serial)]
+
+    last_year = np.full(n_areas, demography_years[-1])
+    abolished = (prefixes == "E07") & (rng.random(n_areas) < ABOLISHED_SHARE)
+    if len(demography_years) > 1:
+        last_year[abolished] = rng.choice(demography_years[:-1], abolished.sum())
+
+    return pd.DataFrame(
+        {
+            "geo_code": codes,
+            "geo_name": [f"Area {c[1:3]}-{s}" for c, s in zip(codes, serial)],
+            "region": region,
+            "last_year": last_year,
+        }
+    )
+
+
+def synthetic_values(
+    areas: pd.DataFrame, years: list, rng: np.random.Generator
+) -> dict:
+    """
+    Population, business counts and total GVA of every area in every year. Each area gets a size
+    and a trend, and the counts and GVA follow its population with their own noise, so the usual
+    correlations between them hold. Counts are rounded to base 5, as ONS control rounds them.
+
+    :param areas: From synthetic_areas
+    :type areas: pd.DataFrame
+    :param years: Every year of any source
+    :type years: list
+    :param rng: Random generator
+    :type rng: np.random.Generator
+    :return: Arrays of shape (n_areas, n_years) keyed by population, births, deaths, active and gva
+    :rtype: dict
+    """
+    n, t = len(areas), np.arange(len(years))
+    size = np.exp(rng.normal(np.log(150_000), 0.6, n)).clip(2_000)
+    trend = rng.normal(0.005, 0.004, n)[:, None] * t
+    noise = np.cumsum(rng.normal(0, 0.003, (n, len(years))), axis=1)
+    population = np.round(size[:, None] * np.exp(trend + noise))
+
+    active = population * np.exp(rng.normal(np.log(0.04), 0.25, n))[:, None]
+    values = {"population": population}
+    for measure, rate in [("births", 0.12), ("deaths", 0.11)]:
+        draws = np.exp(rng.normal(np.log(rate), 0.15, active.shape))
+        values[measure] = np.round(active * draws / 5) * 5
+    values["active"] = np.round(active / 5) * 5
+
+    productivity = np.exp(rng.normal(np.log(0.025), 0.35, n))[:, None]
+    growth = np.exp(0.015 * t + rng.normal(0, 0.02, population.shape))
+    values["gva"] = np.round(population * productivity * growth)
+    return values
+
+
+def industry_values(
+    total: np.ndarray, n_industries: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    GVA of every SIC07 row, from each area's total. Rows below Total take random shares of it,
+    so like the chained volume measures in Table 2 the components do not add up.
+
+    :param total: Total GVA, shape (n_areas, n_years)
+    :type total: np.ndarray
+    :param n_industries: SIC07 rows including Total
+    :type n_industries: int
+    :param rng: Random generator
+    :type rng: np.random.Generator
+    :return: GVA, shape (n_areas, n_industries, n_years)
+    :rtype: np.ndarray
+    """
+    shares = rng.dirichlet(np.ones(max(n_industries - 1, 1)), len(total))
+    drift = np.exp(rng.normal(0, 0.05, (len(total), n_industries - 1, total.shape[1])))
+    values = np.empty((len(total), n_industries, total.shape[1]))
+    values[:, 0] = total
+    values[:, 1:] = np.round(
+        total[:, None, :] * 3 * shares[:, : n_industries - 1, None] * drift
+    )
+    return values
+
+
+def sic07_rows(n_industries: int) -> list:
+    """
+    The first n_industries SIC07 rows, with numbered divisions added past the real list.
+
+    :param n_industries: SIC07 rows including Total
+    :type n_industries: int
+    :return: (code, description) pairs in sheet order
+    :rtype: list
+    """
+    extra = [
+        (f"X{k:03d}", f"Synthetic division {k}")
+        for k in range(1, n_industries - len(SIC07) + 1)
+    ]
+    return (SIC07 + extra)[:n_industries]
+
+
+def suppress(values: np.ndarray, share: float, rng: np.random.Generator) -> np.ndarray:
+    """
+    Mask of randomly suppressed values.
+    """
+    return rng.random(values.shape) < share
+
+
+# -- Writing Workbooks --
+CONTENT_TYPES = (
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    "{sheets}</Types>"
+)
+SHEET_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{i}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+ROOT_RELS = (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" Type="http://schemas.openxmlformats.org/'
+    'officeDocument/2006/relationships/officeDocument"/></Relationships>'
+)
+WORKBOOK = (
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    "<sheets>{sheets}</sheets></workbook>"
+)
+WORKBOOK_RELS = (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    "{sheets}</Relationships>"
+)
+SHEET_REL = (
+    '<Relationship Id="rId{i}" Target="worksheets/sheet{i}.xml" Type="http://schemas.'
+    'openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+)
+SHEET_OPEN = '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+SHEET_CLOSE = "</sheetData></worksheet>"
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+
+def _escape(text):
+    for char, entity in [("&", "&amp;"), ("<", "&lt;"), (">", "&gt;")]:
+        text = pc.replace_substring(text, char, entity)
+    return text
+
+
+def _cell(value) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, str):
+        return f'<c t="inlineStr"><is><t>{escape(value)}</t></is></c>'
+    return f"<c><v>{value}</v></c>"
+
+
+def _row(values: list) -> str:
+    return "<row>" + "".join(_cell(v) for v in values) + "</row>"
+
+
+def _column_cells(values, marker: str = None) -> pa.Array:
+    """
+    Cell XML for a column of a chunk: numbers as values, text as inline strings, and missing
+    values as empty cells, or as inline marker text (e.g. '[u]') if one is given.
+    """
+    array = pa.array(values, from_pandas=True)
+    if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        cells = pc.binary_join_element_wise(
+            '<c t="inlineStr"><is><t>', _escape(array), "</t></is></c>", ""
+        )
+    else:
+        if pa.types.is_floating(array.type):
+            try:  # whole numbers format faster, and without a decimal point, as integers
+                array = pc.cast(array, pa.int64())
+            except pa.ArrowInvalid:
+                pass
+        text = pc.cast(array, pa.string())
+        cells = pc.binary_join_element_wise("<c><v>", text, "</v></c>", "")
+    empty = f'<c t="inlineStr"><is><t>{marker}</t></is></c>' if marker else "<c/>"
+    return pc.fill_null(cells, empty)
+
+
+def _table_xml(columns: list, marker: str = None) -> memoryview:
+    """
+    The rows of a chunk of columns as one block of XML, without a copy per row.
+    """
+    cells = [_column_cells(c, marker) for c in columns]
+    rows = pc.binary_join_element_wise("<row>", *cells, "</row>", "")
+    rows = rows.cast(pa.large_string())
+    offsets = np.frombuffer(rows.buffers()[1], dtype="int64")
+    start, end = offsets[rows.offset], offsets[rows.offset + len(rows)]
+    return memoryview(rows.buffers()[2])[start:end]
+
+
+def write_workbook(path: Path, sheets: dict) -> Path:
+    """
+    Writes a minimal .xlsx workbook that openpyxl and pd.read_excel read like any other.
+
+    Each sheet is a dict with "head", rows (lists of values) written above the table, "columns",
+    one array per table column, "marker", text written for missing table values instead of an
+    empty cell, and "tail", rows written below the table. Every key is optional.
+
+    :param path: File path of the workbook
+    :type path: Path
+    :param sheets: Sheet name to sheet dict, in workbook order
+    :type sheets: dict
+    :return: path
+    :rtype: Path
+    """
+    names = list(sheets)
+    parts = {
+        "[Content_Types].xml": CONTENT_TYPES.format(
+            sheets="".join(SHEET_TYPE.format(i=i + 1) for i in range(len(names)))
+        ),
+        "_rels/.rels": ROOT_RELS,
+        "xl/workbook.xml": WORKBOOK.format(
+            sheets="".join(
+                f'<sheet name="{escape(name)}" sheetId="{i + 1}" '
+                f'r:id="rId{i + 1}"/>'
+                for i, name in enumerate(names)
+            )
+        ),
+        "xl/_rels/workbook.xml.rels": WORKBOOK_RELS.format(
+            sheets="".join(SHEET_REL.format(i=i + 1) for i in range(len(names)))
+        ),
+    }
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for part, xml in parts.items():
+            # Written with open() for a fixed timestamp, so the same data gives the same bytes
+            with archive.open(part, "w") as f:
+                f.write((XML_DECLARATION + xml).encode())
+        for i, name in enumerate(names):
+            sheet = sheets[name]
+            columns = sheet.get("columns", [])
+            n_rows = len(columns[0]) if columns else 0
+            total = len(sheet.get("head", [])) + n_rows + len(sheet.get("tail", []))
+            if total > EXCEL_MAX_ROWS:
+                raise ValueError(
+                    f"Sheet {name} of {path.name} has {total} rows, more than Excel's "
+                    f"{EXCEL_MAX_ROWS}, use fewer areas or industries"
+                )
+            with archive.open(
+                f"xl/worksheets/sheet{i + 1}.xml", "w", force_zip64=True
+            ) as f:
+                f.write((XML_DECLARATION + SHEET_OPEN).encode())
+                f.write("".join(_row(r) for r in sheet.get("head", [])).encode())
+                for start in range(0, n_rows, CHUNK_ROWS):
+                    chunk = [c[start : start + CHUNK_ROWS] for c in columns]
+                    f.write(_table_xml(chunk, sheet.get("marker")))
+                f.write("".join(_row(r) for r in sheet.get("tail", [])).encode())
+                f.write(SHEET_CLOSE.encode())
+    return path
+
+
+# -- Sources --
+def demography_rows(areas: pd.DataFrame) -> tuple:
+    """
+    Rows of the demography tables in sheet order: the totals, then each region's total followed
+    by its LAs.
+
+    :param areas: From synthetic_areas
+    :type areas: pd.DataFrame
+    :return: (geo_code, geo_name, area) of every row, with area -1 for totals, and the LAs each
+        total adds up, shape (n_totals, n_areas)
+    :rtype: tuple
+    """
+    region = areas["region"].to_numpy()
+    codes, names, index, members = [], [], [], []
+    for code, name, countries in TOTALS:
+        covered = [r for r, spec in enumerate(REGIONS) if spec[2][0] in countries]
+        codes.append(code)
+        names.append(name)
+        index.append(-1)
+        members.append(np.isin(region, covered))
+    for r, (_, name, code, _) in enumerate(REGIONS):
+        las = np.flatnonzero(region == r)
+        codes += [code] + list(areas["geo_code"].to_numpy()[las])
+        names += [name.upper()] + list(areas["geo_name"].to_numpy()[las])
+        index += [-1] + list(las)
+        members.append(region == r)
+    rows = pd.DataFrame({"geo_code": codes, "geo_name": names, "area": index})
+    return rows, np.array(members, dtype="float64")
+
+
+def demography_layouts(years: list) -> list:
+    """
+    Years of each demography sheet, like the 2024 release: one sheet per early year, one sheet
+    for the three years before the latest, and one for the latest. Six years give the four sheets
+    a to d listed in clean_demography.DEMOGRAPHY_SHEETS, other spans are found by new_sheet_specs.
+    """
+    years = list(years)
+    layouts = [[y] for y in years[:-4]] + [years[-4:-1], years[-1:]]
+    return [sheet_years for sheet_years in layouts if sheet_years]
+
+
+def demography_sheets(
+    areas: pd.DataFrame,
+    values: dict,
+    years: list,
+    share: float,
+    rng: np.random.Generator,
+) -> tuple:
+    """
+    The Table 1.1, 2.1 and 3.1 sheets of the demography workbook. Title rows sit above the header
+    (header=3), the first year of a multi-year sheet is a text header and its total codes are
+    padded, as in the real workbook. Abolished LAs are left out of sheets after their last year,
+    and a share of LA values is blank.
+
+    :param areas: From synthetic_areas
+    :type areas: pd.DataFrame
+    :param values: From synthetic_values, ending with the demography years
+    :type values: dict
+    :param years: Demography years
+    :type years: list
+    :param share: Share of LA values left blank
+    :type share: float
+    :param rng: Random generator
+    :type rng: np.random.Generator
+    :return: (sheets for write_workbook, long DataFrame of every row written with geo_code,
+        geo_name, year, measure and value)
+    :rtype: tuple
+    """
+    rows, members = demography_rows(areas)
+    area = rows["area"].to_numpy()
+    is_la = area >= 0
+    alive = areas["last_year"].to_numpy()[:, None] >= np.array(years)
+    row_alive = np.where(is_la[:, None], alive[area], True)
+
+    sheets, frames = {}, []
+    for measure, table in MEASURES.items():
+        la_values = values[measure][:, -len(years) :]
+        matrix = np.empty((len(rows), len(years)))
+        matrix[is_la] = la_values[area[is_la]]
+        matrix[~is_la] = members @ np.where(alive, la_values, 0)
+        matrix[is_la[:, None] & suppress(matrix, share, rng)] = np.nan
+
+        for letter, sheet_years in zip(
+            "abcdefghijklmnopqrstuvwxyz", demography_layouts(years)
+        ):
+            first = years.index(sheet_years[0])
+            keep = row_alive[:, first]
+            codes = rows["geo_code"][keep]
+            multi = len(sheet_years) > 1
+            if multi:
+                codes = codes.where(is_la[keep], codes + " ")
+            header = [None, None] + [
+                str(y) if multi and k == 0 else y for k, y in enumerate(sheet_years)
+            ]
+            sheets[f"Table {table}.1{letter}"] = {
+                "head": [
+                    [
+                        f"Table {table}.1{letter} - Count Of {measure.title()} For "
+                        f"{', '.join(map(str, sheet_years))} by District, Counties And "
+                        "Unitary Authorities Within Region And Country"
+                    ],
+                    ["This worksheet contains one table"],
+                    ["Units: Counts (control rounded to base 5)"],
+                    header,
+                ],
+                "columns": [codes.to_numpy(), rows["geo_name"][keep].to_numpy()]
+                + [matrix[keep, years.index(y)] for y in sheet_years],
+            }
+            for y in sheet_years:
+                frames.append(
+                    pd.DataFrame(
+                        {
+                            "geo_code": rows["geo_code"][keep].to_numpy(),
+                            "geo_name": rows["geo_name"][keep].to_numpy(),
+                            "year": y,
+                            "measure": measure,
+                            "value": matrix[keep, years.index(y)],
+                        }
+                    )
+                )
+    return sheets, pd.concat(frames, ignore_index=True)
+
+
+def population_sheet(
+    areas: pd.DataFrame,
+    population: np.ndarray,
+    years: list,
+    share: float,
+    rng: np.random.Generator,
+) -> tuple:
+    """
+    The 'Population data' sheet: ITL1 region, LA code, LA name and one text-headed column per
+    year for the LAs on current boundaries. Northern Ireland's latest year and a share of other
+    values are '[u]', and a blank row and a source note follow the table.
+
+    :param areas: From synthetic_areas
+    :type areas: pd.DataFrame
+    :param population: Population of every area in years, shape (n_areas, n_years)
+    :type population: np.ndarray
+    :param years: Population years
+    :type years: list
+    :param share: Share of values marked '[u]', besides Northern Ireland's latest year
+    :type share: float
+    :param rng: Random generator
+    :type rng: np.random.Generator
+    :return: (sheet for write_workbook, values shape (n_current, n_years) with NaN for '[u]',
+        mask of current areas)
+    :rtype: tuple
+    """
+    current = areas["last_year"].to_numpy() == areas["last_year"].max()
+    region = areas["region"].to_numpy()[current]
+    matrix = population[current].copy()
+    unreliable = suppress(matrix, share, rng)
+    unreliable[region == len(REGIONS) - 1, -1] = True  # Northern Ireland is last
+    matrix[unreliable] = np.nan
+
+    labels = np.array([name for _, name, _, _ in REGIONS], dtype=object)
+    sheet = {
+        "head": [["ITL1 Region", "LA code", "LA name"] + [str(y) for y in years]],
+        "columns": [
+            labels[region],
+            areas["geo_code"].to_numpy()[current],
+            areas["geo_name"].to_numpy()[current],
+        ]
+        + list(matrix.T),
+        "marker": "[u]",
+        "tail": [
+            [],
+            [
+                "Source: ONS Population estimates for the UK, England and Wales, "
+                "Scotland and Northern Ireland"
+            ],
+        ],
+    }
+    return sheet, matrix, current
+
+
+def gva_sheet(
+    areas: pd.DataFrame,
+    region: int,
+    gva: np.ndarray,
+    years: list,
+    industries: list,
+    share: float,
+    rng: np.random.Generator,
+) -> tuple:
+    """
+    Table 2 of one region's GVA workbook: a title row, the header (header=1), then every SIC07
+    row of every LA in the region, LA by LA.
+
+    :param areas: Current LAs of the region, or of part of it
+    :type areas: pd.DataFrame
+    :param region: Index into REGIONS
+    :type region: int
+    :param gva: Total GVA of the LAs, shape (n_las, n_years)
+    :type gva: np.ndarray
+    :param years: GVA years
+    :type years: list
+    :param industries: From sic07_rows
+    :type industries: list
+    :param share: Share of values left blank
+    :type share: float
+    :param rng: Random generator
+    :type rng: np.random.Generator
+    :return: (sheet for write_workbook, the Total rows' values as written)
+    :rtype: tuple
+    """
+    name = REGIONS[region][1]
+    values = industry_values(gva, len(industries), rng)
+    values[suppress(values, share, rng)] = np.nan
+    n_las, n_industries = len(areas), len(industries)
+    codes, descriptions = (np.array(c, dtype=object) for c in zip(*industries))
+    sheet = {
+        "head": [
+            [
+                "Table 2: Regional gross value added (balanced) by industry: local "
+                f"authorities by ITL1 region: {name}, chained volume measures in 2022 "
+                "money value, pounds million [note 1]"
+            ],
+            ["ITL1 region", "LA code", "LA name", "SIC07", "SIC07 description"]
+            + [str(y) for y in years],
+        ],
+        "columns": [
+            np.full(n_las * n_industries, name, dtype=object),
+            np.repeat(areas["geo_code"].to_numpy(), n_industries),
+            np.repeat(areas["geo_name"].to_numpy(), n_industries),
+            np.tile(codes, n_las),
+            np.tile(descriptions, n_las),
+        ]
+        + list(values.reshape(-1, len(years)).T),
+    }
+    return sheet, values[:, 0]
+
+
+def lookup_sheet(areas: pd.DataFrame) -> dict:
+    """
+    The LA to region lookup, for the English and Welsh LAs on current boundaries.
+    """
+    current = areas[
+        (areas["last_year"] == areas["last_year"].max())
+        & areas["geo_code"].str.startswith(("E", "W"))
+    ]
+    region = current["region"].to_numpy()
+    return {
+        "head": [
+            [
+                "Internal migration: England and Wales local authority (2021 boundaries) to region lookup"
+            ],
+            [],
+            [
+                "(The country of Wales is included in the list of regions for comparison purposes)"
+            ],
+            [],
+            ["LA code", "LA name", "Region code", "Region name"],
+        ],
+        "columns": [
+            current["geo_code"].to_numpy(),
+            current["geo_name"].to_numpy(),
+            np.array([code for _, _, code, _ in REGIONS], dtype=object)[region],
+            np.array([name for _, name, _, _ in REGIONS], dtype=object)[region],
+        ],
+    }
+
+
+# -- Processed Datasets --
+def processed_datasets(
+    demography: pd.DataFrame, population: pd.DataFrame, gva: pd.DataFrame, lookup: dict
+) -> dict:
+    """
+    The processed datasets the cleaners would build from the workbooks: the geography dimension
+    with ids in geo_code order, the demography counts with one column per measure, the
+    population with '[u]' values flagged and filled by POPULATION_FILL, and the total GVA.
+
+    :param demography: Long demography values from demography_sheets
+    :type demography: pd.DataFrame
+    :param population: geo_code, geo_name, year and population, NaN where '[u]'
+    :type population: pd.DataFrame
+    :param gva: geo_code, geo_name, year and gva_million of the Total rows
+    :type gva: pd.DataFrame
+    :param lookup: Sheet from lookup_sheet
+    :type lookup: dict
+    :return: Dataset name to DataFrame
+    :rtype: dict
+    """
+    frames = [demography, population, gva]
+    geography = pd.concat([f[["geo_code", "geo_name"]] for f in frames])
+    geography = geography.drop_duplicates("geo_code").sort_values("geo_code")
+    geography.insert(0, "geo_id", np.arange(len(geography)))
+
+    code, _, region_code, region_name = lookup["columns"]
+    regions = pd.DataFrame(
+        {"region_code": region_code, "region_name": region_name}, index=code
+    ).reindex(geography["geo_code"])
+    for prefix, name in REGION_FALLBACKS.items():
+        fallback = regions["region_name"].isna() & regions.index.str.startswith(prefix)
+        regions.loc[fallback, "region_name"] = name
+    geography["region_code"] = regions["region_code"].to_numpy()
+    geography["region_name"] = regions["region_name"].to_numpy()
+
+    ids = pd.Series(geography["geo_id"].to_numpy(), index=geography["geo_code"])
+    counts = demography.pivot_table(
+        index=["geo_code", "year"], columns="measure", values="value", dropna=False
+    )[list(MEASURES)].reset_index()
+    counts.columns.name = None
+
+    population = population.assign(is_unreliable=population["population"].isna())
+    datasets = {
+        "business_demography_counts": counts,
+        "population": population,
+        "gva": gva,
+    }
+    for name, df in datasets.items():
+        df.insert(0, "geo_id", ids[df["geo_code"]].to_numpy())
+        if "geo_name" in df.columns:
+            df = df.drop(columns="geo_name")
+        df.insert(
+            2,
+            "geo_name",
+            geography.set_index("geo_id")["geo_name"][df["geo_id"]].to_numpy(),
+        )
+        datasets[name] = df.sort_values(["geo_id", "year"], ignore_index=True)
+
+    population = datasets["population"]
+    filled = fill_within_groups(
+        population["population"].to_numpy(dtype=float),
+        group_starts(population["geo_id"].to_numpy()),
+        policy=POPULATION_FILL,
+        x=population["year"].to_numpy(),
+    )
+    population["population"] = np.round(filled)
+    return {"geography": geography.reset_index(drop=True), **datasets}
+
+
+# -- Generating --
+def generate(
+    out_dir: Path,
+    n_areas: int = N_AREAS,
+    years: range = YEARS,
+    n_industries: int = len(SIC07),
+    seed: int = 0,
+    suppression: dict = SUPPRESSION,
+) -> dict:
+    """
+    Writes a full set of synthetic raw workbooks to out_dir/raw, under the same file names as the
+    real ones in data/raw, and the matching processed datasets to out_dir/processed as Parquet.
+    The same arguments always give the same data.
+
+    :param out_dir: Folder to write to
+    :type out_dir: Path
+    :param n_areas: Number of LAs
+    :type n_areas: int
+    :param years: Population and GVA years, demography covers the last five and the next one
+    :type years: range
+    :param n_industries: SIC07 rows per LA in the GVA tables, including Total
+    :type n_industries: int
+    :param seed: Random seed
+    :type seed: int
+    :param suppression: Share of values suppressed in each source, see SUPPRESSION
+    :type suppression: dict
+    :return: Paths of the "raw" workbooks and "processed" datasets, each keyed by name
+    :rtype: dict
+    """
+    rng = np.random.default_rng(seed)
+    years = list(years)
+    demography_years = list(range(years[-1] - DEMOGRAPHY_YEARS + 2, years[-1] + 2))
+    all_years = list(
+        range(min(years[0], demography_years[0]), demography_years[-1] + 1)
+    )
+    span = slice(all_years.index(years[0]), all_years.index(years[-1]) + 1)
+
+    areas = synthetic_areas(n_areas, demography_years, rng)
+    values = synthetic_values(areas, all_years, rng)
+    industries = sic07_rows(n_industries)
+
+    raw_dir, processed_dir = Path(out_dir) / "raw", Path(out_dir) / "processed"
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    processed_dir.mkdir(parents=True, exist_ok=True)
+    paths = {"raw": {}, "processed": {}}
+
+    sheets, demography = demography_sheets(
+        areas, values, demography_years, suppression["demography"], rng
+    )
+    paths["raw"]["demography"] = write_workbook(raw_dir / DEMOGRAPHY_FILE.name, sheets)
+
+    sheet, population, current = population_sheet(
+        areas, values["population"][:, span], years, suppression["population"], rng
+    )
+    paths["raw"]["population"] = write_workbook(
+        raw_dir / POPULATION_FILE.name, {"Population data": sheet}
+    )
+    lookup = lookup_sheet(areas)
+    paths["raw"]["region_lookup"] = write_workbook(
+        raw_dir / REGION_LOOKUP_FILE.name, {"LAS_REGION_EW_2021": lookup}
+    )
+
+    # Regions with more SIC07 rows than fit in a sheet are split over numbered workbooks
+    gva = np.full(population.shape, np.nan)
+    region = areas["region"].to_numpy()[current]
+    per_file = max((EXCEL_MAX_ROWS - 2) // len(industries), 1)
+    for r, (suffix, *_) in enumerate(REGIONS):
+        las = np.flatnonzero(region == r)
+        for k, start in enumerate(range(0, max(len(las), 1), per_file)):
+            part = las[start : start + per_file]
+            sheet, gva[part] = gva_sheet(
+                areas[current].iloc[part],
+                r,
+                values["gva"][current][part][:, span],
+                years,
+                industries,
+                suppression["gva"],
+                rng,
+            )
+            name = f"{suffix}{k + 1}" if k else suffix
+            paths["raw"][name] = write_workbook(
+                raw_dir / f"{GVA_FILE_PREFIX}{name}.xlsx", {"Table 2": sheet}
+            )
+
+    def long(matrix: np.ndarray, name: str) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "geo_code": np.tile(areas["geo_code"].to_numpy()[current], len(years)),
+                "geo_name": np.tile(areas["geo_name"].to_numpy()[current], len(years)),
+                "year": np.repeat(years, current.sum()),
+                name: matrix.T.ravel(),
+            }
+        )
+
+    datasets = processed_datasets(
+        demography, long(population, "population"), long(gva, "gva_million"), lookup
+    )
+    for name, df in datasets.items():
+        paths["processed"][name] = processed_dir / f"{name}.parquet"
+        apply_schema(df, name).to_parquet(paths["processed"][name], index=False)
+    return paths
+
+
+def main():
+    """
+    Main function to write a synthetic set of raw workbooks and processed datasets.
+
+    :return: None
+    :rtype: None
+    """
+    parser = argparse.ArgumentParser(
+        description="Write seeded synthetic ONS workbooks and processed datasets."
+    )
+    parser.add_argument("--out", type=Path, default=DATA_DIR / "synthetic")
+    parser.add_argument("--areas", type=int, default=N_AREAS, help="number of LAs")
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs=2,
+        default=[YEARS[0], YEARS[-1]],
+        metavar=("FIRST", "LAST"),
+    )
+    parser.add_argument(
+        "--industries", type=int, default=len(SIC07), help="SIC07 rows per LA"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generate(
+        args.out,
+        n_areas=args.areas,
+        years=range(args.years[0], args.years[1] + 1),
+        n_industries=args.industries,
+        seed=args.seed,
+    )
+    for kind, files in paths.items():
+        size = sum(path.stat().st_size for path in files.values())
+        print(
+            f"Saved {len(files)} {kind} files ({size / 1e6:.1f} MB) to {args.out / kind}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+# -- Imports --
+import sys
+from pathlib import Path
+
+# The scripts in src/ import each other as top-level modules (e.g. "from config import ..."),
+# as they are run from inside src/, so put src/ on the path for the tests too.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
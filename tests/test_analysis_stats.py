@@ -0,0 +1,103 @@
+# -- Imports --
+import tempfile
+import unittest as ut
+from pathlib import Path
+from unittest import mock
+import numpy as np
+import pandas as pd
+import analysis_stats
+from analysis_stats import (
+    MODEL_COLUMNS,
+    STAT_COLUMNS,
+    analysis_rows,
+    gva_cap,
+    model_rows,
+    streaming_summary,
+)
+
+
+class TestAnalysisStats(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        A small analysis dataset with missing GVA, unreliable rows and a long GVA per capita tail.
+
+        Runs once before all tests
+        """
+        rng = np.random.default_rng(19)
+        n = 3000
+        df = pd.DataFrame(
+            {
+                "geo_id": rng.integers(0, 300, n),
+                "year": rng.integers(2019, 2024, n),
+                "region_name": rng.choice(["North", "South", "East"], n),
+                "gva_million": rng.uniform(100, 1000, n),
+                "gva_per_capita": rng.lognormal(10, 0.5, n),
+                "is_unreliable": rng.random(n) < 0.05,
+            }
+        )
+        for col in STAT_COLUMNS:
+            if col != "gva_per_capita":
+                df[col] = rng.normal(10, 2, n)
+        df.loc[rng.random(n) < 0.1, "gva_million"] = np.nan
+        cls.df = df
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        patches = [
+            mock.patch.object(analysis_stats, "PROCESSED_DIR", self.dir),
+            mock.patch("builtins.print"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cap(self):
+        """
+        The streamed cap should be the 99th percentile of GVA per capita over rows with GVA data
+        """
+        exact = self.df.dropna(subset=["gva_million"])["gva_per_capita"].quantile(0.99)
+        for chunk_rows in [250, 3000]:
+            with self.subTest(chunk_rows=chunk_rows):
+                np.testing.assert_allclose(
+                    gva_cap(chunk_rows, self.df), exact, rtol=1e-12
+                )
+
+    def test_same_rows(self):
+        """
+        The summary, correlations, breakdowns and model rows should all use the rows under one cap
+        """
+        cap = gva_cap(df=self.df)
+        expected = analysis_rows(self.df, cap)
+        streaming_summary(cap, by=["year"], chunk_rows=400, df=self.df)
+
+        summary = pd.read_csv(self.dir / "analysis_statistics_summary.csv", index_col=0)
+        self.assertEqual(summary.loc["count"].tolist(), [len(expected)] * 5)
+        np.testing.assert_allclose(
+            summary.loc["mean"], expected[STAT_COLUMNS].mean(), rtol=1e-9
+        )
+        correlation = pd.read_csv(
+            self.dir / "analysis_statistics_correlation.csv", index_col=0
+        )
+        np.testing.assert_allclose(
+            correlation, expected[STAT_COLUMNS].corr(), rtol=1e-9
+        )
+        by_year = pd.read_csv(
+            self.dir / "analysis_statistics_by_year.csv", index_col=[0, 1]
+        )
+        self.assertEqual(
+            by_year.xs("count", level="statistic")["birth_rate"].sum(), len(expected)
+        )
+
+        pd.testing.assert_frame_equal(
+            model_rows(cap, chunk_rows=400, df=self.df),
+            expected[MODEL_COLUMNS].reset_index(drop=True),
+        )
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,41 @@
+# -- Imports --
+import importlib.util
+import unittest as ut
+import pandas as pd
+from storage import apply_schema, dataset_path, read_dataset
+from merge_datasets import merge_measures
+
+
+class TestBackends(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Load the final dataset written by the default backend.
+
+        Runs once before all tests
+        """
+        path = dataset_path("final_dataset")
+        assert path.exists(), f"Final dataset not found at {path}"
+        cls.final = read_dataset("final_dataset")
+
+    def check_backend(self, backend):
+        """
+        The merge should give the same rows and values on every backend
+        """
+        if backend != "pandas" and importlib.util.find_spec(backend) is None:
+            self.skipTest(f"{backend} is not installed")
+        merged = merge_measures(backend=backend)
+        pd.testing.assert_frame_equal(
+            apply_schema(merged, "final_dataset"),
+            self.final,
+            check_categorical=False,
+        )
+
+    def test_pandas(self):
+        self.check_backend("pandas")
+
+    def test_polars(self):
+        self.check_backend("polars")
+
+    def test_duckdb(self):
+        self.check_backend("duckdb")
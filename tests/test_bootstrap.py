@@ -0,0 +1,69 @@
+# -- Imports --
+import unittest as ut
+import numpy as np
+from bootstrap import bootstrap, resample_weights, weighted_correlations, weighted_ols
+
+
+class TestBootstrap(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        A small random panel of 40 LAs over 5 years, with three variables.
+
+        Runs once before all tests
+        """
+        rng = np.random.default_rng(1)
+        cls.values = rng.normal(size=(200, 3)) * [1, 10, 1000] + [0, 50, 30000]
+        cls.X = np.column_stack([np.ones(200), cls.values[:, :2]])
+        cls.y = cls.values[:, 2]
+        cls.groups = np.repeat(np.arange(40), 5)
+
+    def test_unit_weights(self):
+        """
+        With every weight 1, the batched statistics should match numpy on the full sample
+        """
+        weights = np.ones((2, len(self.y)))
+        np.testing.assert_allclose(
+            weighted_correlations(weights, self.values)[0],
+            np.corrcoef(self.values, rowvar=False),
+        )
+        np.testing.assert_allclose(
+            weighted_ols(weights, self.X, self.y)[1],
+            np.linalg.lstsq(self.X, self.y, rcond=None)[0],
+        )
+
+    def test_weights_match_resampled_rows(self):
+        """
+        A weighted fit should equal the fit on the rows repeated by their weights
+        """
+        weights = resample_weights(1, self.groups, np.random.default_rng(2))
+        rows = np.repeat(np.arange(len(self.y)), weights[0].astype(int))
+        np.testing.assert_allclose(
+            weighted_ols(weights, self.X, self.y)[0],
+            np.linalg.lstsq(self.X[rows], self.y[rows], rcond=None)[0],
+        )
+
+    def test_blocks(self):
+        """
+        Every year of an LA should get the same weight, and the weights should sum to the row count
+        """
+        weights = resample_weights(50, self.groups, np.random.default_rng(3))
+        by_la = weights.reshape(50, 40, 5)
+        self.assertTrue((by_la == by_la[:, :, :1]).all())
+        self.assertTrue((weights.sum(axis=1) == len(self.y)).all())
+
+    def test_workers(self):
+        """
+        The same seed should give the same resamples whatever the number of workers
+        """
+        args = (self.values, self.X, self.y, self.groups)
+        serial = bootstrap(*args, n_resamples=300, batch_size=100, workers=1)
+        parallel = bootstrap(*args, n_resamples=300, batch_size=100, workers=2)
+        for a, b in zip(serial, parallel):
+            np.testing.assert_array_equal(a, b)
+        self.assertEqual(serial[0].shape, (300, 3, 3))
+        self.assertEqual(serial[1].shape, (300, 3))
+
+
+if __name__ == "__main__":
+    ut.main()
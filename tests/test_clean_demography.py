@@ -1,7 +1,6 @@
 # -- Imports --
 import unittest as ut
-import pandas as pd
-from src.config import PROCESSED_DIR
+from storage import dataset_path, read_dataset
 
 
 # -- Test Suite --
@@ -15,9 +14,9 @@ class TestCleanGVA(ut.TestCase):
 
         Runs once before all tests
         """
-        path = PROCESSED_DIR / "gva.csv"
+        path = dataset_path("gva")
         assert path.exists(), f"Processed GVA files not found at {path}"
-        cls.df = pd.read_csv(path)
+        cls.df = read_dataset("gva")
 
     def test_unique_region_year(self):
         """
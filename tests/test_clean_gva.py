@@ -1,7 +1,36 @@
 # -- Imports --
+import tempfile
 import unittest as ut
+from pathlib import Path
+from unittest import mock
 import pandas as pd
-from src.config import PROCESSED_DIR
+import clean_gva
+import clean_gva_industry
+import raw_cache
+import synthetic
+from clean_gva_industry import build_totals, industry_total_rows
+from cleaning_helpers import normalise_geo
+from storage import dataset_path, read_dataset
+
+
+def total_rows(sheet: pd.DataFrame, years: list = None) -> pd.DataFrame:
+    """
+    The 'Total' SIC07 rows of a Table 2 sheet read with read_excel, melted to long format.
+    """
+    sheet = sheet[sheet["SIC07"] == "Total"]
+    year_cols = [c for c in sheet.columns if str(c).isdigit() and len(str(c)) == 4]
+    if years is not None:
+        year_cols = [c for c in year_cols if int(c) in years]
+    long = pd.melt(
+        sheet.rename(columns={"LA code": "geo_code", "LA name": "geo_name"}),
+        id_vars=["geo_code", "geo_name"],
+        value_vars=year_cols,
+        var_name="year",
+        value_name="gva_million",
+    )
+    long["year"] = long["year"].astype(int)
+    long["gva_million"] = pd.to_numeric(long["gva_million"], errors="coerce")
+    return normalise_geo(long)
 
 
 class TestCleanDemography(ut.TestCase):
@@ -14,9 +43,9 @@ class TestCleanDemography(ut.TestCase):
 
         Runs once before all tests
         """
-        path = PROCESSED_DIR / "business_demography_counts.csv"
+        path = dataset_path("business_demography_counts")
         assert path.exists(), f"Processed demography files not found at {path}"
-        cls.df = pd.read_csv(path)
+        cls.df = read_dataset("business_demography_counts")
 
     def test_unique_region_year(self):
         """
@@ -48,5 +77,111 @@ class TestCleanDemography(ut.TestCase):
         )
 
 
+class TestBuildTotals(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Write a small synthetic set of GVA workbooks, plus one that is not a workbook at all.
+
+        Runs once before all tests
+        """
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.dir = Path(cls.tmp.name)
+        synthetic.generate(
+            cls.dir, n_areas=40, years=range(2020, 2024), n_industries=5, seed=1
+        )
+        cls.raw_dir = cls.dir / "raw"
+        cls.corrupt = cls.raw_dir / f"{synthetic.GVA_FILE_PREFIX}zcorrupt.xlsx"
+        cls.corrupt.write_bytes(b"not a workbook")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(clean_gva, "GVA_DIR", self.raw_dir),
+            mock.patch.object(raw_cache, "CACHE_DIR", self.dir / "cache"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_parallel_matches_serial(self):
+        """
+        Parsing in a process pool should give the same rows, in the same order, as parsing serially
+        """
+        with mock.patch("builtins.print"):
+            serial = build_totals(workers=1)
+            parallel = build_totals(workers=3)
+        pd.testing.assert_frame_equal(serial, parallel)
+        self.assertEqual(serial["geo_code"].nunique(), 40)
+
+    def test_cached(self):
+        """
+        A warm rebuild should come from the raw cache without opening any workbook that parsed, per
+        set of years
+        """
+        chunks = mock.Mock(wraps=clean_gva_industry.iter_industry_chunks)
+        with mock.patch.object(clean_gva_industry, "iter_industry_chunks", chunks):
+            with mock.patch("builtins.print"):
+                cold = build_totals(workers=1)
+                chunks.reset_mock()
+                warm = build_totals(workers=1)
+                opened = [c.args[0] for c in chunks.call_args_list]
+                self.assertEqual(opened, [self.corrupt])
+                pd.testing.assert_frame_equal(cold, warm)
+
+                build_totals(workers=1, years=[2021])
+                chunks.assert_called()
+
+    def test_corrupt_file_skipped(self):
+        """
+        A workbook that cannot be read should be reported and the others still returned
+        """
+        for workers in [1, 3]:
+            with self.subTest(workers=workers):
+                with mock.patch("builtins.print") as printed:
+                    gva = build_totals(workers=workers)
+                messages = [str(c.args[0]) for c in printed.call_args_list if c.args]
+                failed = [m for m in messages if m.startswith("Failed to process")]
+                self.assertEqual(len(failed), 1)
+                self.assertIn(self.corrupt.name, failed[0])
+                self.assertEqual(gva["geo_code"].nunique(), 40)
+
+    def test_no_files(self):
+        """
+        With no workbooks found, a clear error should be raised instead of an empty pool
+        """
+        with mock.patch.object(clean_gva, "GVA_DIR", self.dir / "missing"):
+            for workers in [1, 3]:
+                with self.assertRaises(FileNotFoundError):
+                    build_totals(workers=workers)
+
+    def test_all_files_fail(self):
+        """
+        If every workbook fails, the error should say so instead of concatenating nothing
+        """
+        with mock.patch.object(
+            clean_gva_industry, "gva_files", return_value=[self.corrupt]
+        ):
+            with mock.patch("builtins.print"):
+                with self.assertRaises(RuntimeError):
+                    build_totals(workers=1)
+
+    def test_streaming_matches_read_excel(self):
+        """
+        The streaming reader should give the same Total rows as read_excel followed by a melt
+        """
+        paths = sorted(self.raw_dir.glob(f"{synthetic.GVA_FILE_PREFIX}tl*.xlsx"))
+        for path in paths:
+            sheet = pd.read_excel(path, sheet_name="Table 2", header=1)
+            for years in [None, [2021, 2023]]:
+                with self.subTest(path=path.name, years=years):
+                    pd.testing.assert_frame_equal(
+                        industry_total_rows(path, years), total_rows(sheet, years)
+                    )
+
+
 if __name__ == "__main__":
     ut.main()
@@ -1,7 +1,6 @@
 # -- Imports --
 import unittest as ut
-import pandas as pd
-from src.config import PROCESSED_DIR
+from storage import dataset_path, read_dataset
 
 
 class TestCleanPopulation(ut.TestCase):
@@ -14,9 +13,9 @@ class TestCleanPopulation(ut.TestCase):
 
         Runs once before all tests
         """
-        path = PROCESSED_DIR / "population.csv"
+        path = dataset_path("population")
         assert path.exists(), f"Processed population files not found at {path}"
-        cls.df = pd.read_csv(path)
+        cls.df = read_dataset("population")
 
     def test_unique_region_year(self):
         """
@@ -0,0 +1,54 @@
+# -- Imports --
+import unittest as ut
+import numpy as np
+import pandas as pd
+from cleaning_helpers import fill_within_groups, group_starts
+
+
+class TestFillWithinGroups(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Three areas sorted by area and year, with gaps at the start, middle and end of groups.
+
+        Runs once before all tests
+        """
+        cls.groups = np.array([1, 1, 1, 1, 2, 2, 2, 3, 3])
+        cls.years = np.array([2019, 2020, 2021, 2023, 2019, 2020, 2021, 2019, 2020])
+        cls.values = np.array([10, np.nan, np.nan, 40, np.nan, 5, np.nan, 7, 8.0])
+        cls.starts = group_starts(cls.groups)
+
+    def test_group_starts(self):
+        """
+        Group starts should be the first row of each area
+        """
+        np.testing.assert_array_equal(self.starts, [0, 4, 7])
+
+    def test_ffill_matches_pandas(self):
+        """
+        Forward fill should match groupby().ffill(), never carrying across areas
+        """
+        expected = pd.Series(self.values).groupby(self.groups).ffill().to_numpy()
+        filled = fill_within_groups(self.values, self.starts, policy="ffill")
+        np.testing.assert_array_equal(filled, expected)
+
+    def test_interpolate_uses_years(self):
+        """
+        Interpolation should be linear in the year, leaving leading and trailing gaps missing
+        """
+        filled = fill_within_groups(
+            self.values, self.starts, policy="interpolate", x=self.years
+        )
+        expected = [10, 17.5, 25, 40, np.nan, 5, np.nan, 7, 8]
+        np.testing.assert_allclose(filled, expected)
+
+    def test_none_leaves_missing(self):
+        """
+        The none policy should return the values unchanged
+        """
+        filled = fill_within_groups(self.values, self.starts, policy="none")
+        np.testing.assert_array_equal(filled, self.values)
+
+
+if __name__ == "__main__":
+    ut.main()
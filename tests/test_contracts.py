@@ -0,0 +1,53 @@
+# -- Imports --
+import unittest as ut
+import pandas as pd
+from storage import read_dataset
+from contracts import CONTRACTS, validate
+
+
+class TestContracts(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Load the population dataset, and a broken copy with a duplicate key, a bad code and
+        a negative value.
+
+        Runs once before all tests
+        """
+        cls.population = read_dataset("population")
+        broken = cls.population.copy()
+        broken["geo_code"] = broken["geo_code"].cat.add_categories(["X99000001"])
+        broken.loc[5, "geo_code"] = "X99000001"
+        broken.loc[10, "population"] = -1
+        cls.broken = pd.concat([broken, broken.iloc[[0]]], ignore_index=True)
+
+    def test_processed_datasets_pass(self):
+        """
+        Every processed dataset with a contract should pass it
+        """
+        for name in CONTRACTS:
+            if name == "gva_industry":  # partitioned, checked while it is written
+                continue
+            with self.subTest(name=name):
+                result = validate(read_dataset(name), name)
+                self.assertTrue(result["passed"], result)
+
+    def test_chunks_match_single_pass(self):
+        """
+        Checking in chunks should give the same report as checking all rows at once
+        """
+        self.assertEqual(
+            validate(self.broken, "population"),
+            validate(self.broken, "population", chunk_rows=1000),
+        )
+
+    def test_failures_reported(self):
+        """
+        A duplicate across chunks, a bad prefix and an out of range value should all be caught
+        """
+        result = validate(self.broken, "population", chunk_rows=1000)
+        checks = result["checks"]
+        self.assertFalse(result["passed"])
+        self.assertEqual(checks["unique"]["duplicates"]["geo_id,year"], 1)
+        self.assertEqual(checks["geo_prefixes"]["violations"], {"X99000001": 1})
+        self.assertEqual(checks["ranges"]["violations"], {"population": 1})
@@ -1,7 +1,6 @@
 # -- Imports --
 import unittest
-import pandas as pd
-from src.config import PROCESSED_DIR
+from storage import SCHEMAS, dataset_path, read_dataset
 
 
 class TestFinalDataset(unittest.TestCase):
@@ -14,9 +13,9 @@ class TestFinalDataset(unittest.TestCase):
 
         Runs once before all tests
         """
-        path = PROCESSED_DIR / "final_dataset.csv"
+        path = dataset_path("final_dataset")
         assert path.exists(), f"Final dataset not found at {path}"
-        cls.df = pd.read_csv(path)
+        cls.df = read_dataset("final_dataset")
 
     def test_unique_region_year(self):
         """
@@ -70,3 +69,10 @@ class TestFinalDataset(unittest.TestCase):
             self.df["year"].between(2019, 2023).all(),
             f"Years should be between 2019 and 2023, got {self.df['year'].min()} and {self.df['year'].max()}",
         )
+
+    def test_schema_dtypes(self):
+        """
+        Final dataset should keep the dtypes from its schema when read back, e.g nullable integer counts
+        """
+        for col, dtype in SCHEMAS["final_dataset"].items():
+            self.assertEqual(str(self.df[col].dtype), dtype, f"Wrong dtype for {col}")
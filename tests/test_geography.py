@@ -0,0 +1,65 @@
+# -- Imports --
+import unittest as ut
+from storage import dataset_path, read_dataset
+from geography import region_lookup, regions_for
+
+
+class TestGeography(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Load the geography dimension and the final dataset that is keyed on it.
+
+        Runs once before all tests
+        """
+        path = dataset_path("geography")
+        assert path.exists(), f"Geography dimension not found at {path}"
+        cls.geo = read_dataset("geography")
+        cls.final = read_dataset("final_dataset")
+
+    def test_unique_keys(self):
+        """
+        Each geo_code should have exactly one geo_id, and each geo_id one geo_code
+        """
+        self.assertTrue(self.geo["geo_id"].is_unique, "Duplicate geo_id found")
+        self.assertTrue(self.geo["geo_code"].is_unique, "Duplicate geo_code found")
+
+    def test_final_dataset_ids_match(self):
+        """
+        Every geo_id in the final dataset should be in the dimension, with the same geo_code
+        """
+        merged = self.final[["geo_id", "geo_code"]].merge(
+            self.geo[["geo_id", "geo_code"]], on="geo_id", how="left"
+        )
+        self.assertTrue(
+            (
+                merged["geo_code_x"].astype(str) == merged["geo_code_y"].astype(str)
+            ).all(),
+            "geo_id does not match geo_code in the final dataset",
+        )
+
+
+class TestRegions(ut.TestCase):
+    def test_lookup_and_fallbacks(self):
+        """
+        LAs in the lookup get their region, other Scottish, NI and Welsh codes the prefix fallback
+        """
+        regions = regions_for(
+            ["E06000001", "S12000033", "N09000001", "W92000004", "X1"]
+        )
+        self.assertEqual(
+            regions["region_name"].tolist()[:4],
+            ["North East", "Scotland", "Northern Ireland", "Wales"],
+        )
+        self.assertEqual(regions["region_code"].iloc[0], "E12000001")
+        self.assertTrue(regions["region_name"].isna().iloc[4])
+
+    def test_loaded_once(self):
+        """
+        The lookup should be loaded once per process and then reused
+        """
+        self.assertIs(region_lookup(), region_lookup())
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,210 @@
+# -- Imports --
+import functools
+import tempfile
+import unittest as ut
+from pathlib import Path
+from unittest import mock
+import openpyxl
+import pandas as pd
+import clean_gva
+import clean_gva_industry
+import contracts
+import storage
+import synthetic
+from storage import partitioned_dir, read_dataset
+from clean_gva_industry import read_gva_industry, sic07_hierarchy
+
+
+class TestSic07Hierarchy(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Classify a cut-down list of SIC07 codes in Table 2 order.
+
+        Runs once before all tests
+        """
+        codes = ["Total", "A-E", "C (10-33)", "CA-CB (10-15)", "DE (35-39)"]
+        codes += ["F (41-43)", "41", "G-T", "L (68)", "68IMP"]
+        cls.sic07 = sic07_hierarchy({c: c for c in codes}).set_index("sic07")
+
+    def test_levels(self):
+        """
+        Each code should get the level of its pattern and position
+        """
+        self.assertEqual(self.sic07.loc["A-E", "level"], "sector")
+        self.assertEqual(self.sic07.loc["C (10-33)", "level"], "section")
+        self.assertEqual(self.sic07.loc["CA-CB (10-15)", "level"], "subsection")
+        self.assertEqual(self.sic07.loc["DE (35-39)", "level"], "section")
+        self.assertEqual(self.sic07.loc["68IMP", "level"], "division")
+
+    def test_parents(self):
+        """
+        Sections sit under the sector covering their letter, or Total for construction
+        """
+        self.assertEqual(self.sic07.loc["DE (35-39)", "parent"], "A-E")
+        self.assertEqual(self.sic07.loc["F (41-43)", "parent"], "Total")
+        self.assertEqual(self.sic07.loc["L (68)", "parent"], "G-T")
+        self.assertEqual(self.sic07.loc["41", "parent"], "F (41-43)")
+        self.assertEqual(self.sic07.loc["CA-CB (10-15)", "section"], "C")
+
+
+@ut.skipUnless(partitioned_dir("gva_industry").exists(), "industry-level GVA not built")
+class TestGvaIndustry(ut.TestCase):
+    def test_total_matches_gva(self):
+        """
+        The 'Total' rows of the industry dataset should be the GVA dataset
+        """
+        total = read_gva_industry(sic07=["Total"])
+        gva = read_dataset("gva")
+        self.assertEqual(len(total), len(gva))
+        self.assertAlmostEqual(
+            total["gva_million"].sum(), gva["gva_million"].sum(), places=0
+        )
+
+
+class TestBuildGvaIndustry(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Write a small synthetic set of GVA workbooks, and copy one with an unknown LA code in its
+        last row, so it fails after its first chunks have been written.
+
+        Runs once before all tests
+        """
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.dir = Path(cls.tmp.name)
+        synthetic.generate(
+            cls.dir, n_areas=60, years=range(2020, 2024), n_industries=10, seed=2
+        )
+        cls.raw_dir = cls.dir / "raw"
+        source = sorted(cls.raw_dir.glob("*.xlsx"))[-1]
+        workbook = openpyxl.load_workbook(source)
+        sheet = workbook["Table 2"]
+        sheet.cell(row=sheet.max_row, column=2, value="E06999999")
+        cls.broken = cls.raw_dir / f"{synthetic.GVA_FILE_PREFIX}zbroken.xlsx"
+        workbook.save(cls.broken)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def good_files(self) -> list:
+        return sorted(
+            f
+            for f in self.raw_dir.glob(f"{synthetic.GVA_FILE_PREFIX}*.xlsx")
+            if f != self.broken
+        )
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(clean_gva, "GVA_DIR", self.raw_dir),
+            mock.patch.object(storage, "PROCESSED_DIR", self.dir / "processed"),
+            mock.patch.object(contracts, "REPORT_DIR", self.dir / "contracts"),
+            mock.patch.object(
+                clean_gva_industry, "gva_files", return_value=self.good_files()
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_workbook_years(self):
+        """
+        Years should come from the header of every workbook, and each workbook should be closed
+        """
+        later = self.dir / "later"
+        synthetic.generate(later, n_areas=12, years=[2024], n_industries=3, seed=4)
+        pattern = f"{synthetic.GVA_FILE_PREFIX}*.xlsx"
+        files = sorted(self.raw_dir.glob(pattern))[:2]
+        files += sorted((later / "raw").glob(pattern))[:2]
+
+        opened = []
+        real_load = openpyxl.load_workbook
+
+        def load_workbook(*args, **kwargs):
+            opened.append(real_load(*args, **kwargs))
+            return opened[-1]
+
+        with mock.patch.object(
+            clean_gva_industry.openpyxl, "load_workbook", load_workbook
+        ):
+            years = clean_gva_industry.workbook_years(files)
+        self.assertEqual(years, {2020, 2021, 2022, 2023, 2024})
+        self.assertEqual(len(opened), 4)
+        self.assertTrue(all(wb._archive.fp is None for wb in opened))
+
+    def test_contract_failure_keeps_dataset(self):
+        """
+        A build breaking the data contract should raise and leave the previous dataset as it was
+        """
+        with mock.patch("builtins.print"):
+            clean_gva_industry.build_gva_industry(workers=1)
+        folder = partitioned_dir("gva_industry")
+        self.assertEqual(folder.parent, self.dir / "processed")
+        before = sorted(folder.rglob("*.parquet"))
+        self.assertGreater(len(before), 0)
+
+        strict = {"min_rows_per_year": 10**9}
+        with mock.patch.dict(contracts.CONTRACTS["gva_industry"], strict):
+            with mock.patch("builtins.print"):
+                with self.assertRaises(ValueError):
+                    clean_gva_industry.build_gva_industry(workers=1)
+                with self.assertRaises(ValueError):
+                    clean_gva_industry.build_gva_industry(workers=1, years=[2023])
+        self.assertEqual(sorted(folder.rglob("*.parquet")), before)
+        self.assertEqual(list(folder.parent.glob(".gva_industry*")), [])
+
+    def test_totals_match_partitions(self):
+        """
+        The 'Total' rows melted in memory should give the same GVA dataset, as written, as those
+        read back from the partitions
+        """
+        with mock.patch("builtins.print"):
+            clean_gva_industry.build_gva_industry(workers=1)
+            in_memory = clean_gva_industry.build_totals(workers=2)
+        geography = storage.read_dataset("geography")
+        datasets = [
+            storage.apply_schema(clean_gva.gva_dataset(totals, geography), "gva")
+            for totals in [in_memory, clean_gva.total_gva()]
+        ]
+        pd.testing.assert_frame_equal(*datasets)
+
+    def test_failed_workbook_keeps_dataset(self):
+        """
+        A workbook failing part way should be reported, and the build should raise and leave the
+        previous dataset as it was rather than publish it without that workbook
+        """
+        with mock.patch("builtins.print"):
+            clean_gva_industry.build_gva_industry(workers=1)
+        folder = partitioned_dir("gva_industry")
+        self.assertEqual(folder.parent, self.dir / "processed")
+        before = sorted(folder.rglob("*.parquet"))
+        self.assertGreater(len(before), 0)
+
+        chunks = functools.partial(
+            clean_gva_industry.iter_industry_chunks, chunk_rows=5
+        )
+        files = clean_gva.gva_files()
+        self.assertIn(self.broken, files)
+        with mock.patch.object(clean_gva_industry, "iter_industry_chunks", chunks):
+            with mock.patch.object(clean_gva_industry, "gva_files", return_value=files):
+                for years in [None, [2023]]:
+                    with mock.patch("builtins.print") as printed:
+                        with self.assertRaises(RuntimeError) as raised:
+                            clean_gva_industry.build_gva_industry(
+                                workers=1, years=years
+                            )
+                    self.assertIn(self.broken.name, str(raised.exception))
+                    messages = [
+                        str(c.args[0]) for c in printed.call_args_list if c.args
+                    ]
+                    failed = [m for m in messages if m.startswith("Failed to process")]
+                    self.assertEqual(len(failed), 1)
+                    self.assertIn(self.broken.name, failed[0])
+
+        self.assertEqual(sorted(folder.rglob("*.parquet")), before)
+        self.assertEqual(list(folder.parent.glob(".gva_industry*")), [])
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,103 @@
+# -- Imports --
+import shutil
+import tempfile
+import unittest as ut
+from pathlib import Path
+from unittest import mock
+import numpy as np
+import pandas as pd
+import contracts
+import storage
+from analysis_prepare import build_analysis_dataset
+from metrics import compute_metrics, resolve
+from storage import dataset_path
+
+
+class TestMetrics(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        A small panel with a missing count and a zero denominator.
+
+        Runs once before all tests
+        """
+        cls.df = pd.DataFrame(
+            {
+                "births": pd.array([10, 20, None, 5], dtype="Int32"),
+                "deaths": pd.array([5, 30, 4, 1], dtype="Int32"),
+                "active": pd.array([100, 200, 50, 0], dtype="Int32"),
+                "population": pd.array([1000, 2000, 500, 10], dtype="Int32"),
+                "gva_million": np.array([1.5, 2.0, np.nan, 0.1], dtype="float32"),
+            }
+        )
+
+    def test_dependencies_first(self):
+        """
+        net_rate needs net_change, which should be computed first
+        """
+        self.assertEqual(resolve(["net_rate"]), ["net_change", "net_rate"])
+
+    def test_only_requested(self):
+        """
+        Only the requested metrics should be added, not the metrics they use
+        """
+        out = compute_metrics(self.df, ["net_rate"])
+        self.assertEqual(list(out.columns), list(self.df.columns) + ["net_rate"])
+
+    def test_matches_pandas(self):
+        """
+        Metrics should match the same arithmetic done with pandas
+        """
+        out = compute_metrics(self.df)
+        df = self.df.astype("float64")
+        np.testing.assert_allclose(
+            out["birth_rate"][:3], (df["births"] / df["active"] * 100)[:3]
+        )
+        np.testing.assert_allclose(
+            out["gva_per_capita"], df["gva_million"] * 1_000_000 / df["population"]
+        )
+        np.testing.assert_allclose(out["net_change"], df["births"] - df["deaths"])
+
+    def test_divide_by_zero_is_missing(self):
+        """
+        A zero denominator should give NaN, never inf
+        """
+        out = compute_metrics(self.df)
+        self.assertTrue(np.isnan(out.loc[3, "birth_rate"]))
+        self.assertTrue(np.isnan(out.loc[3, "gva_per_business"]))
+        metrics = out[["birth_rate", "death_rate", "net_rate", "gva_per_business"]]
+        self.assertFalse(np.isinf(metrics.to_numpy()).any())
+
+
+@ut.skipUnless(dataset_path("final_dataset").exists(), "final dataset not built")
+class TestBuildAnalysisDataset(ut.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        for name in ["final_dataset", "geography"]:
+            shutil.copy(dataset_path(name), self.dir)
+        patches = [
+            mock.patch.object(storage, "PROCESSED_DIR", self.dir),
+            mock.patch.object(contracts, "REPORT_DIR", self.dir / "contracts"),
+            mock.patch("builtins.print"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_subset_of_metrics(self):
+        """
+        Asking for some metrics should write only those, pass the contract, and match a full build
+        """
+        full = build_analysis_dataset()
+        subset = build_analysis_dataset(metrics=["birth_rate", "net_rate"])
+        written = storage.read_dataset("analysis_dataset")
+        for metric in ["death_rate", "net_change", "gva_per_capita"]:
+            self.assertNotIn(metric, written.columns)
+        pd.testing.assert_frame_equal(
+            written.reset_index(drop=True),
+            full[subset.columns].reset_index(drop=True),
+        )
@@ -0,0 +1,77 @@
+# -- Imports --
+import unittest as ut
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+from panel import demean, fit_panel
+
+
+class TestPanel(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        An unbalanced random panel of 30 LAs over 6 years, with LA and year effects.
+
+        Runs once before all tests
+        """
+        rng = np.random.default_rng(4)
+        df = pd.DataFrame(
+            {
+                "geo_id": np.repeat(np.arange(30), 6),
+                "year": np.tile(range(2018, 2024), 30),
+            }
+        )
+        df = df.sample(frac=0.8, random_state=5).reset_index(drop=True)
+        df["x1"] = rng.normal(size=len(df)) + df["geo_id"] * 0.1
+        df["x2"] = rng.normal(size=len(df)) + (df["year"] - 2018) * 0.5
+        df["y"] = (
+            2 * df["x1"]
+            - df["x2"]
+            + df["geo_id"] * 0.3
+            + (df["year"] - 2018)
+            + rng.normal(size=len(df))
+        )
+        cls.df = df
+
+    def dummies(self, effects: list) -> pd.DataFrame:
+        """
+        Regressors with one dummy column per fixed-effect group
+        """
+        parts = [self.df[["x1", "x2"]]]
+        parts += [
+            pd.get_dummies(self.df[col], prefix=col, drop_first=i > 0, dtype=float)
+            for i, col in enumerate(effects)
+        ]
+        return pd.concat(parts, axis=1)
+
+    def test_matches_dummies(self):
+        """
+        Absorbed fixed effects should give the same coefficients as dummy columns
+        """
+        for effects in [["geo_id"], ["year"], ["geo_id", "year"]]:
+            with self.subTest(effects=effects):
+                result = fit_panel(self.df, "y", ["x1", "x2"], effects)
+                model = sm.OLS(self.df["y"], self.dummies(effects)).fit()
+                np.testing.assert_allclose(
+                    result["params"]["coef"], model.params[["x1", "x2"]], rtol=1e-8
+                )
+                np.testing.assert_allclose(
+                    result["params"]["std_err"], model.bse[["x1", "x2"]], rtol=1e-8
+                )
+
+    def test_clustered(self):
+        """
+        With LA effects in LA clusters, errors should match statsmodels on the demeaned data
+        """
+        result = fit_panel(self.df, "y", ["x1", "x2"], ["geo_id"], cluster="geo_id")
+        within = demean(
+            self.df[["y", "x1", "x2"]].to_numpy(), [self.df["geo_id"].to_numpy()]
+        )
+        model = sm.OLS(within[:, 0], within[:, 1:]).fit(
+            cov_type="cluster", cov_kwds={"groups": self.df["geo_id"]}
+        )
+        np.testing.assert_allclose(result["params"]["std_err"], model.bse, rtol=1e-8)
+
+
+if __name__ == "__main__":
+    ut.main()
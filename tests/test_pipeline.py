@@ -0,0 +1,108 @@
+# -- Imports --
+import unittest as ut
+from pathlib import Path
+from unittest import mock
+import pandas as pd
+import pipeline
+from analysis_table import LEAGUE_TABLE_FILE
+from raw_cache import file_hash
+from storage import dataset_path, read_dataset
+
+DATASETS = [
+    "geography",
+    "business_demography_counts",
+    "population",
+    "gva",
+    "final_dataset",
+    "analysis_dataset",
+]
+
+
+class TestRunPipeline(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Run every stage in memory, with writing switched off.
+
+        Runs once before all tests
+        """
+        for name in DATASETS:
+            path = dataset_path(name)
+            assert path.exists(), f"{name} not found at {path}"
+        with mock.patch.object(pipeline, "write_dataset") as write:
+            cls.out = pipeline.run_pipeline()
+        cls.writes = write.call_count
+
+    def test_nothing_written(self):
+        """
+        Without persist, no dataset should be written
+        """
+        self.assertEqual(self.writes, 0)
+
+    def test_same_datasets(self):
+        """
+        Every dataset built in memory should equal the one written by the stage scripts
+        """
+        for name in DATASETS:
+            with self.subTest(name=name):
+                pd.testing.assert_frame_equal(self.out[name], read_dataset(name))
+
+    def test_same_league_table(self):
+        """
+        The league table built in memory should match the saved one
+        """
+        saved = pd.read_csv(LEAGUE_TABLE_FILE, index_col=0)
+        table = self.out["league_table"]
+        self.assertEqual(list(table.index), list(saved.index))
+        pd.testing.assert_frame_equal(
+            table.reset_index(drop=True),
+            saved.reset_index(drop=True),
+            check_dtype=False,
+        )
+
+
+class TestStageCode(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Stage declarations by name.
+
+        Runs once before all tests
+        """
+        cls.stages = {spec["name"]: spec for spec in pipeline.STAGES}
+
+    def test_imports_found(self):
+        """
+        Modules imported directly, through other modules, or inside functions should all be found
+        """
+        self.assertIn("metrics.py", pipeline.local_imports("merge_datasets"))
+        self.assertIn("metrics.py", pipeline.local_imports("analysis_prepare"))
+        self.assertIn("panel.py", pipeline.local_imports("analysis_stats"))
+        self.assertIn("clean_gva_industry.py", pipeline.local_imports("clean_gva"))
+        for name in self.stages:
+            with self.subTest(name=name):
+                code = pipeline.local_imports(name)
+                self.assertIn("config.py", code)
+                self.assertNotIn(f"{name}.py", code)
+
+    def test_imported_change(self):
+        """
+        Changing a module should change the fingerprint of every stage importing it, and only those
+        """
+
+        def changed_metrics(path):
+            return "changed" if Path(path).name == "metrics.py" else file_hash(path)
+
+        before = {
+            name: pipeline.fingerprint(spec) for name, spec in self.stages.items()
+        }
+        with mock.patch.object(pipeline, "file_hash", side_effect=changed_metrics):
+            after = {
+                name: pipeline.fingerprint(spec) for name, spec in self.stages.items()
+            }
+        changed = {name for name in self.stages if before[name] != after[name]}
+        self.assertEqual(changed, {"merge_datasets", "analysis_prepare"})
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,118 @@
+# -- Imports --
+import unittest as ut
+from unittest import mock
+import numpy as np
+import pandas as pd
+import analysis_plots
+from analysis_plots import (
+    FIGURES,
+    bin_points,
+    figure_fingerprint,
+    fit_line,
+    plot_sources,
+)
+
+
+class TestRendering(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Input columns of the birth and death rate line plot.
+
+        Runs once before all tests
+        """
+        cls.name = "avg_birth_death_rates_over_time.png"
+        cls.df = pd.DataFrame(
+            {
+                "year": [2019, 2020, 2021],
+                "birth_rate": [10.0, 11.0, 12.0],
+                "death_rate": [9.0, 9.5, 10.0],
+            }
+        )[FIGURES[cls.name]["columns"]]
+
+    def test_same_inputs(self):
+        """
+        The same data and resolution should give the same fingerprint, so the render is skipped
+        """
+        self.assertEqual(
+            figure_fingerprint(self.name, self.df, 100),
+            figure_fingerprint(self.name, self.df.copy(), 100),
+        )
+
+    def test_changed_inputs(self):
+        """
+        Changed data or resolution should give a new fingerprint, so the figure is rendered again
+        """
+        changed = self.df.copy()
+        changed.loc[1, "birth_rate"] = 11.5
+        before = figure_fingerprint(self.name, self.df, 100)
+        self.assertNotEqual(before, figure_fingerprint(self.name, changed, 100))
+        self.assertNotEqual(before, figure_fingerprint(self.name, self.df, 60))
+
+    def test_changed_helper(self):
+        """
+        A change to a helper a plot calls should give a new fingerprint, not only a change to the
+        plot function itself
+        """
+        name = "fig3_productivity_over_growth.png"
+        sources = plot_sources(FIGURES[name]["plot"])
+        for helper in ["use_density", "bin_points", "fit_line"]:
+            with self.subTest(helper=helper):
+                self.assertTrue(any(f"def {helper}(" in s for s in sources))
+
+        df = pd.DataFrame(columns=FIGURES[name]["columns"])
+        before = figure_fingerprint(name, df, 100)
+
+        def bin_points(x, y, bins=10, codes=None, n_categories=0):
+            return None
+
+        bin_points.__module__ = analysis_plots.__name__
+        with mock.patch.object(analysis_plots, "bin_points", bin_points):
+            self.assertNotEqual(before, figure_fingerprint(name, df, 100))
+        self.assertEqual(before, figure_fingerprint(name, df, 100))
+
+
+class TestDensity(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Random points in three categories.
+
+        Runs once before all tests
+        """
+        rng = np.random.default_rng(7)
+        cls.x = rng.normal(size=10_000)
+        cls.y = 0.5 * cls.x + rng.normal(size=10_000)
+        cls.codes = rng.integers(0, 3, 10_000)
+
+    def test_counts(self):
+        """
+        Every point should land in exactly one cell, as in np.histogram2d
+        """
+        counts, _, extent = bin_points(self.x, self.y, bins=20)
+        expected, _, _ = np.histogram2d(
+            self.x, self.y, bins=20, range=[extent[:2], extent[2:]]
+        )
+        np.testing.assert_array_equal(counts, expected)
+
+    def test_dominant(self):
+        """
+        Each cell should take the most common category of its points
+        """
+        counts, dominant, _ = bin_points(self.x, self.y, 10, self.codes, 3)
+        _, only_zero, _ = bin_points(self.x, self.y, 10, np.zeros(10_000, int), 3)
+        self.assertEqual(dominant.shape, counts.shape)
+        self.assertTrue((only_zero == 0).all())
+
+    def test_fit_line(self):
+        """
+        The line from running sums should match np.polyfit
+        """
+        df = pd.DataFrame({"x": self.x, "y": self.y})
+        np.testing.assert_allclose(
+            fit_line(df, "x", "y"), np.polyfit(self.x, self.y, 1)
+        )
+
+
+if __name__ == "__main__":
+    ut.main()
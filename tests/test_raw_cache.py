@@ -0,0 +1,99 @@
+# -- Imports --
+import os
+import tempfile
+import unittest as ut
+from pathlib import Path
+from unittest import mock
+import pandas as pd
+import raw_cache
+
+
+class TestRawCache(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        A small frame to store, standing in for a parsed sheet.
+
+        Runs once before all tests
+        """
+        cls.df = pd.DataFrame(
+            {"geo_code": ["E06000001", "E06000002"], "births": [1, 2]}
+        )
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.raw = self.dir / "raw.xlsx"
+        self.raw.write_bytes(b"first version")
+        patches = [
+            mock.patch.object(raw_cache, "CACHE_DIR", self.dir / "cache"),
+            mock.patch.dict(raw_cache._CACHE_BYTES, clear=True),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.loader = mock.Mock(return_value=self.df)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hit(self):
+        """
+        The second read of the same file and parts should come from the cache
+        """
+        first = raw_cache.cached(self.raw, ("sheet", 1), self.loader)
+        second = raw_cache.cached(self.raw, ("sheet", 1), self.loader)
+        self.assertEqual(self.loader.call_count, 1)
+        pd.testing.assert_frame_equal(first, second)
+
+        raw_cache.cached(self.raw, ("sheet", 2), self.loader)
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_changed_file(self):
+        """
+        Changing the file's contents should change its key, so it is parsed again
+        """
+        raw_cache.cached(self.raw, ("sheet",), self.loader)
+        old_entry = raw_cache.cache_path(self.raw, "sheet")
+        self.raw.write_bytes(b"second version")
+        self.assertNotEqual(raw_cache.cache_path(self.raw, "sheet"), old_entry)
+
+        raw_cache.cached(self.raw, ("sheet",), self.loader)
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_lru_eviction(self):
+        """
+        Over the size limit, the least recently used entries should be deleted first
+        """
+        for n in range(3):
+            raw_cache.cached(self.raw, (n,), self.loader)
+        entries = [raw_cache.cache_path(self.raw, n) for n in range(3)]
+        for age, entry in enumerate(entries):
+            os.utime(entry, (1_000_000 + age, 1_000_000 + age))
+
+        # Reading entry 0 makes it the most recently used
+        raw_cache.cached(self.raw, (0,), self.loader)
+        size = entries[0].stat().st_size
+        self.assertEqual(raw_cache.evict(max_bytes=2 * size), 1)
+        self.assertEqual([e.exists() for e in entries], [True, False, True])
+
+    def test_evict_only_over_limit(self):
+        """
+        Writes under the size limit should not list the cache, and the first write over it should evict
+        """
+        with mock.patch.object(raw_cache, "evict", wraps=raw_cache.evict) as evict:
+            raw_cache.cached(self.raw, (0,), self.loader)
+            size = raw_cache.cache_path(self.raw, 0).stat().st_size
+            with mock.patch.object(raw_cache, "CACHE_MAX_BYTES", int(2.5 * size)):
+                with mock.patch.object(raw_cache, "cache_entries") as entries:
+                    raw_cache.cached(self.raw, (1,), self.loader)
+                entries.assert_not_called()
+                evict.assert_not_called()
+
+                raw_cache.cached(self.raw, (2,), self.loader)
+                evict.assert_called_once()
+        self.assertEqual(len(raw_cache.cache_entries()), 2)
+
+
+if __name__ == "__main__":
+    ut.main()
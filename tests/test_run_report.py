@@ -0,0 +1,120 @@
+# -- Imports --
+import json
+import os
+import tempfile
+import unittest as ut
+from pathlib import Path
+from unittest import mock
+import numpy as np
+import pandas as pd
+import run_report
+from run_report import stage, step, traced
+
+
+@traced(detail=("factor",))
+def scale(df: pd.DataFrame, factor: int) -> pd.DataFrame:
+    return df * factor
+
+
+@traced
+def allocate(n: int) -> np.ndarray:
+    return np.ones(n)
+
+
+def run_stage(df: pd.DataFrame, fail: bool = False) -> pd.DataFrame:
+    with step("double", kind="test") as s:
+        s.input(df)
+        out = scale(df, 2)
+        s.output(out)
+    allocate(1_000_000)
+    if fail:
+        raise ValueError("bad input")
+    return out
+
+
+class TestRunReport(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        A small frame to push through a test stage.
+
+        Runs once before all tests
+        """
+        cls.df = pd.DataFrame({"a": np.arange(100), "b": np.arange(100.0)})
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        patches = [
+            mock.patch.object(run_report, "RUN_REPORT", True),
+            mock.patch.object(run_report, "RUN_REPORT_DIR", self.dir),
+            mock.patch.dict(os.environ, {"RUN_ID": "test"}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def report(self) -> dict:
+        return json.loads((self.dir / "test" / "test_stage.json").read_text())
+
+    def test_off(self):
+        """
+        Outside a reported stage, steps should record nothing and return the same results
+        """
+        with mock.patch.object(run_report, "RUN_REPORT", False):
+            out = stage("test_stage")(run_stage)(self.df)
+        self.assertIs(step("anything"), run_report._OFF)
+        pd.testing.assert_frame_equal(out, self.df * 2)
+        self.assertFalse((self.dir / "test").exists())
+
+    def test_stage_report(self):
+        """
+        A reported stage should write every step in start order, with paths and rows in and out
+        """
+        out = stage("test_stage")(run_stage)(self.df)
+        pd.testing.assert_frame_equal(out, self.df * 2)
+
+        report = self.report()
+        self.assertEqual(report["stage"], "test_stage")
+        paths = [s["path"] for s in report["steps"]]
+        self.assertEqual(paths, ["double", "double/scale", "allocate"])
+        double, scaled, allocated = report["steps"]
+        self.assertEqual(double["kind"], "test")
+        self.assertEqual(scaled["factor"], 2)
+        self.assertEqual((double["rows_in"], double["rows_out"]), (100, 100))
+        self.assertEqual(scaled["bytes_out"], 1600)
+        self.assertEqual(allocated["rows_out"], 1_000_000)
+        self.assertGreaterEqual(report["wall_s"], double["wall_s"])
+        self.assertNotIn("profile", report)
+        self.assertEqual(run_report._ACTIVE, [])
+
+    def test_memory_and_profile(self):
+        """
+        With TRACE_MEMORY, a step's peak should include its nested steps, and the stage's peak all of them
+        """
+        with mock.patch.object(run_report, "TRACE_MEMORY", True):
+            with mock.patch.object(run_report, "RUN_PROFILE", True):
+                stage("test_stage")(run_stage)(self.df)
+
+        report = self.report()
+        allocated = report["steps"][2]
+        self.assertGreaterEqual(allocated["traced_peak_mb"], 8.0)
+        self.assertGreaterEqual(report["traced_peak_mb"], allocated["traced_peak_mb"])
+        self.assertTrue((self.dir / "test" / report["profile"]).exists())
+
+    def test_failed_stage(self):
+        """
+        A stage that raises should still write its report, with the error
+        """
+        with self.assertRaises(ValueError):
+            stage("test_stage")(run_stage)(self.df, fail=True)
+        report = self.report()
+        self.assertEqual(report["error"], "ValueError: bad input")
+        self.assertEqual(len(report["steps"]), 3)
+
+
+if __name__ == "__main__":
+    ut.main()
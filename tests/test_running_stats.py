@@ -0,0 +1,77 @@
+# -- Imports --
+import unittest as ut
+import numpy as np
+import pandas as pd
+from running_stats import corr, describe, merge_states, new_state, update, update_groups
+
+
+class TestRunningStats(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Correlated random columns with a large offset and scattered missing values.
+
+        Runs once before all tests
+        """
+        rng = np.random.default_rng(6)
+        values = rng.normal(size=(5000, 3)) @ [[1, 0.5, 0], [0, 1, 0.3], [0, 0, 1]]
+        df = pd.DataFrame(
+            values * [1, 10, 1000] + [0, 50, 1e6], columns=["a", "b", "c"]
+        )
+        df = df.mask(rng.random(df.shape) < 0.05)
+        df["year"] = rng.integers(2019, 2024, len(df))
+        cls.df = df
+        cls.columns = ["a", "b", "c"]
+
+    def stream(self, df: pd.DataFrame, chunk_rows: int) -> dict:
+        state = new_state(self.columns)
+        for start in range(0, len(df), chunk_rows):
+            state = update(state, df.iloc[start : start + chunk_rows])
+        return state
+
+    def assert_matches(self, state: dict, df: pd.DataFrame):
+        expected = df[self.columns].describe()
+        actual = describe(state)
+        exact = ["count", "mean", "std", "min", "max"]
+        np.testing.assert_allclose(actual.loc[exact], expected.loc[exact], rtol=1e-9)
+        # Quartiles come from the sketch, so allow a small share of a standard deviation
+        np.testing.assert_allclose(
+            actual.loc[["25%", "50%", "75%"]],
+            expected.loc[["25%", "50%", "75%"]],
+            atol=0.01 * expected.loc["std"].max(),
+        )
+        np.testing.assert_allclose(corr(state), df[self.columns].corr(), rtol=1e-9)
+
+    def test_chunks(self):
+        """
+        Streaming in chunks of any size should match pandas on the whole DataFrame
+        """
+        for chunk_rows in [1, 97, 5000]:
+            with self.subTest(chunk_rows=chunk_rows):
+                df = self.df.iloc[:500] if chunk_rows == 1 else self.df
+                self.assert_matches(self.stream(df, chunk_rows), df)
+
+    def test_workers(self):
+        """
+        States built separately and merged should match pandas on the whole DataFrame
+        """
+        parts = [self.df.iloc[start : start + 1250] for start in range(0, 5000, 1250)]
+        states = [self.stream(part, 300) for part in parts]
+        self.assert_matches(merge_states(states), self.df)
+
+    def test_groups(self):
+        """
+        Per-year states built in one pass should match pandas on each year
+        """
+        states = {}
+        for start in range(0, len(self.df), 700):
+            update_groups(
+                states, self.df.iloc[start : start + 700], "year", self.columns
+            )
+        self.assertEqual(sorted(states), list(range(2019, 2024)))
+        for year, rows in self.df.groupby("year"):
+            self.assert_matches(states[year], rows)
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,66 @@
+# -- Imports --
+import shutil
+import tempfile
+import unittest as ut
+from pathlib import Path
+from unittest import mock
+import pandas as pd
+import clean_demography
+import clean_population
+import contracts
+import pipeline
+import storage
+from storage import dataset_path, read_dataset, write_dataset
+
+# Cleaner stage of each dataset that can be appended to
+CLEANERS = {
+    "population": clean_population,
+    "business_demography_counts": clean_demography,
+}
+
+
+@ut.skipUnless(dataset_path("geography").exists(), "geography dimension not built")
+class TestAppend(ut.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        shutil.copy(dataset_path("geography"), self.dir)
+        patches = [
+            mock.patch.object(storage, "PROCESSED_DIR", self.dir),
+            mock.patch.object(pipeline, "PROCESSED_DIR", self.dir),
+            mock.patch.object(contracts, "REPORT_DIR", self.dir / "contracts"),
+            mock.patch("builtins.print"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_append_matches_rebuild(self):
+        """
+        Dropping the latest year and appending it back should give the same rows as a full rebuild,
+        and change the fingerprint of a stage reading the dataset
+        """
+        for name, cleaner in CLEANERS.items():
+            with self.subTest(name=name):
+                cleaner.main()
+                full = read_dataset(name)
+                latest = full["year"].max()
+                write_dataset(full[full["year"] < latest], name)
+                spec = {"name": "merge_datasets", "inputs": [dataset_path(name)]}
+                before = pipeline.fingerprint(spec)
+
+                cleaner.main(append=True)
+                self.assertNotEqual(pipeline.fingerprint(spec), before)
+                self.assertEqual(len(list(storage.parts_dir(name).iterdir())), 1)
+                appended = read_dataset(name)
+                pd.testing.assert_frame_equal(
+                    appended.sort_values(["geo_id", "year"], ignore_index=True),
+                    full.sort_values(["geo_id", "year"], ignore_index=True),
+                )
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,118 @@
+# -- Imports --
+import tempfile
+import unittest as ut
+from pathlib import Path
+from unittest import mock
+import numpy as np
+import pandas as pd
+import synthetic
+from clean_demography import CLEANERS, DEMOGRAPHY_SHEETS
+from clean_gva_industry import industry_total_rows
+from cleaning_helpers import normalise_geo
+
+ARGS = {"n_areas": 150, "years": range(2015, 2024), "n_industries": 12, "seed": 3}
+
+
+def gva_totals(raw_dir: Path) -> pd.DataFrame:
+    """
+    The Total rows of every synthetic GVA workbook, read by the streaming reader.
+    """
+    files = sorted(raw_dir.glob(f"{synthetic.GVA_FILE_PREFIX}*.xlsx"))
+    gva = pd.concat([industry_total_rows(f) for f in files])
+    return gva.sort_values(["geo_code", "year"], ignore_index=True)
+
+
+class TestSyntheticData(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Generate a small synthetic data set in a temporary folder.
+
+        Runs once before all tests
+        """
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.out = Path(cls.tmp.name)
+        cls.paths = synthetic.generate(cls.out / "a", **ARGS)
+        cls.processed = {
+            name: pd.read_parquet(path).astype({"geo_code": str, "geo_name": str})
+            for name, path in cls.paths["processed"].items()
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_same_seed(self):
+        """
+        The same arguments should write byte-identical workbooks, and another seed different ones
+        """
+        again = synthetic.generate(self.out / "b", **ARGS)
+        other = synthetic.generate(self.out / "c", **{**ARGS, "seed": 4})
+        for name, path in self.paths["raw"].items():
+            self.assertEqual(path.read_bytes(), again["raw"][name].read_bytes(), name)
+        demography = self.paths["raw"]["demography"].read_bytes()
+        self.assertNotEqual(demography, other["raw"]["demography"].read_bytes())
+
+    def test_demography_sheets(self):
+        """
+        Cleaning the sheets in DEMOGRAPHY_SHEETS should give the processed counts
+        """
+        path = self.paths["raw"]["demography"]
+        frames = []
+        for spec in DEMOGRAPHY_SHEETS:
+            sheet = pd.read_excel(path, sheet_name=spec["sheet_name"], header=3)
+            df = CLEANERS[spec["layout"]](sheet, "value")
+            frames.append(df.assign(measure=spec["value_name"]))
+        long = normalise_geo(pd.concat(frames, ignore_index=True))
+        cleaned = long.pivot_table(
+            index=["geo_code", "year"], columns="measure", values="value", dropna=False
+        )
+
+        counts = self.processed["business_demography_counts"]
+        counts = counts.set_index(["geo_code", "year"])[["births", "deaths", "active"]]
+        self.assertEqual(len(cleaned), len(counts))
+        np.testing.assert_array_equal(
+            cleaned.reindex(counts.index)[counts.columns].to_numpy(dtype=float),
+            counts.to_numpy(dtype=float, na_value=np.nan),
+        )
+
+    def test_population_markers(self):
+        """
+        Every Northern Ireland LA should be '[u]' in the latest year, and flagged when processed
+        """
+        sheet = pd.read_excel(self.paths["raw"]["population"], header=0)
+        sheet = sheet.dropna(subset=["LA code"])
+        latest = str(ARGS["years"][-1])
+        northern_ireland = sheet["LA code"].str.startswith("N09")
+        self.assertTrue(northern_ireland.any())
+        self.assertTrue((sheet.loc[northern_ireland, latest] == "[u]").all())
+
+        population = self.processed["population"]
+        markers = (sheet.iloc[:, 3:] == "[u]").to_numpy().sum()
+        self.assertEqual(population["is_unreliable"].sum(), markers)
+
+    def test_gva_total_rows(self):
+        """
+        The Total rows of the GVA workbooks should be the processed GVA
+        """
+        gva = self.processed["gva"].sort_values(["geo_code", "year"], ignore_index=True)
+        pd.testing.assert_frame_equal(
+            gva_totals(self.out / "a" / "raw")[["geo_code", "year", "gva_million"]],
+            gva[["geo_code", "year", "gva_million"]],
+            check_dtype=False,
+        )
+
+    def test_split_workbooks(self):
+        """
+        Regions with more rows than fit in a sheet should be split over numbered workbooks
+        """
+        with mock.patch.object(synthetic, "EXCEL_MAX_ROWS", 200):
+            paths = synthetic.generate(self.out / "d", **ARGS)
+        self.assertIn("tljsoutheast2", paths["raw"])
+        pd.testing.assert_frame_equal(
+            gva_totals(self.out / "d" / "raw"), gva_totals(self.out / "a" / "raw")
+        )
+
+
+if __name__ == "__main__":
+    ut.main()